@@ -0,0 +1,503 @@
+"""
+Government zero curve fitted to the GOI bonds in the bonds table, and spreads
+of every bond to it.
+
+Constituents are the bonds whose ISIN starts with a government prefix (IN00:
+central government dated securities and T-bills). Their prices are fitted
+directly: the zero rate is linear in the model parameters, z(t) = B(t) @ p,
+so each Gauss-Newton step prices every constituent from one pass over the
+flattened cash flows (as in analytics.pricing) and solves a p x p system.
+Residuals are weighted by 1 / (price * duration), which makes the fit a
+least-squares fit of yields.
+
+Models:
+
+nelson_siegel  z(t) = b0 + b1 * (1 - e^-x) / x + b2 * ((1 - e^-x) / x - e^-x),
+               x = t / tau. Fitted for a grid of tau values at once, keeping
+               the best; a refit starts from the previous curve's tau and betas.
+spline         natural cubic spline through zero rates at knots placed at
+               maturity quantiles of the constituents (squared quantile
+               levels, so denser at the short end), flat beyond the ends.
+
+Zero rates are continuously compounded annual decimals internally and
+percentages in API output; par yields use COUPON_FREQUENCY compounding like
+yield_to_maturity. A fitted curve is stored in yield_curves under a version
+hashing its inputs, so an ingest that leaves constituent prices unchanged
+reuses it and one that changes them adds a new version.
+"""
+import enum
+import hashlib
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from analytics.pricing import COUPON_FREQUENCY, CashFlowSchedule, approximate_yield, solve_yield
+from database.bulk import dialect_insert
+from database.models import Bond, OHLCVBar, YieldCurve
+
+logger = logging.getLogger(__name__)
+
+GOVERNMENT_ISIN_PREFIXES = tuple(os.getenv("CURVE_GOVERNMENT_ISIN_PREFIXES", "IN00").split(","))
+# Bonds this close to maturity price off money-market rates rather than the curve
+CURVE_MIN_YEARS = 0.05
+MIN_CONSTITUENTS = 3
+# A historical curve uses each bond's latest daily close at most this old
+CURVE_PRICE_LOOKBACK_DAYS = 7
+CURVE_TENORS = (0.25, 0.5, 1, 2, 3, 5, 7, 10, 15, 20, 30, 40)
+
+# Candidate taus for a first fit, screened by a linear fit of yields
+NELSON_SIEGEL_TAUS = np.geomspace(0.25, 20.0, 16)
+# Refined around the screened or previous curve's tau
+NELSON_SIEGEL_REFIT_STEPS = np.array([0.8, 0.9, 1.0, 1.1, 1.25])
+SPLINE_MAX_KNOTS = 8
+GAUSS_NEWTON_MAX_ITER = 25
+STEP_TOLERANCE = 1e-10
+DAMPING = 1e-10
+SPREAD_MAX_ITER = 30
+
+
+class CurveModel(str, enum.Enum):
+    NELSON_SIEGEL = "nelson_siegel"
+    SPLINE = "spline"
+
+
+def nelson_siegel_basis(years: np.ndarray, tau) -> np.ndarray:
+    """
+    Loadings of (b0, b1, b2) at years, shape (..., 3, len(years)) for tau of shape (...).
+    """
+    x = years / np.asarray(tau, dtype=float)[..., None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(x > 1e-8, -np.expm1(-x) / x, 1.0)
+    return np.stack([np.ones_like(x), slope, slope - np.exp(-x)], axis=-2)
+
+
+def spline_basis(years: np.ndarray, knots: np.ndarray) -> np.ndarray:
+    """
+    Matrix S of shape (len(knots), len(years)) such that values @ S is the
+    natural cubic spline through (knots, values) at years, flat beyond the end knots.
+    """
+    count = len(knots)
+    if count == 1:
+        return np.ones((1, len(years)))
+    h = np.diff(knots)
+    # Second derivatives at the knots: A @ M = R @ values, zero at both ends
+    a = np.zeros((count, count))
+    r = np.zeros((count, count))
+    a[0, 0] = a[-1, -1] = 1.0
+    for i in range(1, count - 1):
+        a[i, i - 1:i + 2] = h[i - 1], 2.0 * (h[i - 1] + h[i]), h[i]
+        r[i, i - 1:i + 2] = 6.0 / h[i - 1], -6.0 / h[i - 1] - 6.0 / h[i], 6.0 / h[i]
+    second = np.linalg.solve(a, r)
+
+    t = np.clip(years, knots[0], knots[-1])
+    segment = np.clip(np.searchsorted(knots, t, "right") - 1, 0, count - 2)
+    width = h[segment]
+    left = (knots[segment + 1] - t) / width
+    right = 1.0 - left
+    basis = (left ** 3 - left)[:, None] * width[:, None] ** 2 / 6.0 * second[segment]
+    basis += (right ** 3 - right)[:, None] * width[:, None] ** 2 / 6.0 * second[segment + 1]
+    rows = np.arange(len(t))
+    basis[rows, segment] += left
+    basis[rows, segment + 1] += right
+    return np.ascontiguousarray(basis.T)
+
+
+class ZeroCurve:
+    """
+    A fitted curve: model, parameters and its shape (tau or knots).
+    """
+
+    def __init__(self, model: CurveModel, params, settlement: datetime, tau: Optional[float] = None,
+                 knots: Optional[Sequence[float]] = None, constituents: int = 0,
+                 rmse_bp: Optional[float] = None, version: Optional[str] = None,
+                 built_at: Optional[datetime] = None):
+        self.model = CurveModel(model)
+        self.params = np.asarray(params, dtype=float)
+        self.settlement = settlement
+        self.tau = tau
+        self.knots = None if knots is None else np.asarray(knots, dtype=float)
+        self.constituents = constituents
+        self.rmse_bp = rmse_bp
+        self.version = version
+        self.built_at = built_at
+
+    def basis(self, years: np.ndarray) -> np.ndarray:
+        if self.model == CurveModel.NELSON_SIEGEL:
+            return nelson_siegel_basis(years, self.tau)
+        return spline_basis(years, self.knots)
+
+    def zero_rate(self, years) -> np.ndarray:
+        years = np.asarray(years, dtype=float)
+        return self.params @ self.basis(np.atleast_1d(years))
+
+    def discount(self, years) -> np.ndarray:
+        years = np.atleast_1d(np.asarray(years, dtype=float))
+        return np.exp(-self.zero_rate(years) * years)
+
+    def par_yield(self, years, frequency: int = COUPON_FREQUENCY) -> np.ndarray:
+        """
+        Coupon rate (annual decimal) of a bond maturing in `years` with a clean
+        price of par, coupons every 1 / frequency years back from maturity.
+        """
+        years = np.atleast_1d(np.asarray(years, dtype=float))
+        counts = np.maximum(np.ceil(years * frequency - 1e-9).astype(int), 1)
+        owner = np.repeat(np.arange(len(years)), counts)
+        back = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+        flow_years = np.maximum(years[owner] - back / frequency, 1e-9)
+        annuity = np.bincount(owner, weights=self.discount(flow_years), minlength=len(years))
+        # Accrued interest, in coupons, of the current period: 1 - (periods to the next coupon)
+        accrued = counts - years * frequency
+        return frequency * (1.0 - self.discount(years)) / (annuity - accrued)
+
+    def parameters(self) -> Dict[str, Any]:
+        if self.model == CurveModel.NELSON_SIEGEL:
+            b0, b1, b2 = self.params.tolist()
+            return {"beta0": b0, "beta1": b1, "beta2": b2, "tau": self.tau}
+        return {"knots": self.knots.tolist(), "zero_rates": self.params.tolist()}
+
+    @classmethod
+    def from_row(cls, row: YieldCurve) -> "ZeroCurve":
+        stored = json.loads(row.parameters)
+        if row.model == CurveModel.NELSON_SIEGEL.value:
+            params, shape = [stored["beta0"], stored["beta1"], stored["beta2"]], {"tau": stored["tau"]}
+        else:
+            params, shape = stored["zero_rates"], {"knots": stored["knots"]}
+        return cls(row.model, params, row.curve_date, constituents=row.constituents,
+                   rmse_bp=row.rmse_bp, version=row.version, built_at=row.built_at, **shape)
+
+
+class CurveInputs:
+    """
+    Bonds and prices of one curve date, with their cash flows.
+    """
+
+    def __init__(self, rows: Sequence, settlement: datetime):
+        self.settlement = settlement
+        self.isins = [row.isin for row in rows]
+        self.names = [row.name for row in rows]
+        self.coupon_rate = np.array([np.nan if row.coupon_rate is None else row.coupon_rate for row in rows])
+        self.face_value = np.array([np.nan if row.face_value is None else row.face_value for row in rows])
+        self.maturity = np.array([row.maturity_date or "NaT" for row in rows], dtype="datetime64[s]")
+        self.price = np.array([np.nan if row.price is None else row.price for row in rows], dtype=float)
+        self.schedule = CashFlowSchedule(self.coupon_rate, self.face_value, self.maturity, settlement)
+        self.priced = self.schedule.valid & np.isfinite(self.price) & (self.price > 0)
+
+    def __len__(self) -> int:
+        return len(self.isins)
+
+    def constituents(self) -> np.ndarray:
+        government = np.array([isin.startswith(GOVERNMENT_ISIN_PREFIXES) for isin in self.isins], dtype=bool)
+        return government & self.priced & (np.nan_to_num(self.schedule.years) >= CURVE_MIN_YEARS)
+
+    def subset(self, mask: np.ndarray) -> "CurveInputs":
+        subset = CurveInputs.__new__(CurveInputs)
+        subset.settlement = self.settlement
+        subset.isins = [isin for isin, keep in zip(self.isins, mask) if keep]
+        subset.names = [name for name, keep in zip(self.names, mask) if keep]
+        for field in ("coupon_rate", "face_value", "maturity", "price"):
+            setattr(subset, field, getattr(self, field)[mask])
+        subset.schedule = CashFlowSchedule(subset.coupon_rate, subset.face_value, subset.maturity, self.settlement)
+        subset.priced = self.priced[mask]
+        return subset
+
+    def version(self, model: CurveModel) -> str:
+        digest = hashlib.blake2b(digest_size=12)
+        digest.update(f"{model.value}|{self.settlement.isoformat()}|{','.join(self.isins)}".encode())
+        for values in (self.coupon_rate, self.face_value, self.maturity.astype(np.int64), self.price):
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()
+
+
+def _gauss_newton(flows, starts, target, weights, basis, params):
+    """
+    Fit params (shape (..., p)) so that sum(amounts * exp(-(params @ basis) * years))
+    per bond matches target, for every leading batch entry at once; basis has
+    shape (..., p, flows). Returns the fitted params and weighted residuals (..., bonds).
+    """
+    years, amounts = flows
+    identity = np.eye(params.shape[-1])
+    with np.errstate(over="ignore", invalid="ignore"):
+        for _ in range(GAUSS_NEWTON_MAX_ITER):
+            pv = amounts * np.exp(-(params[..., None, :] @ basis)[..., 0, :] * years)
+            residual = (np.add.reduceat(pv, starts, axis=-1) - target) * weights
+            jacobian = np.add.reduceat(-(pv * years)[..., None, :] * basis, starts, axis=-1) * weights
+            normal = jacobian @ np.swapaxes(jacobian, -1, -2) + DAMPING * identity
+            gradient = (jacobian @ residual[..., None])[..., 0]
+            # A batch entry that blew up stops moving and loses on its residual
+            stuck = ~(np.isfinite(normal).all(axis=(-2, -1)) & np.isfinite(gradient).all(axis=-1))
+            normal = np.where(stuck[..., None, None], identity, normal)
+            gradient = np.where(stuck[..., None], 0.0, gradient)
+            step = np.linalg.solve(normal, -gradient[..., None])[..., 0]
+            params = params + step
+            if np.max(np.abs(step)) < STEP_TOLERANCE:
+                break
+        pv = amounts * np.exp(-(params[..., None, :] @ basis)[..., 0, :] * years)
+        residual = (np.add.reduceat(pv, starts, axis=-1) - target) * weights
+    return params, residual
+
+
+def _nelson_siegel_guess(schedule: CashFlowSchedule, price: np.ndarray, duration: np.ndarray):
+    """
+    Starting tau and betas for a fit without a previous curve: yields regressed
+    on the loadings at each bond's duration, by linear least squares for every
+    tau of the grid, keeping the best.
+    """
+    ytm = solve_yield(schedule, price)
+    solved = np.isfinite(ytm)
+    rates = schedule.frequency * np.log1p(ytm[solved] / schedule.frequency)
+    loadings = np.swapaxes(nelson_siegel_basis(duration[solved], NELSON_SIEGEL_TAUS), -1, -2)
+    best = None
+    for tau, matrix in zip(NELSON_SIEGEL_TAUS, loadings):
+        betas, *_ = np.linalg.lstsq(matrix, rates, rcond=None)
+        error = float(np.sum((matrix @ betas - rates) ** 2))
+        if best is None or error < best[0]:
+            best = (error, float(tau), betas)
+    return best[1], best[2]
+
+
+def fit_curve(inputs: CurveInputs, model: CurveModel, previous: Optional[ZeroCurve] = None) -> ZeroCurve:
+    """
+    Fit a zero curve to every bond of inputs (the constituents). A previous
+    curve of the same model, if given, is the starting point of the fit.
+    """
+    schedule = inputs.schedule
+    owner, periods, amounts = schedule.flows()
+    years = periods / schedule.frequency
+    counts = schedule.counts
+    starts = np.cumsum(counts) - counts
+    target = inputs.price + schedule.accrued_interest
+
+    # Start from a flat curve at the typical constituent yield (continuously compounded)
+    flat = float(np.median(schedule.frequency * np.log1p(approximate_yield(schedule, inputs.price) / schedule.frequency)))
+    pv = amounts * np.exp(-flat * years)
+    duration = np.add.reduceat(pv * years, starts) / np.add.reduceat(pv, starts)
+    weights = 1.0 / (target * np.maximum(duration, 1e-3))
+
+    if model == CurveModel.NELSON_SIEGEL:
+        def best_fit(taus, initial):
+            basis = nelson_siegel_basis(years, taus)
+            params, residual = _gauss_newton((years, amounts), starts, target, weights, basis, initial)
+            best = int(np.argmin(np.nan_to_num(np.sum(residual ** 2, axis=-1), nan=np.inf)))
+            return float(taus[best]), params[best], residual[best]
+
+        if previous is not None and previous.model == model:
+            tau, params = previous.tau, previous.params
+        else:
+            tau, params = _nelson_siegel_guess(schedule, inputs.price, duration)
+        taus = tau * NELSON_SIEGEL_REFIT_STEPS
+        tau, params, residual = best_fit(taus, np.tile(params, (len(taus), 1)))
+        curve = ZeroCurve(model, params, inputs.settlement, tau=tau)
+    else:
+        count = int(np.clip(len(inputs) // 3, 2, SPLINE_MAX_KNOTS))
+        # Denser at the short end, where curves bend most, and always between constituent maturities
+        knots = np.unique(np.round(np.quantile(schedule.years, np.linspace(0.0, 1.0, count) ** 2), 4))
+        if len(knots) < 2:
+            knots = np.array([0.0, knots[0]]) if knots[0] > 0 else knots
+        initial = previous.zero_rate(knots) if previous is not None else np.full(len(knots), flat)
+        params, residual = _gauss_newton(
+            (years, amounts), starts, target, weights, spline_basis(years, knots), initial
+        )
+        curve = ZeroCurve(model, params, inputs.settlement, knots=knots)
+
+    curve.constituents = len(inputs)
+    curve.rmse_bp = float(np.sqrt(np.mean(residual ** 2)) * 1e4)
+    return curve
+
+
+def _day(curve_date: Optional[date]) -> datetime:
+    day = curve_date or date.today()
+    return datetime(day.year, day.month, day.day)
+
+
+def load_inputs(db: Session, curve_date: Optional[date] = None, government_only: bool = True,
+                isins: Optional[List[str]] = None) -> CurveInputs:
+    """
+    Bonds priced for a curve date: the latest prices in the bonds table for
+    today (or no date), each bond's latest daily close up to that day otherwise.
+    """
+    settlement = _day(curve_date)
+    government = or_(*[Bond.isin.startswith(prefix) for prefix in GOVERNMENT_ISIN_PREFIXES])
+    columns = (Bond.isin, Bond.name, Bond.coupon_rate, Bond.face_value, Bond.maturity_date)
+    if settlement >= _day(None):
+        query = select(*columns, Bond.last_price.label("price"))
+    else:
+        latest = (
+            select(OHLCVBar.bond_id, func.max(OHLCVBar.bucket_start).label("bucket_start"))
+            .where(
+                OHLCVBar.interval == "1d",
+                OHLCVBar.bucket_start <= settlement,
+                OHLCVBar.bucket_start > settlement - timedelta(days=CURVE_PRICE_LOOKBACK_DAYS),
+            )
+            .group_by(OHLCVBar.bond_id)
+            .subquery()
+        )
+        query = (
+            select(*columns, OHLCVBar.close.label("price"))
+            .join(OHLCVBar, OHLCVBar.bond_id == Bond.id)
+            .join(latest, and_(latest.c.bond_id == OHLCVBar.bond_id, latest.c.bucket_start == OHLCVBar.bucket_start))
+            .where(OHLCVBar.interval == "1d")
+        )
+    if government_only:
+        query = query.where(government)
+    if isins:
+        query = query.where(Bond.isin.in_(isins))
+    return CurveInputs(db.execute(query.order_by(Bond.isin)).all(), settlement)
+
+
+def _stored_curve(db: Session, model: CurveModel, settlement: datetime, version: Optional[str] = None):
+    """
+    The stored curve of this version, or without a version the latest one up to the settlement date.
+    """
+    query = select(YieldCurve).where(YieldCurve.model == model.value)
+    if version is not None:
+        query = query.where(YieldCurve.curve_date == settlement, YieldCurve.version == version)
+    else:
+        query = query.where(YieldCurve.curve_date <= settlement)
+    row = db.execute(query.order_by(YieldCurve.curve_date.desc(), YieldCurve.built_at.desc()).limit(1)).scalar()
+    return ZeroCurve.from_row(row) if row is not None else None
+
+
+def build_curve(db: Session, curve_date: Optional[date] = None,
+                model: CurveModel = CurveModel.NELSON_SIEGEL) -> Optional[ZeroCurve]:
+    """
+    The curve of a date for the current constituent prices: the stored
+    version when prices have not changed since it was fitted, otherwise a new
+    fit (starting from the latest stored curve) that is stored and committed.
+    None when fewer than MIN_CONSTITUENTS government bonds are priced.
+    """
+    inputs = load_inputs(db, curve_date)
+    inputs = inputs.subset(inputs.constituents())
+    if len(inputs) < MIN_CONSTITUENTS:
+        logger.info(f"Not fitting a {model.value} curve for {inputs.settlement.date()}: {len(inputs)} government bonds priced")
+        return None
+
+    version = inputs.version(model)
+    stored = _stored_curve(db, model, inputs.settlement, version)
+    if stored is not None:
+        return stored
+
+    curve = fit_curve(inputs, model, previous=_stored_curve(db, model, inputs.settlement))
+    curve.version = version
+    curve.built_at = datetime.now()
+    stmt = dialect_insert(db, YieldCurve).values(
+        curve_date=inputs.settlement, model=model.value, version=version,
+        parameters=json.dumps(curve.parameters()), constituents=curve.constituents,
+        rmse_bp=curve.rmse_bp, built_at=curve.built_at,
+    )
+    db.execute(stmt.on_conflict_do_nothing(
+        index_elements=[YieldCurve.curve_date, YieldCurve.model, YieldCurve.version]
+    ))
+    db.commit()
+    logger.info(
+        f"Fitted {model.value} curve {version} for {inputs.settlement.date()} to "
+        f"{curve.constituents} bonds, rmse {curve.rmse_bp:.2f} bp"
+    )
+    return curve
+
+
+def refresh_yield_curves(db: Session) -> int:
+    """
+    Bring today's curves up to date with the latest bond prices; run after each ingest.
+    """
+    return sum(build_curve(db, model=model) is not None for model in CurveModel)
+
+
+def curve_payload(curve: ZeroCurve, tenors: Sequence[float] = CURVE_TENORS) -> Dict[str, Any]:
+    tenors = np.asarray(tenors, dtype=float)
+    return {
+        "date": curve.settlement,
+        "model": curve.model.value,
+        "version": curve.version,
+        "built_at": curve.built_at,
+        "constituents": curve.constituents,
+        "rmse_bp": curve.rmse_bp,
+        "parameters": curve.parameters(),
+        "points": [
+            {"tenor": tenor, "zero_rate": zero * 100.0, "par_yield": par * 100.0, "discount_factor": discount}
+            for tenor, zero, par, discount in zip(
+                tenors.tolist(), curve.zero_rate(tenors).tolist(),
+                curve.par_yield(tenors).tolist(), curve.discount(tenors).tolist(),
+            )
+        ],
+    }
+
+
+def _nullable(value: float) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None
+
+
+def bond_spreads(inputs: CurveInputs, curve: ZeroCurve) -> List[Dict[str, Any]]:
+    """
+    Per bond: yield to maturity, the curve's par yield at the bond's maturity,
+    their difference (G-spread) and the Z-spread, the parallel shift of the
+    zero curve repricing the bond, both in basis points.
+    """
+    schedule = inputs.schedule
+    owner, periods, amounts = schedule.flows()
+    years = periods / schedule.frequency
+    target = np.where(inputs.priced, inputs.price + np.nan_to_num(schedule.accrued_interest), np.nan)
+    pv = amounts * curve.discount(years)
+
+    # Newton on the shift s: price(s) = sum(pv * exp(-s * t)) is convex and decreasing in s
+    spread = np.zeros(len(inputs))
+    for _ in range(SPREAD_MAX_ITER):
+        shifted = pv * np.exp(-spread[owner] * years)
+        price = np.bincount(owner, weights=shifted, minlength=len(inputs))
+        slope = -np.bincount(owner, weights=shifted * years, minlength=len(inputs))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(inputs.priced & (slope != 0), (price - target) / slope, 0.0)
+        spread -= np.nan_to_num(step)
+        if np.max(np.abs(np.nan_to_num(step)), initial=0.0) < 1e-12:
+            break
+    spread = np.where(inputs.priced, spread, np.nan)
+
+    ytm = solve_yield(schedule, inputs.price)
+    curve_yield = np.full(len(inputs), np.nan)
+    curve_yield[inputs.priced] = curve.par_yield(schedule.years[inputs.priced])
+    return [
+        {
+            "isin": isin,
+            "name": name,
+            "years_to_maturity": _nullable(schedule.years[i]),
+            "price": _nullable(inputs.price[i]),
+            "yield_to_maturity": _nullable(ytm[i] * 100.0),
+            "curve_yield": _nullable(curve_yield[i] * 100.0),
+            "g_spread_bp": _nullable((ytm[i] - curve_yield[i]) * 1e4),
+            "z_spread_bp": _nullable(spread[i] * 1e4),
+        }
+        for i, (isin, name) in enumerate(zip(inputs.isins, inputs.names))
+    ]
+
+
+def curve_spreads(db: Session, curve_date: Optional[date] = None, model: CurveModel = CurveModel.NELSON_SIEGEL,
+                  isins: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Spreads of every bond priced on a date (or of the given ISINs) to that date's curve.
+    """
+    curve = build_curve(db, curve_date, model)
+    if curve is None:
+        return None
+    inputs = load_inputs(db, curve_date, government_only=False, isins=isins)
+    return {
+        "date": curve.settlement,
+        "model": curve.model.value,
+        "version": curve.version,
+        "bonds": bond_spreads(inputs, curve),
+    }
+
+
+if __name__ == "__main__":
+    from database.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        logger.info(f"Refreshed {refresh_yield_curves(db)} yield curves")
+    finally:
+        db.close()
@@ -0,0 +1,240 @@
+"""
+Mark-to-market and rate risk of a book of (isin, quantity) positions.
+
+Positions are matched to bonds through an ISIN -> row index and valued
+with array arithmetic over the analytics columns that
+analytics.pricing keeps up to date in the bonds table. The columns come from
+the API worker's in-memory bond snapshot when it is loaded, otherwise from
+one query for the ISINs held.
+
+Conventions: quantity is a number of bonds (negative for shorts), prices
+and accrued interest are per bond, as stored. market_value is the dirty
+value, clean_value + accrued_interest. DV01 is the gain for a one basis
+point fall in yield, modified_duration * market_value / 10000. Portfolio
+duration, convexity and yield are averages weighted by market value over
+the priced positions.
+
+Positions are returned one object per position (layout=rows) or, for large
+books, as one array per field (layout=columns), which is several times
+cheaper to encode and parse.
+"""
+import enum
+import math
+import os
+from datetime import datetime
+from itertools import repeat
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.bulk import chunked
+from database.models import Bond
+from utils.serialization import dumps, rows_to_dicts
+
+# Request body of /portfolio/valuate, quoted in 400 responses
+POSITIONS_SHAPE = '{"positions": [{"isin": ..., "quantity": ...}, ...]}'
+# Bonds looked up per IN (...) query when no snapshot is loaded
+PORTFOLIO_LOOKUP_CHUNK = 5000
+# Books with more positions than this are streamed
+PORTFOLIO_STREAM_POSITIONS = int(os.getenv("PORTFOLIO_STREAM_POSITIONS", "10000"))
+# Positions encoded per streamed chunk
+PORTFOLIO_CHUNK_POSITIONS = 5000
+
+VALUATION_COLUMNS = (
+    "last_price", "accrued_interest", "yield_to_maturity",
+    "macaulay_duration", "modified_duration", "convexity",
+)
+POSITION_FIELDS = (
+    "isin", "quantity", "status", "price", "clean_value", "accrued_interest",
+    "market_value", "dv01", "yield_to_maturity", "modified_duration",
+)
+
+# Position status
+PRICED = "priced"
+UNPRICED = "unpriced"
+UNKNOWN = "unknown"
+
+
+class PositionLayout(str, enum.Enum):
+    ROWS = "rows"
+    COLUMNS = "columns"
+
+
+def parse_positions(body: bytes) -> Tuple[List[str], np.ndarray]:
+    """
+    ISINs and quantities of a {"positions": [{"isin": ..., "quantity": ...}, ...]} request body.
+    Raises ValueError with a message for the client, naming the first bad position, on anything else.
+    """
+    try:
+        document = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise ValueError("Request body is not valid JSON") from None
+    positions = document.get("positions") if isinstance(document, dict) else None
+    if not isinstance(positions, list):
+        raise ValueError(f"Expected a JSON object {POSITIONS_SHAPE}")
+    try:
+        isins = [position["isin"] for position in positions]
+        quantities = np.array([position["quantity"] for position in positions], dtype=np.float64)
+    except (KeyError, TypeError, ValueError, OverflowError):
+        raise ValueError(_position_error(positions)) from None
+    if quantities.ndim != 1 or not np.isfinite(quantities).all() or not all(isinstance(isin, str) for isin in isins):
+        raise ValueError(_position_error(positions))
+    return isins, quantities
+
+
+def _position_error(positions: List[Any]) -> str:
+    """
+    What is wrong with the first invalid position.
+    """
+    for row, position in enumerate(positions):
+        if not isinstance(position, dict):
+            return f"positions[{row}] must be an object with an isin and a quantity"
+        if not isinstance(position.get("isin"), str):
+            return f"positions[{row}].isin must be a string"
+        quantity = position.get("quantity")
+        try:
+            finite = math.isfinite(float(quantity))
+        except (TypeError, ValueError, OverflowError):
+            finite = False
+        if not finite:
+            return f"positions[{row}].quantity must be a finite number"
+    return f"Expected {POSITIONS_SHAPE}"
+
+
+class BondTable:
+    """
+    The VALUATION_COLUMNS of each bond as float arrays (NaN for NULL), with an ISIN -> row index.
+    """
+
+    def __init__(self, row_of: Dict[str, int], columns: Dict[str, np.ndarray], as_of: Optional[datetime] = None):
+        self.row_of = row_of
+        self.columns = columns
+        self.as_of = as_of
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Tuple], as_of: Optional[datetime] = None) -> "BondTable":
+        """
+        From (isin, *VALUATION_COLUMNS) rows.
+        """
+        values = list(zip(*rows)) if rows else [()] * (len(VALUATION_COLUMNS) + 1)
+        columns = {
+            name: np.array([np.nan if value is None else value for value in column], dtype=np.float64)
+            for name, column in zip(VALUATION_COLUMNS, values[1:])
+        }
+        return cls({isin: row for row, isin in enumerate(values[0])}, columns, as_of)
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> "BondTable":
+        """
+        From a utils.market_snapshot.BondSnapshot: its ISIN index and a copy of
+        its float keys, so live updates applied meanwhile cannot tear a valuation.
+        """
+        columns = {name: snapshot.keys(name)[0].copy() for name in VALUATION_COLUMNS}
+        # The snapshot is current to the last live update
+        return cls(snapshot.row_of, columns, as_of=datetime.now())
+
+    def locate(self, isins: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row of each ISIN (0 when not found) and whether it was found.
+        """
+        rows = np.fromiter(map(self.row_of.get, isins, repeat(-1)), dtype=np.intp, count=len(isins))
+        found = rows >= 0
+        return np.where(found, rows, 0), found
+
+
+def load_bond_table(db: Session, isins: Sequence[str]) -> BondTable:
+    """
+    The held bonds, read from the bonds table.
+    """
+    columns = [Bond.isin] + [getattr(Bond, name) for name in VALUATION_COLUMNS]
+    rows = []
+    for chunk in chunked(sorted(set(isins)), PORTFOLIO_LOOKUP_CHUNK):
+        rows.extend(db.execute(select(*columns).where(Bond.isin.in_(chunk))).all())
+    return BondTable.from_rows(rows, as_of=datetime.now())
+
+
+def _weighted(values: np.ndarray, weights: np.ndarray) -> Optional[float]:
+    usable = np.isfinite(values)
+    total = weights[usable].sum()
+    if not usable.any() or total == 0:
+        return None
+    return float((values[usable] * weights[usable]).sum() / total)
+
+
+def valuate(isins: Sequence[str], quantities: np.ndarray, table: BondTable) -> Dict[str, Any]:
+    """
+    Per position values (arrays aligned with the input) and the book summary.
+    """
+    rows, found = table.locate(isins)
+    column = {name: np.where(found, values[rows], np.nan) for name, values in table.columns.items()}
+    price = column["last_price"]
+    priced = found & np.isfinite(price)
+
+    clean_value = quantities * price
+    accrued = quantities * np.nan_to_num(column["accrued_interest"])
+    accrued = np.where(priced, accrued, np.nan)
+    market_value = clean_value + accrued
+    dv01 = column["modified_duration"] * market_value * 1e-4
+
+    status = np.where(priced, PRICED, np.where(found, UNPRICED, UNKNOWN))
+    weights = np.where(priced, market_value, 0.0)
+    summary = {
+        "as_of": table.as_of,
+        "positions": len(isins),
+        "priced": int(priced.sum()),
+        "unpriced": int((found & ~priced).sum()),
+        "unknown": int((~found).sum()),
+        "clean_value": float(np.nansum(clean_value)),
+        "accrued_interest": float(np.nansum(accrued)),
+        "market_value": float(np.nansum(market_value)),
+        "dv01": float(np.nansum(dv01)),
+        "yield_to_maturity": _weighted(column["yield_to_maturity"], weights),
+        "macaulay_duration": _weighted(column["macaulay_duration"], weights),
+        "modified_duration": _weighted(column["modified_duration"], weights),
+        "convexity": _weighted(column["convexity"], weights),
+    }
+    positions = {
+        "isin": np.array(isins, dtype=object),
+        "quantity": quantities,
+        "status": status,
+        "price": price,
+        "clean_value": clean_value,
+        "accrued_interest": accrued,
+        "market_value": market_value,
+        "dv01": dv01,
+        "yield_to_maturity": column["yield_to_maturity"],
+        "modified_duration": column["modified_duration"],
+    }
+    return {"summary": summary, "positions": positions}
+
+
+def encode_valuation(valuation: Dict[str, Any], layout: PositionLayout = PositionLayout.ROWS,
+                     chunk_size: int = PORTFOLIO_CHUNK_POSITIONS) -> Iterator[bytes]:
+    """
+    The {"summary": ..., "positions": ...} response body in pieces (chunk_size
+    positions, or one field in the columns layout), so a large book is never
+    encoded in one go. NaN (unknown or unpriced values) is written as null.
+    """
+    positions = valuation["positions"]
+    yield b'{"summary":' + dumps(valuation["summary"]) + b',"positions":'
+    if layout == PositionLayout.COLUMNS:
+        for i, name in enumerate(POSITION_FIELDS):
+            values = positions[name]
+            # Float arrays are encoded by orjson directly; strings go through lists
+            values = values if values.dtype.kind == "f" else values.tolist()
+            yield (b"{" if i == 0 else b",") + dumps(name) + b":" + dumps(values)
+        yield b"}}"
+        return
+
+    yield b"["
+    count = len(positions["isin"])
+    for start in range(0, count, chunk_size):
+        stop = min(start + chunk_size, count)
+        columns = [positions[name][start:stop].tolist() for name in POSITION_FIELDS]
+        body = dumps(rows_to_dicts(POSITION_FIELDS, zip(*columns)))
+        # Without the list brackets, joined to the previous chunk
+        yield (b"," if start else b"") + body[1:-1]
+    yield b"]}"
@@ -0,0 +1,301 @@
+"""
+Vectorized fixed-coupon bond analytics.
+
+Yields are solved for the whole universe at once: every Newton step prices
+all bonds with the closed-form annuity sum, so it costs O(bonds) rather than
+O(cash flows). Duration and convexity are then taken from one pass over the
+flattened cash flows of every bond, summed per bond with np.bincount, which
+avoids padding short bonds to the longest schedule.
+
+Conventions: coupon_rate and yields are annual percentages, prices are clean
+prices in the same units as face_value, coupons are paid COUPON_FREQUENCY
+times a year, coupon dates step back from maturity in whole months, and accrual within a
+coupon period is measured in actual days.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database.bulk import chunked
+from database.models import Bond
+
+logger = logging.getLogger(__name__)
+
+COUPON_FREQUENCY = 2
+NEWTON_MAX_ITER = 50
+BISECTION_MAX_ITER = 100
+PRICE_TOLERANCE = 1e-9
+# Search range for the bisection fallback, in annual decimal yield
+YIELD_LOWER_BOUND = -0.99
+YIELD_UPPER_BOUND = 10.0
+# Bond columns written back by refresh_bond_analytics
+ANALYTICS_FIELDS = (
+    "yield_to_maturity", "macaulay_duration", "modified_duration", "convexity", "accrued_interest",
+)
+
+
+def _coupon_date(maturity: np.ndarray, months_back: np.ndarray) -> np.ndarray:
+    """
+    maturity minus months_back months, keeping the day of month and clipping
+    it to the end of shorter months.
+    """
+    month = maturity.astype("datetime64[M]")
+    day = maturity - month.astype("datetime64[D]")
+    target = month - months_back.astype("timedelta64[M]")
+    month_length = (target + 1).astype("datetime64[D]") - target.astype("datetime64[D]")
+    return target.astype("datetime64[D]") + np.minimum(day, month_length - 1)
+
+
+class CashFlowSchedule:
+    """
+    Remaining cash flows of many bonds.
+
+    Each bond has counts[i] coupons left, the next one first[i] coupon
+    periods from settlement, of size coupon[i], plus face[i] at maturity.
+    Prices and their yield derivative use the closed-form geometric sum, so
+    a Newton step costs O(bonds). Duration and convexity need per-flow
+    weights and use the flattened flows instead: owner[k] is the bond index
+    of flow k, periods[k] its time in coupon periods and amounts[k] its size.
+    Bonds without valid inputs have no flows and valid[i] is False.
+    """
+
+    def __init__(self, coupon_rate, face_value, maturity_date, settlement: datetime, frequency=COUPON_FREQUENCY):
+        coupon_rate = np.asarray(coupon_rate, dtype=float)
+        face_value = np.asarray(face_value, dtype=float)
+        maturity = np.asarray(maturity_date, dtype="datetime64[D]")
+        settle = np.datetime64(settlement, "D")
+
+        self.size = len(maturity)
+        self.frequency = frequency
+        self.valid = (
+            np.isfinite(coupon_rate) & np.isfinite(face_value) & (face_value > 0)
+            & ~np.isnat(maturity) & (maturity > settle)
+        )
+        maturity = np.where(self.valid, maturity, settle + 1)
+
+        # Coupon dates step back from maturity by whole months; the previous
+        # coupon is the first of them on or before settlement
+        step = 12 // frequency
+        months = (maturity.astype("datetime64[M]") - settle.astype("datetime64[M]")).astype(np.int64)
+        counts = months // step
+        counts = np.where(_coupon_date(maturity, counts * step) > settle, counts + 1, counts)
+        next_coupon = _coupon_date(maturity, (counts - 1) * step)
+        previous_coupon = _coupon_date(maturity, counts * step)
+
+        self.counts = np.where(self.valid, counts, 0)
+        period_days = (next_coupon - previous_coupon).astype(float)
+        self.first = np.where(self.valid, (next_coupon - settle).astype(float) / period_days, 0.0)
+        self.years = np.where(self.valid, (maturity - settle).astype(float) / 365.0, np.nan)
+
+        self.face = np.where(self.valid, face_value, 0.0)
+        self.coupon = np.where(self.valid, coupon_rate / 100.0 * face_value / frequency, 0.0)
+        self.accrued_interest = np.where(self.valid, self.coupon * (1.0 - self.first), np.nan)
+        self._flows = None
+
+    def flows(self):
+        """
+        Flattened (owner, periods, amounts) arrays, built on first use.
+        """
+        if self._flows is None:
+            counts = self.counts
+            owner = np.repeat(np.arange(self.size), counts)
+            starts = np.cumsum(counts) - counts
+            index = np.arange(len(owner)) - np.repeat(starts, counts)
+            periods = self.first[owner] + index
+            is_last = index == (counts[owner] - 1)
+            amounts = self.coupon[owner] + np.where(is_last, self.face[owner], 0.0)
+            self._flows = (owner, periods, amounts)
+        return self._flows
+
+    def price_and_derivative(self, ytm):
+        """
+        Dirty price for annual decimal yields ytm (one per bond) and its
+        derivative with respect to ytm.
+
+        With l = -ln(1 + y/f) the coupons sum to coupon * e^(first*l) * S(l),
+        S(l) = expm1(n*l) / expm1(l), which stays accurate as l approaches 0.
+        """
+        n = self.counts
+        growth = 1.0 + ytm / self.frequency
+        log_v = -np.log(growth)
+        near_zero = np.abs(log_v) < 1e-12
+        with np.errstate(divide="ignore", invalid="ignore"):
+            b = np.expm1(log_v)
+            a = np.expm1(n * log_v)
+            annuity = np.where(near_zero, n, a / b)
+            annuity_slope = np.where(
+                near_zero,
+                n * (n - 1) / 2.0,
+                (n * np.exp(n * log_v) * b - a * np.exp(log_v)) / (b * b),
+            )
+        lead = np.exp(self.first * log_v)
+        last_period = self.first + n - 1
+        redemption = self.face * np.exp(last_period * log_v)
+
+        price = self.coupon * lead * annuity + redemption
+        slope = self.coupon * lead * (self.first * annuity + annuity_slope) + last_period * redemption
+        derivative = -slope / (self.frequency * growth)
+        return price, derivative
+
+    def dirty_price(self, ytm):
+        return self.price_and_derivative(ytm)[0]
+
+    def moments(self, ytm):
+        """
+        Per bond: dirty price, sum of t * PV(cf) and sum of t * (t + 1) * PV(cf),
+        with t in coupon periods.
+        """
+        owner, periods, amounts = self.flows()
+        pv = amounts * np.exp(periods * -np.log1p(ytm / self.frequency)[owner])
+        price = np.bincount(owner, weights=pv, minlength=self.size)
+        first = np.bincount(owner, weights=pv * periods, minlength=self.size)
+        second = np.bincount(owner, weights=pv * periods * (periods + 1), minlength=self.size)
+        return price, first, second
+
+
+def _bisect(schedule: CashFlowSchedule, target: np.ndarray, todo: np.ndarray) -> np.ndarray:
+    """
+    Bisection on the bonds flagged in todo. Price falls monotonically with
+    yield, so the bracket always holds the root when one exists.
+    """
+    lower = np.full(schedule.size, YIELD_LOWER_BOUND)
+    upper = np.full(schedule.size, YIELD_UPPER_BOUND)
+    for _ in range(BISECTION_MAX_ITER):
+        mid = (lower + upper) / 2.0
+        price = schedule.dirty_price(mid)
+        too_cheap = price < target
+        upper = np.where(todo & too_cheap, mid, upper)
+        lower = np.where(todo & ~too_cheap, mid, lower)
+        if np.all((upper - lower)[todo] < 1e-12):
+            break
+    result = (lower + upper) / 2.0
+    # No root inside the bracket: price is outside what any sane yield produces
+    price = schedule.dirty_price(result)
+    unsolved = todo & (np.abs(price - target) > 1e-6 * np.maximum(target, 1.0))
+    return np.where(unsolved, np.nan, result)
+
+
+def approximate_yield(schedule: CashFlowSchedule, clean_price: np.ndarray) -> np.ndarray:
+    """
+    Textbook yield approximation, used as the Newton starting point.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annual_coupon = schedule.coupon * schedule.frequency
+        guess = (annual_coupon + (schedule.face - clean_price) / schedule.years) / ((schedule.face + clean_price) / 2.0)
+    return np.clip(np.nan_to_num(guess, nan=0.05), -0.5, 1.0)
+
+
+def solve_yield(schedule: CashFlowSchedule, clean_price, initial_guess=None) -> np.ndarray:
+    """
+    Yield to maturity (annual decimal) of every bond, by batched Newton-Raphson
+    with a bisection fallback for bonds that fail to converge.
+    """
+    clean_price = np.asarray(clean_price, dtype=float)
+    target = clean_price + np.nan_to_num(schedule.accrued_interest)
+    active = schedule.valid & np.isfinite(clean_price) & (clean_price > 0)
+
+    if initial_guess is None:
+        ytm = approximate_yield(schedule, clean_price)
+    else:
+        ytm = np.nan_to_num(np.asarray(initial_guess, dtype=float), nan=0.05)
+    converged = ~active
+    for _ in range(NEWTON_MAX_ITER):
+        todo = ~converged
+        if not todo.any():
+            break
+        price, derivative = schedule.price_and_derivative(ytm)
+        error = price - target
+        converged |= todo & (np.abs(error) < PRICE_TOLERANCE * np.maximum(target, 1.0))
+        todo = ~converged
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(todo & (derivative != 0), error / derivative, 0.0)
+        ytm = np.where(todo, ytm - step, ytm)
+        # Bonds that wandered off are handed to bisection below
+        diverged = todo & (~np.isfinite(ytm) | (ytm <= YIELD_LOWER_BOUND) | (ytm >= YIELD_UPPER_BOUND))
+        converged |= diverged
+        ytm = np.where(diverged, np.nan, ytm)
+
+    price = schedule.dirty_price(np.nan_to_num(ytm))
+    failed = active & (~np.isfinite(ytm) | (np.abs(price - target) > 1e-6 * np.maximum(target, 1.0)))
+    if failed.any():
+        logger.info(f"Falling back to bisection for {int(failed.sum())} bonds")
+        ytm = np.where(failed, _bisect(schedule, target, failed), ytm)
+
+    return np.where(active, ytm, np.nan)
+
+
+def compute_bond_analytics(coupon_rate, face_value, maturity_date, clean_price,
+                           settlement: Optional[datetime] = None,
+                           frequency: int = COUPON_FREQUENCY) -> Dict[str, np.ndarray]:
+    """
+    Compute yield to maturity (%), Macaulay and modified duration (years),
+    convexity and accrued interest for every bond in one vectorized pass.
+    maturity_date is an array of datetime64 values or datetimes; invalid
+    inputs yield NaN in every output.
+    """
+    schedule = CashFlowSchedule(coupon_rate, face_value, maturity_date, settlement or datetime.now(), frequency)
+    ytm = solve_yield(schedule, clean_price)
+
+    solved = np.isfinite(ytm)
+    rate = np.nan_to_num(ytm)
+    dirty, first_moment, second_moment = schedule.moments(rate)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        macaulay = first_moment / frequency / dirty
+        growth = 1.0 + rate / frequency
+        modified = macaulay / growth
+        convexity = second_moment / (frequency ** 2) / (dirty * growth ** 2)
+
+    return {
+        "yield_to_maturity": np.where(solved, ytm * 100.0, np.nan),
+        "macaulay_duration": np.where(solved, macaulay, np.nan),
+        "modified_duration": np.where(solved, modified, np.nan),
+        "convexity": np.where(solved, convexity, np.nan),
+        "accrued_interest": schedule.accrued_interest,
+    }
+
+
+def _nullable(value: float) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None
+
+
+def refresh_bond_analytics(db: Session, settlement: Optional[datetime] = None,
+                           chunk_size: int = 5000) -> List[str]:
+    """
+    Recompute analytics for the whole bond universe and write back, with bulk
+    UPDATEs keyed by primary key, the bonds whose analytics changed. Those are
+    not only the bonds that traded: accrued interest and durations of every
+    bond move when the settlement date rolls over. Returns their ISINs, so
+    they can be announced as live updates.
+    """
+    rows = db.execute(
+        select(Bond.id, Bond.isin, Bond.coupon_rate, Bond.face_value, Bond.maturity_date, Bond.last_price,
+               *(getattr(Bond, name) for name in ANALYTICS_FIELDS))
+    ).all()
+    if not rows:
+        return []
+
+    results = compute_bond_analytics(
+        coupon_rate=np.array([row.coupon_rate if row.coupon_rate is not None else np.nan for row in rows]),
+        face_value=np.array([row.face_value if row.face_value is not None else np.nan for row in rows]),
+        maturity_date=np.array([row.maturity_date or "NaT" for row in rows], dtype="datetime64[s]"),
+        clean_price=np.array([row.last_price if row.last_price is not None else np.nan for row in rows]),
+        settlement=settlement,
+    )
+
+    updates, repriced = [], []
+    for i, row in enumerate(rows):
+        values = {name: _nullable(results[name][i]) for name in ANALYTICS_FIELDS}
+        if any(getattr(row, name) != value for name, value in values.items()):
+            updates.append({"id": row.id, **values})
+            repriced.append(row.isin)
+    for chunk in chunked(updates, chunk_size):
+        db.execute(update(Bond), chunk)
+    db.commit()
+
+    priced = int(np.isfinite(results["yield_to_maturity"]).sum())
+    logger.info(f"Refreshed analytics for {priced} of {len(rows)} bonds, {len(repriced)} changed")
+    return repriced
@@ -1,16 +1,44 @@
-from fastapi import FastAPI, WebSocket, Depends, HTTPException
+from fastapi import FastAPI, WebSocket, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from datetime import date, datetime
+import asyncio
 import json
+from urllib.parse import urlencode
 from starlette.websockets import WebSocketDisconnect
 
-from database.models import Bond, Transaction
-from database.session import get_db
+from database.models import Bond, Transaction, Exchange, OHLCVBar
+from database.session import get_async_db, AsyncSessionLocal
+from database.partitions import hot_window_start
 from utils.websocket_manager import WebSocketManager
+from utils.ws_protocols import Protocol
+from utils.bars import INTERVALS as BAR_INTERVALS
+from utils.cache import ResponseCache, CachedResponse
+from utils.live_updates import LiveUpdateSubscriber
+from utils.pagination import encode_cursor, decode_cursor, keyset_filter, parse_sort, parse_fields
 from data_acquisition.nse_scraper import NSEScraper
 from data_acquisition.bse_scraper import BSEScraper
 from utils.celery_app import fetch_bond_data
+from utils.backfill import backfill_progress, begin_run
+from utils.market_stats import market_stats
+from utils.timeseries import (
+    SERIES_MAX_POINTS, Aggregation, history_start, series, series_source,
+)
+from analytics.curve import CurveModel, build_curve, curve_payload, curve_spreads
+from analytics.portfolio import (
+    PORTFOLIO_STREAM_POSITIONS, BondTable, PositionLayout, encode_valuation, load_bond_table, parse_positions,
+    valuate,
+)
+from utils.market_snapshot import SNAPSHOT_ENABLED, MarketSnapshot
+from utils.serialization import (
+    BOND_FIELDS, BOND_PAYLOAD_COLUMNS, TRANSACTION_FIELDS, TRANSACTION_PAYLOAD_COLUMNS,
+    bond_payload, dumps, rows_to_dicts, transaction_payload,
+)
+from utils.export import ExportFormat, BAR_SCHEMA, EXTENSIONS, MEDIA_TYPES, TRANSACTION_SCHEMA, stream_export
 
 app = FastAPI(title="Bond Dashboard API")
 
@@ -21,137 +49,692 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Disposition"],
 )
 
 # WebSocket manager instance
 ws_manager = WebSocketManager()
+# Relays live updates published by the ingest task to this worker's sockets
+live_updates = LiveUpdateSubscriber(ws_manager)
+
+# Bond universe in memory, kept current by the live updates; serves /bonds/ once loaded
+market_snapshot = MarketSnapshot()
+if SNAPSHOT_ENABLED:
+    live_updates.listeners.append(market_snapshot.apply_message)
+
+# Serialized /bonds responses, invalidated when the ingest task publishes new data
+response_cache = ResponseCache()
+
+# Trades sent to WebSocket clients that connect without a seq they can resume from
+WS_SNAPSHOT_SIZE = 100
+WS_SNAPSHOT_KEY = "/ws#snapshot"
+# One snapshot query per worker at a time, however many clients reconnect together
+ws_snapshot_lock = asyncio.Lock()
+ws_resume_stats = {"resumed": 0, "replayed": 0, "snapshots": 0, "snapshot_queries": 0, "fallbacks": 0}
+
+# Columns selectable through the fields= projection, in default output order
+BOND_COLUMNS = dict(zip(BOND_FIELDS, BOND_PAYLOAD_COLUMNS))
+BOND_SORTS = {
+    "id": Bond.id,
+    "isin": Bond.isin,
+    "name": Bond.name,
+    "coupon_rate": Bond.coupon_rate,
+    "maturity_date": Bond.maturity_date,
+    "yield_to_maturity": Bond.yield_to_maturity,
+    "last_price": Bond.last_price,
+    "volume": Bond.volume,
+    "modified_duration": Bond.modified_duration,
+}
+TRANSACTION_COLUMNS = dict(zip(TRANSACTION_FIELDS, TRANSACTION_PAYLOAD_COLUMNS))
+TRANSACTION_SORTS = {
+    "timestamp": Transaction.timestamp,
+}
+
+def _split_csv(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+async def _fetch_page(db, query, names, sort_column, id_column, filters, cursor, descending, limit):
+    """
+    Run a keyset-paginated projection query and return (rows as dicts, next cursor).
+    Only the requested columns plus the (sort, id) key are selected from the database.
+    """
+    query = query.add_columns(sort_column.label("_sort_key"), id_column.label("_row_id"))
+    if filters:
+        query = query.where(*filters)
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        query = query.where(keyset_filter(sort_column, id_column, value, last_id, descending))
+
+    if descending:
+        query = query.order_by(sort_column.desc().nullslast(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc().nullslast(), id_column.asc())
+
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = rows_to_dicts(names, rows)
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last._sort_key, last._row_id)
+    return items, next_cursor
+
+def _cache_key(request: Request) -> str:
+    return request.url.path + "?" + urlencode(sorted(request.query_params.multi_items()))
+
+def _json_response(payload, headers=None) -> Response:
+    return Response(content=dumps(payload), media_type="application/json", headers=headers)
+
+def _cached_response(request: Request, entry: CachedResponse) -> Response:
+    """
+    Send a cached body, or an empty 304 when the client already holds this version.
+    """
+    headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if entry.etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+async def _latest_transactions(db: AsyncSession, limit: int):
+    """
+    Latest trades, answered from the hot (current month) partition when it
+    holds enough rows, falling back to the whole table otherwise.
+    """
+    query = (
+        select(*TRANSACTION_PAYLOAD_COLUMNS)
+        .join(Bond, Transaction.bond_id == Bond.id)
+        .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+    )
+    hot = query.where(Transaction.timestamp >= hot_window_start()).limit(limit)
+    rows = (await db.execute(hot)).all()
+    if len(rows) < limit:
+        rows = (await db.execute(query.limit(limit))).all()
+    return [transaction_payload(row) for row in rows]
+
+async def _ws_snapshot() -> dict:
+    """
+    initial_data message for clients that cannot resume: the latest trades
+    and the seq they are current to. Taken from the replay buffer when it
+    holds enough trades; otherwise from one query whose result is shared
+    through the response cache until the next ingest, so a reconnect storm
+    costs at most one query per worker.
+    """
+    seq = live_updates.buffer.last_seq
+    data = live_updates.buffer.latest_transactions(WS_SNAPSHOT_SIZE)
+    if data is not None:
+        return {"type": "initial_data", "data": data, "seq": seq}
+    entry = await response_cache.get(WS_SNAPSHOT_KEY)
+    if entry is None:
+        async with ws_snapshot_lock:
+            entry = await response_cache.get(WS_SNAPSHOT_KEY)
+            if entry is None:
+                async with AsyncSessionLocal() as db:
+                    data = await _latest_transactions(db, WS_SNAPSHOT_SIZE)
+                ws_resume_stats["snapshot_queries"] += 1
+                entry = await response_cache.set(WS_SNAPSHOT_KEY, dumps({"type": "initial_data", "data": data, "seq": seq}))
+    return json.loads(entry.body)
+
+def _ws_backlog(resume_from: Optional[str], snapshot: Optional[dict]) -> List[dict]:
+    """
+    Messages a newly registered client is owed: its snapshot, if any, and the
+    live messages after resume_from. The buffer is read again here, as it may
+    have moved on while the socket was accepted; if the gap is no longer held
+    whole (or outgrew the client's queue), the client is sent a fresh
+    initial_data snapshot from the buffer instead, since no await is allowed.
+    """
+    gap = live_updates.buffer.since(resume_from) if resume_from else []
+    if gap is None or len(gap) > ws_manager.max_queue:
+        ws_resume_stats["snapshots"] += 1
+        ws_resume_stats["fallbacks"] += 1
+        return [{
+            "type": "initial_data",
+            "data": live_updates.buffer.latest_transactions(WS_SNAPSHOT_SIZE, partial=True),
+            "seq": live_updates.buffer.last_seq,
+        }]
+    if snapshot is None:
+        ws_resume_stats["resumed"] += 1
+    else:
+        ws_resume_stats["snapshots"] += 1
+    ws_resume_stats["replayed"] += len(gap)
+    return ([snapshot] if snapshot is not None else []) + [entry.message for entry in gap]
+
+@app.on_event("startup")
+async def start_listeners():
+    response_cache.start_listener()
+    live_updates.start()
+    if SNAPSHOT_ENABLED:
+        market_snapshot.start()
+
+@app.on_event("shutdown")
+async def stop_listeners():
+    await response_cache.stop_listener()
+    await live_updates.stop()
+    await market_snapshot.stop()
 
 @app.get("/")
 async def root():
     return {"message": "Bond Dashboard API"}
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {**response_cache.stats(), "bond_snapshot": market_snapshot.stats()}
+
+# Market overview from the aggregates maintained by the ingest; cached until the next ingest
+@app.get("/stats/")
+async def get_market_stats(request: Request, db: AsyncSession = Depends(get_async_db)):
+    try:
+        key = _cache_key(request)
+        entry = await response_cache.get(key)
+        if entry is None:
+            entry = await response_cache.set(key, dumps(await db.run_sync(market_stats)))
+        return _cached_response(request, entry)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/bonds/")
-async def get_bonds(db: Session = Depends(get_db)):
+async def get_bonds(
+    request: Request,
+    isin: Optional[str] = None,
+    exchange: Optional[Exchange] = None,
+    issuer: Optional[str] = None,
+    maturity_from: Optional[datetime] = None,
+    maturity_to: Optional[datetime] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_volume: Optional[int] = None,
+    max_volume: Optional[int] = None,
+    sort: str = "isin",
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
     try:
         # fetch_bond_data.delay()  # Removed to avoid triggering background fetch on every request
-        bonds = db.query(Bond).all()
-        return [
-            {
-                "isin": bond.isin,
-                "name": bond.name,
-                "issuer": bond.issuer,
-                "exchange": bond.exchange.value,
-                "face_value": bond.face_value,
-                "coupon_rate": bond.coupon_rate,
-                "maturity_date": bond.maturity_date.isoformat() if bond.maturity_date else None,
-                "yield_to_maturity": bond.yield_to_maturity,
-                "last_price": bond.last_price,
-                "volume": bond.volume
-            }
-            for bond in bonds
-        ]
+        names = parse_fields(fields, BOND_COLUMNS)
+        sort_name, descending = parse_sort(sort, BOND_SORTS)
+
+        snapshot = market_snapshot.current
+        if snapshot is not None:
+            # Answered from memory, current to the last live update, so not cached
+            items, next_cursor = snapshot.query(
+                names, sort_name, descending, limit,
+                cursor=decode_cursor(cursor) if cursor else None,
+                isins=_split_csv(isin) if isin else None,
+                exchange=exchange, issuer=issuer,
+                maturity_from=maturity_from, maturity_to=maturity_to,
+                min_price=min_price, max_price=max_price,
+                min_volume=min_volume, max_volume=max_volume,
+            )
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+            return _cached_response(request, CachedResponse(dumps(items), headers))
+
+        key = _cache_key(request)
+        entry = await response_cache.get(key)
+        if entry is not None:
+            return _cached_response(request, entry)
+
+        filters = []
+        if isin:
+            filters.append(Bond.isin.in_(_split_csv(isin)))
+        if exchange:
+            filters.append(Bond.exchange == exchange)
+        if issuer:
+            filters.append(Bond.issuer.ilike(f"%{issuer}%"))
+        if maturity_from:
+            filters.append(Bond.maturity_date >= maturity_from)
+        if maturity_to:
+            filters.append(Bond.maturity_date < maturity_to)
+        if min_price is not None:
+            filters.append(Bond.last_price >= min_price)
+        if max_price is not None:
+            filters.append(Bond.last_price <= max_price)
+        if min_volume is not None:
+            filters.append(Bond.volume >= min_volume)
+        if max_volume is not None:
+            filters.append(Bond.volume <= max_volume)
+
+        query = select(*[BOND_COLUMNS[name] for name in names])
+        items, next_cursor = await _fetch_page(
+            db, query, names, BOND_SORTS[sort_name], Bond.id, filters, cursor, descending, limit
+        )
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        entry = await response_cache.set(key, dumps(items), headers)
+        return _cached_response(request, entry)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/bonds/{isin}/")
-async def get_bond(isin: str, db: Session = Depends(get_db)):
+async def get_bond(isin: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
-        bond = db.query(Bond).filter(Bond.isin == isin).first()
-        if not bond:
+        key = _cache_key(request)
+        entry = await response_cache.get(key)
+        if entry is not None:
+            return _cached_response(request, entry)
+
+        row = (await db.execute(select(*BOND_PAYLOAD_COLUMNS).where(Bond.isin == isin))).first()
+        if row is None:
             raise HTTPException(status_code=404, detail="Bond not found")
-        return {
-            "isin": bond.isin,
-            "name": bond.name,
-            "issuer": bond.issuer,
-            "exchange": bond.exchange.value,
-            "face_value": bond.face_value,
-            "coupon_rate": bond.coupon_rate,
-            "maturity_date": bond.maturity_date.isoformat() if bond.maturity_date else None,
-            "yield_to_maturity": bond.yield_to_maturity,
-            "last_price": bond.last_price,
-            "volume": bond.volume
-        }
+        entry = await response_cache.set(key, dumps(bond_payload(row)))
+        return _cached_response(request, entry)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Government zero curve of a date (today by default), fitted once per change of constituent prices
+@app.get("/curve")
+async def get_yield_curve(
+    request: Request,
+    curve_date: Optional[date] = Query(None, alias="date"),
+    model: CurveModel = CurveModel.NELSON_SIEGEL,
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        key = _cache_key(request)
+        entry = await response_cache.get(key)
+        if entry is None:
+            curve = await db.run_sync(build_curve, curve_date, model)
+            if curve is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Not enough priced government bonds to fit a curve for {curve_date or 'today'}"
+                )
+            entry = await response_cache.set(key, dumps(curve_payload(curve)))
+        return _cached_response(request, entry)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/curve/spreads")
+async def get_curve_spreads(
+    request: Request,
+    curve_date: Optional[date] = Query(None, alias="date"),
+    model: CurveModel = CurveModel.NELSON_SIEGEL,
+    isin: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        key = _cache_key(request)
+        entry = await response_cache.get(key)
+        if entry is None:
+            isins = _split_csv(isin) if isin else None
+            spreads = await db.run_sync(curve_spreads, curve_date, model, isins)
+            if spreads is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Not enough priced government bonds to fit a curve for {curve_date or 'today'}"
+                )
+            entry = await response_cache.set(key, dumps(spreads))
+        return _cached_response(request, entry)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Mark-to-market, accrued interest and rate risk of a book of {"isin", "quantity"} positions
+@app.post("/portfolio/valuate")
+async def valuate_portfolio(
+    request: Request,
+    layout: PositionLayout = PositionLayout.ROWS,
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        try:
+            isins, quantities = parse_positions(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        snapshot = market_snapshot.current
+        if snapshot is not None:
+            table = BondTable.from_snapshot(snapshot)
+        else:
+            table = await db.run_sync(load_bond_table, isins)
+        valuation = await run_in_threadpool(valuate, isins, quantities, table)
+        if len(isins) > PORTFOLIO_STREAM_POSITIONS:
+            return StreamingResponse(encode_valuation(valuation, layout), media_type="application/json")
+        return Response(content=b"".join(encode_valuation(valuation, layout)), media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+BAR_FIELDS = ("bucket_start", "open", "high", "low", "close", "volume", "trade_count")
+
+@app.get("/bonds/{isin}/bars")
+async def get_bond_bars(
+    isin: str,
+    interval: str = "1d",
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        if interval not in BAR_INTERVALS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported interval '{interval}'. Allowed: {', '.join(BAR_INTERVALS)}"
+            )
+        bond_id = await db.scalar(select(Bond.id).where(Bond.isin == isin))
+        if bond_id is None:
+            raise HTTPException(status_code=404, detail="Bond not found")
+
+        query = select(*[getattr(OHLCVBar, name) for name in BAR_FIELDS]).where(
+            OHLCVBar.bond_id == bond_id,
+            OHLCVBar.interval == interval,
+        )
+        if from_date:
+            query = query.where(OHLCVBar.bucket_start >= from_date)
+        if to_date:
+            query = query.where(OHLCVBar.bucket_start < to_date)
+
+        if from_date:
+            rows = (await db.execute(query.order_by(OHLCVBar.bucket_start.asc()).limit(limit))).all()
+        else:
+            # Without a lower bound return the most recent bars, still oldest first
+            rows = (await db.execute(query.order_by(OHLCVBar.bucket_start.desc()).limit(limit))).all()
+            rows.reverse()
+
+        return _json_response(rows_to_dicts(BAR_FIELDS, rows))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/bonds/{isin}/series")
+async def get_bond_series(
+    request: Request,
+    isin: str,
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    points: int = Query(500, ge=2, le=SERIES_MAX_POINTS),
+    aggregation: Aggregation = Aggregation.LAST,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    At most `points` points of a bond's price history, however long the range.
+    Without from the series starts at the bond's first trade; without to it ends now.
+    """
+    try:
+        key = _cache_key(request)
+        entry = await response_cache.get(key)
+        if entry is None:
+            bond_id = await db.scalar(select(Bond.id).where(Bond.isin == isin))
+            if bond_id is None:
+                raise HTTPException(status_code=404, detail="Bond not found")
+            end = to_date or datetime.now()
+            if from_date and from_date >= end:
+                raise HTTPException(status_code=400, detail="from must be before to")
+            start = from_date or await db.run_sync(history_start, bond_id)
+            if start is None or start >= end:
+                # No history at all
+                start, source, items = start or end, None, []
+            else:
+                source = series_source(start, end, points, aggregation)
+                items = await db.run_sync(series, bond_id, start, end, points, aggregation)
+            entry = await response_cache.set(key, dumps({
+                "isin": isin,
+                "from": start,
+                "to": end,
+                "aggregation": aggregation.value,
+                "source": source,
+                "points": items,
+            }))
+        return _cached_response(request, entry)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/transactions/")
-async def get_transactions(db: Session = Depends(get_db)):
-    try:
-        transactions = db.query(Transaction).all()
-        return [
-            {
-                "id": t.id,
-                "bond_id": t.bond_id,
-                "timestamp": t.timestamp.isoformat() if t.timestamp else None,
-                "price": t.price,
-                "quantity": t.quantity
-            }
-            for t in transactions
-        ]
+async def get_transactions(
+    isin: Optional[str] = None,
+    exchange: Optional[Exchange] = None,
+    source: Optional[str] = None,
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_quantity: Optional[int] = None,
+    max_quantity: Optional[int] = None,
+    sort: str = "-timestamp",
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        names = parse_fields(fields, TRANSACTION_COLUMNS)
+        sort_name, descending = parse_sort(sort, TRANSACTION_SORTS)
+
+        filters = []
+        if isin:
+            filters.append(Bond.isin.in_(_split_csv(isin)))
+        if exchange:
+            filters.append(Bond.exchange == exchange)
+        if source:
+            filters.append(Transaction.source == source)
+        if from_date:
+            filters.append(Transaction.timestamp >= from_date)
+        if to_date:
+            filters.append(Transaction.timestamp < to_date)
+        if min_price is not None:
+            filters.append(Transaction.price >= min_price)
+        if max_price is not None:
+            filters.append(Transaction.price <= max_price)
+        if min_quantity is not None:
+            filters.append(Transaction.quantity >= min_quantity)
+        if max_quantity is not None:
+            filters.append(Transaction.quantity <= max_quantity)
+
+        query = select(*[TRANSACTION_COLUMNS[name] for name in names]).select_from(Transaction)
+        # Only join bonds when a bond-level filter or field actually needs it
+        if isin or exchange or "isin" in names:
+            query = query.join(Bond, Transaction.bond_id == Bond.id)
+        sort_column = TRANSACTION_SORTS[sort_name]
+        page = None
+        if descending and not from_date and not cursor:
+            # The newest page almost always lies in the current month: read only the hot
+            # partition first and widen only if it cannot fill a page on its own
+            hot_filters = filters + [Transaction.timestamp >= hot_window_start()]
+            page = await _fetch_page(db, query, names, sort_column, Transaction.id, hot_filters, None, descending, limit)
+            if page[1] is None:
+                page = None
+        if page is None:
+            page = await _fetch_page(db, query, names, sort_column, Transaction.id, filters, cursor, descending, limit)
+        items, next_cursor = page
+        return _json_response(items, {"X-Next-Cursor": next_cursor} if next_cursor else None)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# One bond's trades, a keyset-paginated page at a time like /transactions/
 @app.get("/transactions/{isin}/")
-async def get_bond_transactions(isin: str, db: Session = Depends(get_db)):
+async def get_bond_transactions(
+    isin: str,
+    sort: str = "-timestamp",
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
     try:
-        bond = db.query(Bond).filter(Bond.isin == isin).first()
-        if not bond:
+        sort_name, descending = parse_sort(sort, TRANSACTION_SORTS)
+        bond_id = await db.scalar(select(Bond.id).where(Bond.isin == isin))
+        if bond_id is None:
             raise HTTPException(status_code=404, detail="Bond not found")
-        
-        transactions = db.query(Transaction).filter(Transaction.bond_id == bond.id).all()
-        return [
-            {
-                "id": t.id,
-                "bond_id": t.bond_id,
-                "timestamp": t.timestamp.isoformat() if t.timestamp else None,
-                "price": t.price,
-                "quantity": t.quantity
-            }
-            for t in transactions
-        ]
+
+        query = select(*TRANSACTION_PAYLOAD_COLUMNS).join(Bond, Transaction.bond_id == Bond.id)
+        items, next_cursor = await _fetch_page(
+            db, query, TRANSACTION_FIELDS, TRANSACTION_SORTS[sort_name], Transaction.id,
+            [Transaction.bond_id == bond_id], cursor, descending, limit,
+        )
+        return _json_response(items, {"X-Next-Cursor": next_cursor} if next_cursor else None)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _export_response(query, schema, fmt: ExportFormat, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_export(query, schema, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{EXTENSIONS[fmt]}"'},
+    )
+
+# Full history exports for notebooks (pandas/Polars), streamed from a server-side cursor
+@app.get("/export/transactions")
+async def export_transactions(
+    format: ExportFormat = ExportFormat.PARQUET,
+    isin: Optional[str] = None,
+    source: Optional[str] = None,
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+):
+    try:
+        query = (
+            select(
+                Transaction.id, Bond.isin, Transaction.timestamp,
+                Transaction.price, Transaction.quantity, Transaction.source,
+            )
+            .join(Bond, Transaction.bond_id == Bond.id)
+            .order_by(Transaction.timestamp.asc(), Transaction.id.asc())
+        )
+        if isin:
+            query = query.where(Bond.isin.in_(_split_csv(isin)))
+        if source:
+            query = query.where(Transaction.source == source)
+        if from_date:
+            query = query.where(Transaction.timestamp >= from_date)
+        if to_date:
+            query = query.where(Transaction.timestamp < to_date)
+        return _export_response(query, TRANSACTION_SCHEMA, format, "transactions")
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/export/bars")
+async def export_bars(
+    format: ExportFormat = ExportFormat.PARQUET,
+    interval: str = "1d",
+    isin: Optional[str] = None,
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+):
+    try:
+        if interval not in BAR_INTERVALS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported interval '{interval}'. Allowed: {', '.join(BAR_INTERVALS)}"
+            )
+        query = (
+            select(
+                Bond.isin, OHLCVBar.interval, OHLCVBar.bucket_start, OHLCVBar.open, OHLCVBar.high,
+                OHLCVBar.low, OHLCVBar.close, OHLCVBar.volume, OHLCVBar.trade_count,
+            )
+            .join(Bond, OHLCVBar.bond_id == Bond.id)
+            .where(OHLCVBar.interval == interval)
+            .order_by(OHLCVBar.bond_id.asc(), OHLCVBar.bucket_start.asc())
+        )
+        if isin:
+            query = query.where(Bond.isin.in_(_split_csv(isin)))
+        if from_date:
+            query = query.where(OHLCVBar.bucket_start >= from_date)
+        if to_date:
+            query = query.where(OHLCVBar.bucket_start < to_date)
+        return _export_response(query, BAR_SCHEMA, format, f"bars_{interval}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/ws/stats")
+async def get_websocket_stats():
+    return {
+        **ws_manager.stats(),
+        "live_updates_received": live_updates.received,
+        "live_updates": live_updates.stats(),
+        "resume": ws_resume_stats,
+    }
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await ws_manager.connect(websocket)
-    try:
-        # Send initial data
-        db = next(get_db())
-        transactions = db.query(Transaction).order_by(Transaction.timestamp.desc()).limit(100).all()
-        await ws_manager.send_initial_data(websocket, [
-            {
-                "id": t.id,
-                "bond_id": t.bond_id,
-                "timestamp": t.timestamp.isoformat() if t.timestamp else None,
-                "price": t.price,
-                "quantity": t.quantity
-            }
-            for t in transactions
-        ])
-        
+async def websocket_endpoint(websocket: WebSocket, protocol: Protocol = Protocol.JSON, since: Optional[str] = None):
+    """
+    Live updates. Clients receive every bond by default and can narrow the
+    stream by sending {"action": "subscribe", "isins": [...]} and
+    {"action": "unsubscribe", "isins": [...]}; unsubscribing from everything
+    (or sending no ISINs) restores the full stream.
+
+    ?protocol=msgpack or ?protocol=delta switches the server's messages to the
+    compact binary protocols of utils.ws_protocols; JSON is the default.
+
+    Every live message carries its sequence number ("seq"). A client that
+    reconnects with ?since=<last seq seen> is sent only the messages it missed
+    when the replay buffer still holds them all; otherwise, and on a first
+    connect, it gets an initial_data snapshot followed by anything newer.
+    """
+    missed = live_updates.buffer.since(since) if since else None
+    if missed is not None and len(missed) > ws_manager.max_queue:
+        # More than the client's queue holds: the snapshot is cheaper and loses nothing
+        missed = None
+    snapshot = None if missed is not None else await _ws_snapshot()
+    resume_from = since if snapshot is None else snapshot["seq"]
+
+    await ws_manager.connect(websocket, protocol, lambda: _ws_backlog(resume_from, snapshot))
+    try:
         while True:
             data = await websocket.receive_text()
-            # Handle incoming messages if needed
+            try:
+                message = json.loads(data)
+                action = message.get("action")
+                isins = message.get("isins")
+                if isins is not None and (
+                    not isinstance(isins, list) or not all(isinstance(i, str) for i in isins)
+                ):
+                    raise ValueError("isins must be a list of strings")
+            except (ValueError, AttributeError) as e:
+                await ws_manager.send_personal_message(websocket, {"type": "error", "data": f"Invalid message: {e}"})
+                continue
+            if action == "subscribe" and isins:
+                ws_manager.subscribe(websocket, isins)
+            elif action in ("subscribe", "unsubscribe"):
+                ws_manager.unsubscribe(websocket, isins if action == "unsubscribe" else None)
+            else:
+                await ws_manager.send_personal_message(websocket, {"type": "error", "data": f"Unknown action: {action}"})
+                continue
+            await ws_manager.send_personal_message(websocket, {
+                "type": "subscriptions",
+                "data": ws_manager.subscriptions(websocket)
+            })
     except WebSocketDisconnect:
+        pass
+    finally:
         ws_manager.disconnect(websocket)
 
 # New endpoint to fetch bond data from NSE
 @app.get("/nse/bond/{isin}")
 async def get_nse_bond_data(isin: str):
     scraper = NSEScraper()
-    transactions = scraper.fetch_bond_data(isin)
+    # The scrapers use blocking HTTP clients; keep them off the event loop
+    transactions = await run_in_threadpool(scraper.fetch_bond_data, isin)
     return transactions
 
 # New endpoint to fetch bond data from BSE
 @app.get("/bse/bond/{from_date}/{to_date}")
 async def get_bse_bond_data(from_date: str, to_date: str):
     scraper = BSEScraper()
-    transactions = scraper.fetch_bond_data(from_date, to_date)
+    transactions = await run_in_threadpool(scraper.fetch_bond_data, from_date, to_date)
     return transactions
 
 # New endpoint to trigger bond data fetch
@@ -162,4 +745,29 @@ async def trigger_bond_fetch():
         fetch_bond_data.delay()
         return {"message": "Bond data fetch triggered successfully"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Start a sharded history backfill, or resume an unfinished one (the latest by default)
+@app.post("/backfill/")
+async def trigger_backfill(run_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        from utils.celery_app import start_backfill
+        run_id, dispatch = await db.run_sync(begin_run, run_id)
+        if not dispatch:
+            return {"message": "Backfill already in progress", "run_id": run_id}
+        start_backfill.delay(run_id)
+        return {"message": "Backfill triggered successfully", "run_id": run_id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/backfill/progress")
+async def get_backfill_progress(run_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        progress = await db.run_sync(backfill_progress, run_id)
+        if progress is None:
+            raise HTTPException(status_code=404, detail="Backfill run not found")
+        return progress
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
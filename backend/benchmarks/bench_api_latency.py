@@ -0,0 +1,96 @@
+"""
+Load test the API under concurrency and report p50/p99 latency per endpoint.
+
+A pool of clients loops over the light endpoints while a few background
+clients keep issuing a heavy query. When handlers block the event loop,
+every light request queues behind the heavy one and p99 explodes; with the
+async database path it should stay close to p50.
+
+Start the API (uvicorn api.main:app --workers 1), then run:
+
+    python -m benchmarks.bench_api_latency --url http://localhost:8000 --concurrency 50 --duration 30
+
+To compare before/after, run the same command against a server started from
+a checkout before the async session change and against the current tree.
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+import aiohttp
+
+LIGHT_PATHS = [
+    "/",
+    "/bonds/?limit=50&fields=isin,last_price",
+    "/transactions/?limit=20",
+]
+HEAVY_PATH = "/transactions/?limit=1000&sort=timestamp&from=1970-01-01T00:00:00"
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def client(session, base_url, paths, deadline, latencies, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            async with session.get(base_url + path) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors[path] += 1
+                    continue
+        except aiohttp.ClientError:
+            errors[path] += 1
+            continue
+        latencies[path].append((time.perf_counter() - t0) * 1000)
+
+
+async def run(args):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    connector = aiohttp.TCPConnector(limit=args.concurrency + args.heavy)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.perf_counter() + args.duration
+        tasks = [
+            client(session, args.url, LIGHT_PATHS[i % len(LIGHT_PATHS):] + LIGHT_PATHS[:i % len(LIGHT_PATHS)],
+                   deadline, latencies, errors)
+            for i in range(args.concurrency)
+        ]
+        tasks += [client(session, args.url, [args.heavy_path], deadline, latencies, errors) for _ in range(args.heavy)]
+        await asyncio.gather(*tasks)
+
+    print(f"{'endpoint':<62}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for path in LIGHT_PATHS + [args.heavy_path]:
+        values = latencies[path]
+        print(
+            f"{path[:60]:<62}{len(values):>10}{errors[path]:>8}"
+            f"{percentile(values, 50):>10.1f}{percentile(values, 99):>10.1f}{max(values, default=float('nan')):>10.1f}"
+        )
+    light = [v for path in LIGHT_PATHS for v in latencies[path]]
+    print(f"\nlight endpoints overall: p50 {percentile(light, 50):.1f} ms, p99 {percentile(light, 99):.1f} ms, "
+          f"{len(light) / args.duration:.0f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50, help="clients looping over the light endpoints")
+    parser.add_argument("--heavy", type=int, default=2, help="clients looping over the heavy query")
+    parser.add_argument("--heavy-path", default=HEAVY_PATH)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    args = parser.parse_args()
+    args.url = args.url.rstrip("/")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Parse a synthetic BSE results table (the gvDebt layout) of --rows rows with the
+streaming row parser and with the old BeautifulSoup tree, reporting the time
+of each and how much it raised the process's peak RSS. The streaming runs go
+first (a tenth of the rows, then all of them) so the second one shows that its
+peak does not grow with the table.
+
+    python -m benchmarks.bench_bse_stream --rows 500000
+    python -m benchmarks.bench_bse_stream --rows 500000 --skip-soup --ingest
+
+--ingest also feeds the streamed records through bulk_ingest into DATABASE_URL
+(use a scratch database) before the BeautifulSoup run. Exits non-zero if the parsers disagree.
+"""
+import argparse
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bs4 import BeautifulSoup
+
+from data_acquisition.bse_scraper import iter_table_rows
+from utils.selenium_bond_scraper import iter_bse_rows
+
+TABLE_ID = "ContentPlaceHolder1_gvDebt"
+ROWS_PER_CHUNK = 500
+ISINS = 2000
+
+
+def table_chunks(rows):
+    """
+    Yield the HTML of the table in chunks, generated on the fly so the
+    document itself is never held in memory.
+    """
+    start = datetime(2024, 1, 1)
+    yield (
+        f'<html><body><table id="{TABLE_ID}"><tr><th>ISIN</th><th>Date</th><th>Name</th><th>Issuer</th>'
+        "<th>Open</th><th>Close</th><th>Quantity</th><th>Value</th></tr>"
+    )
+    for first in range(0, rows, ROWS_PER_CHUNK):
+        parts = []
+        for i in range(first, min(first + ROWS_PER_CHUNK, rows)):
+            isin = f"INE{i % ISINS:09d}"
+            day = start + timedelta(days=i // ISINS)
+            price = 100 + (i % 500) / 100
+            parts.append(
+                f"<tr><td>{isin}</td><td>{day:%d/%m/%Y}</td><td>Bond {isin}</td><td>Issuer {i % 97}</td>"
+                f"<td>{price:.2f}</td><td>{price:.2f}</td><td>{1000 + i % 9000:,}</td><td>{price * 1000:,.2f}</td></tr>"
+            )
+        yield "".join(parts)
+    yield "</table></body></html>"
+
+
+def stream_records(rows):
+    return iter_bse_rows(iter_table_rows(table_chunks(rows), TABLE_ID))
+
+
+def soup_records(html):
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", {"id": TABLE_ID})
+    rows = [[col.text.strip() for col in row.find_all("td")] for row in table.find_all("tr")[1:]]
+    return list(iter_bse_rows(rows))
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(label, func):
+    before = peak_rss_mb()
+    t0 = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<30} {elapsed:7.2f}s  peak RSS +{peak_rss_mb() - before:7.1f} MiB")
+    return result
+
+
+def consume(records):
+    """
+    Drain a record stream the way the ingest pipeline does, keeping only a count and the first record.
+    """
+    first, count = None, 0
+    for record in records:
+        first = first or record
+        count += 1
+    return count, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--skip-soup", action="store_true", help="do not build the BeautifulSoup tree")
+    parser.add_argument("--ingest", action="store_true", help="also run bulk_ingest on the streamed records")
+    args = parser.parse_args()
+    ok = True
+
+    small = max(args.rows // 10, 1)
+    count, _ = measure(f"stream {small:,} rows", lambda: consume(stream_records(small)))
+    ok &= count == small
+    count, first = measure(f"stream {args.rows:,} rows", lambda: consume(stream_records(args.rows)))
+    if count != args.rows:
+        print(f"  FAIL: streamed {count} records, expected {args.rows}")
+        ok = False
+
+    if args.ingest:
+        from database.migrations import run_migrations
+        from database.session import SessionLocal, engine
+        from utils.ingest import bulk_ingest
+
+        run_migrations(engine)
+        db = SessionLocal()
+        try:
+            stats = measure(f"stream + ingest {args.rows:,}", lambda: bulk_ingest(db, stream_records(args.rows)))
+        finally:
+            db.close()
+        print(f"  {stats['transactions']} new transactions, {stats['duplicates']} duplicates")
+
+    if not args.skip_soup:
+        html = "".join(table_chunks(args.rows))
+        records = measure(f"BeautifulSoup {args.rows:,} rows", lambda: soup_records(html))
+        if len(records) != count or records[0][1] != first[1]:
+            print("  FAIL: BeautifulSoup and the streaming parser disagree")
+            ok = False
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Exercise the NSE scraper against fixture HTML served from a local HTTP server,
+comparing one fresh Chromium per ISIN (the old behaviour) with the pooled,
+parallel NSE phase. Needs Chromium and chromedriver (CHROME_BIN,
+CHROMEDRIVER_PATH), as in the backend image.
+
+    python -m benchmarks.bench_driver_pool --isins 20 --pool-size 4
+
+Exits non-zero if either mode parses different rows than the fixture holds.
+"""
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import selenium_bond_scraper
+from utils.driver_pool import DriverPool
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+FIXTURE_PAGE = "nse_trades.html"
+FIXTURE_ROWS = 5
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures():
+    handler = functools.partial(QuietHandler, directory=FIXTURES)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check(records, isins):
+    expected = FIXTURE_ROWS * len(isins)
+    if len(records) != expected:
+        print(f"  FAIL: parsed {len(records)} rows, expected {expected}")
+        return False
+    first_bond, first_txn = records[0]
+    if first_txn["price"] != 101.25 or first_txn["quantity"] != 1500 or first_txn["source"] != "NSE":
+        print(f"  FAIL: unexpected first row {first_txn}")
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--isins", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--max-uses", type=int, default=50)
+    parser.add_argument("--skip-fresh", action="store_true", help="only run the pooled mode")
+    args = parser.parse_args()
+
+    server = serve_fixtures()
+    selenium_bond_scraper.NSE_URL = f"http://127.0.0.1:{server.server_port}/{FIXTURE_PAGE}"
+    isins = [f"INE{i:09d}" for i in range(args.isins)]
+    ok = True
+
+    if not args.skip_fresh:
+        t0 = time.perf_counter()
+        records = []
+        for isin in isins:
+            records.extend(selenium_bond_scraper.scrape_nse_for_isin(isin))
+        elapsed = time.perf_counter() - t0
+        print(f"fresh driver per ISIN: {elapsed:.1f}s, {len(isins)} browser starts")
+        ok &= check(records, isins)
+
+    pool = DriverPool(selenium_bond_scraper.get_headless_chrome, size=args.pool_size, max_uses=args.max_uses)
+    t0 = time.perf_counter()
+    try:
+        records, _, _ = selenium_bond_scraper.scrape_nse_parallel(isins, pool=pool)
+    finally:
+        pool.close()
+    elapsed = time.perf_counter() - t0
+    print(f"pooled x{args.pool_size}:           {elapsed:.1f}s, {pool.stats}")
+    ok &= check(records, isins)
+
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Run the async HTTP ingestion client against a local stub of NSE and BSE that
+replays recorded responses (benchmarks/fixtures), and compare it with the
+blocking NSEScraper fetching the same ISINs one after another.
+
+The stub behaves like the exchanges where it matters: API calls without the
+landing-page cookie get 401, every response takes --latency seconds, and a
+share of requests (--error-rate) fail with 503 to exercise the retries.
+
+    python -m benchmarks.bench_http_ingest --isins 200 --latency 0.05 --error-rate 0.05
+
+Exits non-zero if the parsed rows differ from the fixtures.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+from data_acquisition import http_client
+from data_acquisition.nse_scraper import NSEScraper
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+NSE_ROWS = 5
+BSE_ROWS = 5
+COOKIE = "bm_sv"
+
+
+def build_stub(latency, error_rate, counters):
+    with open(os.path.join(FIXTURES, "nse_trades.json")) as f:
+        nse_body = f.read()
+    with open(os.path.join(FIXTURES, "bse_debt_search.html")) as f:
+        bse_body = f.read()
+
+    async def landing(request):
+        counters["landing"] += 1
+        response = web.Response(text="<html></html>", content_type="text/html")
+        response.set_cookie(COOKIE, "stub")
+        return response
+
+    async def replay(request, body, content_type):
+        counters["api"] += 1
+        await asyncio.sleep(latency)
+        if COOKIE not in request.cookies:
+            return web.Response(status=401)
+        if random.random() < error_rate:
+            counters["errors"] += 1
+            return web.Response(status=503)
+        return web.Response(text=body, content_type=content_type)
+
+    app = web.Application()
+    app.router.add_get(http_client.NSE_HOME_PATH, landing)
+    app.router.add_get(http_client.BSE_HOME_PATH, landing)
+    app.router.add_get(http_client.NSE_TRADES_PATH, lambda r: replay(r, nse_body, "application/json"))
+    app.router.add_post(http_client.BSE_SEARCH_PATH, lambda r: replay(r, bse_body, "text/html"))
+    return app
+
+
+def start_stub(app):
+    """
+    Serve the stub from its own event loop in a background thread; returns its base URL.
+    """
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--isins", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per stub response")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate-limit", type=float, default=200.0, help="requests per second per host")
+    parser.add_argument("--skip-sync", action="store_true", help="do not run the blocking NSEScraper")
+    args = parser.parse_args()
+
+    counters = {"landing": 0, "api": 0, "errors": 0}
+    base_url = start_stub(build_stub(args.latency, args.error_rate, counters))
+    isins = [f"INE{i:09d}" for i in range(args.isins)]
+    to_date = datetime(2024, 6, 30)
+    from_date = to_date - timedelta(days=180)
+    options = {
+        "nse_base_url": base_url, "bse_base_url": base_url,
+        "concurrency": args.concurrency, "rate_limit": args.rate_limit,
+    }
+    ok = True
+
+    t0 = time.perf_counter()
+    starts = dict.fromkeys(isins, from_date)
+    records, found, failed, hashes = http_client.fetch_nse_records(starts, to_date, **options)
+    elapsed = time.perf_counter() - t0
+    print(f"async NSE:  {len(isins)} ISINs in {elapsed:.2f}s, {len(records)} records, "
+          f"{len(failed)} failed, stub {counters}")
+    if len(records) + NSE_ROWS * len(failed) != NSE_ROWS * len(isins):
+        print("  FAIL: unexpected NSE record count")
+        ok = False
+    bond, txn = records[0]
+    if (txn["price"], txn["open"], txn["high"], txn["low"]) != (101.25, 101.10, 101.40, 101.00):
+        print(f"  FAIL: unexpected first NSE record {txn}")
+        ok = False
+
+    t0 = time.perf_counter()
+    bse_records, bse_hash = http_client.fetch_bse_records(from_date, to_date, **options)
+    bse_records = None if bse_records is None else list(bse_records)
+    windows = len(http_client.date_windows(from_date, to_date))
+    elapsed = time.perf_counter() - t0
+    if bse_records is None:
+        print("async BSE:  a window failed after retries (the caller would fall back to Selenium)")
+    else:
+        print(f"async BSE:  {windows} windows in {elapsed:.2f}s, {len(bse_records)} records")
+        if len(bse_records) != BSE_ROWS * windows:
+            print("  FAIL: unexpected BSE record count")
+            ok = False
+
+    # A second fetch of the same payloads is recognised by their hashes and not parsed
+    t0 = time.perf_counter()
+    records, _, failed, _ = http_client.fetch_nse_records(starts, to_date, known_hashes=hashes, **options)
+    bse_records, _ = http_client.fetch_bse_records(from_date, to_date, known_hash=bse_hash, **options)
+    bse_records = list(bse_records or [])
+    elapsed = time.perf_counter() - t0
+    print(f"unchanged:  {elapsed:.2f}s, {len(records)} NSE records, {len(bse_records)} BSE records")
+    if records or (bse_hash and bse_records):
+        print("  FAIL: unchanged payloads were parsed")
+        ok = False
+
+    if not args.skip_sync:
+        NSEScraper.HOME_URL = base_url + http_client.NSE_HOME_PATH
+        NSEScraper.BASE_URL = base_url + http_client.NSE_TRADES_PATH
+        scraper = NSEScraper()
+        t0 = time.perf_counter()
+        rows = [row for isin in isins for row in scraper.fetch_bond_data(isin)]
+        elapsed = time.perf_counter() - t0
+        print(f"sync NSE:   {len(isins)} ISINs in {elapsed:.2f}s, {len(rows)} rows")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Value a --positions book over --bonds synthetic bonds as POST
+/portfolio/valuate does: parse the request body, match and value every
+position in one vectorized pass, and encode the streamed response in both
+layouts. Compared with looking up and valuing each position in a Python loop.
+
+    python -m benchmarks.bench_portfolio_valuation --positions 100000 --bonds 50000
+
+Exits non-zero if the two valuations disagree.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+
+import numpy as np
+import orjson
+
+from analytics.portfolio import BondTable, PositionLayout, encode_valuation, parse_positions, valuate
+
+REPEAT = 5
+
+
+def bond_rows(count):
+    """
+    (isin, *VALUATION_COLUMNS) rows; every 50th bond has no price.
+    """
+    return [
+        (f"INE{i:09d}", None if i % 50 == 0 else random.uniform(90, 110), random.uniform(0, 4),
+         random.uniform(6, 10), random.uniform(0.5, 15), random.uniform(0.5, 14), random.uniform(1, 300))
+        for i in range(count)
+    ]
+
+
+def request_body(bonds, count):
+    # A few positions in ISINs the app does not track
+    isins = [f"INE{random.randrange(bonds):09d}" if i % 1000 else f"XS{i:010d}" for i in range(count)]
+    positions = [{"isin": isin, "quantity": random.randint(-500, 5000)} for isin in isins]
+    return orjson.dumps({"positions": positions})
+
+
+def per_position(body, rows):
+    """
+    The same valuation one position at a time.
+    """
+    bonds = {row[0]: row for row in rows}
+    market_value = dv01 = 0.0
+    results = []
+    for position in json.loads(body)["positions"]:
+        bond = bonds.get(position["isin"])
+        if bond is None or bond[1] is None:
+            results.append({"isin": position["isin"], "quantity": position["quantity"], "market_value": None})
+            continue
+        _, price, accrued, ytm, macaulay, modified, convexity = bond
+        value = position["quantity"] * (price + accrued)
+        market_value += value
+        dv01 += modified * value * 1e-4
+        results.append({"isin": position["isin"], "quantity": position["quantity"], "market_value": value,
+                        "dv01": modified * value * 1e-4, "modified_duration": modified})
+    return json.dumps({"summary": {"market_value": market_value, "dv01": dv01}, "positions": results}).encode()
+
+
+def timed(fn):
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=100_000)
+    parser.add_argument("--bonds", type=int, default=50_000)
+    args = parser.parse_args()
+
+    rows = bond_rows(args.bonds)
+    body = request_body(args.bonds, args.positions)
+    table = BondTable.from_rows(rows)
+
+    parse_ms, (isins, quantities) = timed(lambda: parse_positions(body))
+    valuate_ms, valuation = timed(lambda: valuate(isins, quantities, table))
+    encode_ms, encoded = timed(lambda: b"".join(encode_valuation(valuation)))
+    columns_ms, columns = timed(lambda: b"".join(encode_valuation(valuation, PositionLayout.COLUMNS)))
+    loop_ms, expected = timed(lambda: per_position(body, rows))
+
+    total = parse_ms + valuate_ms + encode_ms
+    print(f"{args.positions:,} positions over {args.bonds:,} bonds, {len(body) / 1e6:.1f} MB request\n")
+    print(f"parse request      {parse_ms:8.1f} ms")
+    print(f"match and value    {valuate_ms:8.1f} ms")
+    print(f"encode rows        {encode_ms:8.1f} ms  ({len(encoded) / 1e6:.1f} MB)")
+    print(f"encode columns     {columns_ms:8.1f} ms  ({len(columns) / 1e6:.1f} MB)")
+    print(f"total (rows)       {total:8.1f} ms  {args.positions / total * 1000:>12,.0f} positions/s")
+    print(f"per-position loop  {loop_ms:8.1f} ms  {args.positions / loop_ms * 1000:>12,.0f} positions/s")
+
+    summary, reference = orjson.loads(encoded)["summary"], json.loads(expected)["summary"]
+    ok = all(math.isclose(summary[key], reference[key], rel_tol=1e-9) for key in ("market_value", "dv01"))
+    if not ok:
+        print(f"FAIL: vectorized {summary} != per-position {reference}")
+    by_row, by_column = orjson.loads(encoded)["positions"], orjson.loads(columns)["positions"]
+    if [position["market_value"] for position in by_row] != by_column["market_value"]:
+        print("FAIL: the rows and columns layouts differ")
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Encode --rows synthetic transactions, as the database returns them (tuples),
+into a JSON response body and into one WebSocket frame per trade, with the
+shared orjson serializer and with the per-row dict building and json/FastAPI
+encoding it replaced. Reports rows per second and MB per second of each path.
+
+    python -m benchmarks.bench_serialization --rows 100000
+
+Exits non-zero if the encoded payloads do not decode to the same data.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from utils.serialization import TRANSACTION_FIELDS, dumps, dumps_text, rows_to_dicts
+
+REPEAT = 3
+
+
+def transaction_rows(count):
+    start = datetime(2024, 1, 1)
+    return [
+        (i, i % 500, f"INE{i % 500:09d}", start + timedelta(seconds=37 * i, microseconds=i % 1000),
+         100 + random.random() * 5, random.randint(1, 10_000), "NSE" if i % 2 else "BSE")
+        for i in range(1, count + 1)
+    ]
+
+
+def legacy_dicts(rows):
+    return [
+        {
+            "id": row[0],
+            "bond_id": row[1],
+            "isin": row[2],
+            "timestamp": row[3].isoformat() if row[3] else None,
+            "price": row[4],
+            "quantity": row[5],
+            "source": row[6],
+        }
+        for row in rows
+    ]
+
+
+PATHS = {
+    "response: dicts + FastAPI encoder": lambda rows: json.dumps(jsonable_encoder(legacy_dicts(rows))).encode(),
+    "response: dicts + json.dumps": lambda rows: json.dumps(legacy_dicts(rows), separators=(",", ":")).encode(),
+    "response: orjson from tuples": lambda rows: dumps(rows_to_dicts(TRANSACTION_FIELDS, rows)),
+    "frames: json.dumps per message": lambda rows: [
+        json.dumps({"type": "new_transaction", "data": data}) for data in legacy_dicts(rows)
+    ],
+    "frames: orjson per message": lambda rows: [
+        dumps_text({"type": "new_transaction", "data": data}) for data in rows_to_dicts(TRANSACTION_FIELDS, rows)
+    ],
+}
+
+
+def size_of(encoded):
+    return len(encoded) if isinstance(encoded, bytes) else sum(len(frame) for frame in encoded)
+
+
+def decoded(encoded):
+    if isinstance(encoded, bytes):
+        return json.loads(encoded)
+    return [json.loads(frame)["data"] for frame in encoded]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = transaction_rows(args.rows)
+    expected = json.loads(json.dumps(legacy_dicts(rows)))
+    ok = True
+    for label, encode in PATHS.items():
+        best = float("inf")
+        for _ in range(REPEAT):
+            t0 = time.perf_counter()
+            encoded = encode(rows)
+            best = min(best, time.perf_counter() - t0)
+        megabytes = size_of(encoded) / 1e6
+        print(f"{label:<36} {best:7.3f}s  {args.rows / best:>12,.0f} rows/s  {megabytes / best:8.1f} MB/s")
+        if decoded(encoded) != expected:
+            print(f"  FAIL: {label} decodes to different data")
+            ok = False
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
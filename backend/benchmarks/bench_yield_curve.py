@@ -0,0 +1,85 @@
+"""
+Benchmark the government curve fit on synthetic GOI bonds priced off a known
+Nelson-Siegel curve plus price noise: a first fit, a refit from the previous
+curve after prices move (as on each ingest) and the spreads of every bond.
+
+    python -m benchmarks.bench_yield_curve --bonds 300
+
+Exits non-zero if a fitted curve misses the true zero rates by more than
+--max-error-bp at any standard tenor within the constituents' maturities.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+from analytics.curve import CURVE_TENORS, CurveInputs, CurveModel, ZeroCurve, bond_spreads, fit_curve
+from analytics.pricing import CashFlowSchedule
+
+TRUE_CURVE = {"params": [0.072, -0.012, 0.018], "tau": 2.5}
+
+
+def synthetic_inputs(count, settlement, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    true = ZeroCurve(CurveModel.NELSON_SIEGEL, TRUE_CURVE["params"], settlement, tau=TRUE_CURVE["tau"])
+    maturity = np.datetime64(settlement, "D") + rng.integers(60, 40 * 365, size=count).astype("timedelta64[D]")
+    coupon = np.round(rng.uniform(0.0, 9.0, size=count), 2)
+    schedule = CashFlowSchedule(coupon, np.full(count, 100.0), maturity, settlement)
+    owner, periods, amounts = schedule.flows()
+    dirty = np.bincount(owner, weights=amounts * true.discount(periods / schedule.frequency), minlength=count)
+    clean = dirty - schedule.accrued_interest + rng.normal(0.0, noise, size=count)
+    rows = [
+        SimpleNamespace(isin=f"IN0020{i:06d}", name=f"GS {i}", coupon_rate=coupon[i], face_value=100.0,
+                        maturity_date=maturity[i].astype(datetime), price=clean[i])
+        for i in range(count)
+    ]
+    return true, CurveInputs(rows, settlement)
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(timings)), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bonds", type=int, default=300)
+    parser.add_argument("--noise", type=float, default=0.02, help="Price noise (standard deviation, per 100)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-error-bp", type=float, default=15.0)
+    args = parser.parse_args()
+
+    settlement = datetime(2024, 1, 1)
+    true, inputs = synthetic_inputs(args.bonds, settlement, args.noise)
+    # The same bonds after the market moves: every price changes slightly
+    _, moved = synthetic_inputs(args.bonds, settlement, args.noise)
+    moved.price = inputs.price + np.random.default_rng(2).normal(0.0, 0.05, size=args.bonds)
+
+    flows = len(inputs.schedule.flows()[0])
+    print(f"{args.bonds} bonds, {flows:,} cash flows, price noise {args.noise}\n")
+    print(f"{'model':<14} {'first fit ms':>12} {'refit ms':>9} {'spreads ms':>11} {'rmse bp':>8} {'max error bp':>13}")
+    years = inputs.schedule.years
+    tenors = np.array([t for t in CURVE_TENORS if years.min() <= t <= years.max()])
+    ok = True
+    for model in CurveModel:
+        first, curve = timed(lambda: fit_curve(inputs, model), args.repeat)
+        refit, _ = timed(lambda: fit_curve(moved, model, previous=curve), args.repeat)
+        spreads, _ = timed(lambda: bond_spreads(inputs, curve), args.repeat)
+        error = float(np.max(np.abs(curve.zero_rate(tenors) - true.zero_rate(tenors))) * 1e4)
+        print(f"{model.value:<14} {first:>12.2f} {refit:>9.2f} {spreads:>11.2f} {curve.rmse_bp:>8.2f} {error:>13.2f}")
+        if error > args.max_error_bp:
+            print(f"  FAIL: {model.value} misses the true curve by {error:.1f} bp")
+            ok = False
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
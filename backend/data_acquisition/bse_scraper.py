@@ -1,12 +1,172 @@
 import requests
 import logging
-from typing import Dict, List, Optional, Any
-from bs4 import BeautifulSoup
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Any
+from html.parser import HTMLParser
 from datetime import datetime
 import time
 
 logger = logging.getLogger(__name__)
 
+# id of the results table on the BSE debt search page
+BSE_TABLE_ID = 'ctl00_ContentPlaceHolder1_gvDebt'
+# Bytes read from the response per parser feed
+STREAM_CHUNK_BYTES = 64 * 1024
+# ASP.NET hidden fields (__VIEWSTATE, __EVENTVALIDATION, ...) differ on every response
+HIDDEN_INPUT_RE = re.compile(r'<input[^>]*type="hidden"[^>]*>', re.IGNORECASE)
+
+def bse_search_form(from_date: str, to_date: str) -> Dict[str, str]:
+    """
+    Form fields of the BSE debt search for a date range.
+    """
+    return {
+        'ctl00$ContentPlaceHolder1$txtFromDate': from_date,
+        'ctl00$ContentPlaceHolder1$txtToDate': to_date,
+        'ctl00$ContentPlaceHolder1$btnSubmit': 'Submit'
+    }
+
+def _clean_numeric(value: str) -> float:
+    return float(value.strip().replace(',', '')) if value.strip() else 0.0
+
+def _clean_volume(value: str) -> int:
+    return int(value.strip().replace(',', '')) if value.strip() else 0
+
+class TableRowParser(HTMLParser):
+    """
+    Incremental (SAX-style) parser that collects the <td> texts of each row of
+    one table without building a document tree. Feed it text chunks and drain
+    `rows` as it goes; memory stays bounded by the rows not drained yet.
+    """
+    def __init__(self, table_id: str):
+        super().__init__(convert_charrefs=True)
+        self.table_id = table_id
+        self.found = False
+        self.rows: List[List[str]] = []
+        self._depth = 0  # <table> nesting depth inside the target table, 0 when outside
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            if self._depth:
+                self._depth += 1
+            elif dict(attrs).get('id') == self.table_id:
+                self._depth = 1
+                self.found = True
+        elif self._depth == 1:
+            if tag == 'tr':
+                self._end_row()
+                self._row = []
+            elif tag in ('td', 'th'):
+                self._end_cell()
+                # Header cells are skipped, like find_all('td') did
+                self._cell = [] if tag == 'td' and self._row is not None else None
+
+    def handle_endtag(self, tag):
+        if not self._depth:
+            return
+        if tag == 'table':
+            self._depth -= 1
+            if not self._depth:
+                self._end_row()
+        elif self._depth == 1:
+            if tag in ('td', 'th'):
+                self._end_cell()
+            elif tag == 'tr':
+                self._end_row()
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def _end_cell(self):
+        if self._cell is not None:
+            self._row.append(''.join(self._cell).strip())
+            self._cell = None
+
+    def _end_row(self):
+        self._end_cell()
+        if self._row is not None:
+            self.rows.append(self._row)
+            self._row = None
+
+def iter_table_rows(chunks: Iterable[str], table_id: str, skip: int = 1) -> Iterator[List[str]]:
+    """
+    Stream the cell texts of each row of a table from HTML arriving in chunks,
+    skipping the first `skip` rows (the header).
+    """
+    parser = TableRowParser(table_id)
+    seen = 0
+    for chunk in chunks:
+        parser.feed(chunk)
+        for row in parser.rows:
+            seen += 1
+            if seen > skip:
+                yield row
+        parser.rows.clear()
+    parser.close()
+    for row in parser.rows:
+        seen += 1
+        if seen > skip:
+            yield row
+    if not parser.found:
+        logger.warning(f"No table with id {table_id} found")
+
+def iter_bse_trades(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream OHLC dicts out of a BSE debt search result page arriving in chunks.
+    """
+    for cols in iter_table_rows(chunks, BSE_TABLE_ID):
+        if len(cols) >= 8:  # Ensure we have all required columns
+            try:
+                yield {
+                    'isin': cols[0],
+                    'date': cols[1],
+                    'open': _clean_numeric(cols[2]),
+                    'high': _clean_numeric(cols[3]),
+                    'low': _clean_numeric(cols[4]),
+                    'close': _clean_numeric(cols[5]),
+                    'volume': _clean_volume(cols[6]),
+                    'source': 'BSE'
+                }
+            except (ValueError, IndexError) as e:
+                logger.error(f"Error parsing row data: {e}")
+                continue
+
+def bse_payload_content(html: str) -> str:
+    """
+    The part of a BSE result page that changes only when the trades do,
+    for content hashing.
+    """
+    return HIDDEN_INPUT_RE.sub('', html)
+
+class BSEPayloadContent:
+    """
+    bse_payload_content() of a page fed in chunks: feed() returns the content
+    of each chunk and close() the rest. A tag cut by a chunk boundary is held
+    back until its closing '>' arrives.
+    """
+    def __init__(self):
+        self._pending = ''
+
+    def feed(self, chunk: str) -> str:
+        pending = self._pending + chunk
+        cut = pending.rfind('<')
+        if cut == -1 or '>' in pending[cut:]:
+            cut = len(pending)
+        self._pending = pending[cut:]
+        return HIDDEN_INPUT_RE.sub('', pending[:cut])
+
+    def close(self) -> str:
+        pending, self._pending = self._pending, ''
+        return HIDDEN_INPUT_RE.sub('', pending)
+
+def parse_bse_trades(html: str) -> List[Dict[str, Any]]:
+    """
+    Extract OHLC dicts from a BSE debt search result page.
+    """
+    return list(iter_bse_trades([html]))
+
 class BSEScraper:
     """
     Class to scrape bond data from BSE website.
@@ -15,19 +175,23 @@ class BSEScraper:
     BASE_URL = "https://www.bseindia.com/markets/debt/debt_search.aspx"
     SEARCH_URL = "https://www.bseindia.com/markets/debt/debt_search_result.aspx"
 
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Referer': 'https://www.bseindia.com/markets/debt/debt_search.aspx',
+        'Origin': 'https://www.bseindia.com',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1'
+    }
+
     def __init__(self):
         self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Referer': 'https://www.bseindia.com/markets/debt/debt_search.aspx',
-            'Origin': 'https://www.bseindia.com',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        })
-
-    def _make_request(self, url: str, params: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None) -> requests.Response:
+        self.session.headers.update(self.HEADERS)
+        self._warmed = False
+
+    def _make_request(self, url: str, params: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None,
+                      stream: bool = False) -> requests.Response:
         """
         Make HTTP request to BSE website with retry mechanism.
         """
@@ -36,17 +200,20 @@ class BSEScraper:
 
         for attempt in range(max_retries):
             try:
-                # First visit the search page to get cookies
-                self.session.get(self.BASE_URL)
+                # Visit the search page for cookies once per session, and again after a failure
+                if not self._warmed:
+                    self.session.get(self.BASE_URL, timeout=30)
+                    self._warmed = True
                 
                 # Then make the actual request
                 if data:
-                    response = self.session.post(url, data=data, params=params, timeout=30)
+                    response = self.session.post(url, data=data, params=params, timeout=30, stream=stream)
                 else:
-                    response = self.session.get(url, params=params, timeout=30)
+                    response = self.session.get(url, params=params, timeout=30, stream=stream)
                 response.raise_for_status()
                 return response
             except requests.exceptions.RequestException as e:
+                self._warmed = False
                 if attempt == max_retries - 1:
                     logger.error(f"Request failed after {max_retries} attempts: {e}")
                     raise
@@ -60,50 +227,15 @@ class BSEScraper:
         logger.info(f"Fetching bond data from BSE for date range: {from_date} to {to_date}")
         
         # Prepare form data for POST request
-        data = {
-            'ctl00$ContentPlaceHolder1$txtFromDate': from_date,
-            'ctl00$ContentPlaceHolder1$txtToDate': to_date,
-            'ctl00$ContentPlaceHolder1$btnSubmit': 'Submit'
-        }
+        data = bse_search_form(from_date, to_date)
         
         try:
-            response = self._make_request(self.SEARCH_URL, data=data)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find the table containing bond data
-            table = soup.find('table', {'id': 'ctl00_ContentPlaceHolder1_gvDebt'})
-            if not table:
-                logger.warning("No bond data table found in BSE response")
-                return []
-
-            transactions = []
-            rows = table.find_all('tr')[1:]  # Skip header row
-            
-            for row in rows:
-                cols = row.find_all('td')
-                if len(cols) >= 8:  # Ensure we have all required columns
-                    try:
-                        # Clean and parse numeric values
-                        def clean_numeric(value: str) -> float:
-                            return float(value.strip().replace(',', '')) if value.strip() else 0.0
-                        
-                        def clean_volume(value: str) -> int:
-                            return int(value.strip().replace(',', '')) if value.strip() else 0
-
-                        transaction = {
-                            'isin': cols[0].text.strip(),
-                            'date': cols[1].text.strip(),
-                            'open': clean_numeric(cols[2].text),
-                            'high': clean_numeric(cols[3].text),
-                            'low': clean_numeric(cols[4].text),
-                            'close': clean_numeric(cols[5].text),
-                            'volume': clean_volume(cols[6].text),
-                            'source': 'BSE'
-                        }
-                        transactions.append(transaction)
-                    except (ValueError, IndexError) as e:
-                        logger.error(f"Error parsing row data: {e}")
-                        continue
+            response = self._make_request(self.SEARCH_URL, data=data, stream=True)
+            with response:
+                # Parse the page as it arrives instead of building a tree of the whole result
+                response.encoding = response.encoding or 'utf-8'
+                chunks = response.iter_content(chunk_size=STREAM_CHUNK_BYTES, decode_unicode=True)
+                transactions = list(iter_bse_trades(chunks))
 
             logger.info(f"Successfully fetched {len(transactions)} transactions from BSE for date range: {from_date} to {to_date}")
             return transactions
@@ -0,0 +1,410 @@
+"""
+Asyncio HTTP ingestion for NSE and BSE.
+
+One aiohttp session per run: the landing page of each exchange is visited
+once to obtain cookies (again only after a 401/403), requests to a host are
+spaced by a per-host rate limit, and failures are retried with exponential
+backoff plus full jitter. NSE responses are parsed in a worker thread so the
+event loop keeps fetching while large payloads are decoded. Callers fall back
+to the Selenium scrapers for whatever this path could not fetch.
+
+Every payload gets a content hash. Callers pass the hashes of their previous
+fetch, and a payload whose hash did not change is not parsed at all.
+
+BSE result pages can be large, so they are never read whole: each page is
+streamed chunk by chunk into a spooled temporary file (in memory up to
+BSE_SPOOL_MAX_CHARS, on disk beyond) and hashed on the way. Once every
+window is in and the hash is known to have changed, the spooled pages are
+parsed lazily into records for the chunked bulk_ingest.
+
+Base URLs come from NSE_BASE_URL / BSE_BASE_URL so the client can be pointed
+at a local stub server (see benchmarks/bench_http_ingest.py).
+"""
+import asyncio
+import codecs
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from functools import partial
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from data_acquisition.nse_scraper import NSEScraper, nse_trade_params, parse_nse_trades
+from data_acquisition.bse_scraper import (
+    STREAM_CHUNK_BYTES, BSEPayloadContent, BSEScraper, bse_search_form, iter_bse_trades,
+)
+from database.models import Exchange
+
+logger = logging.getLogger(__name__)
+
+NSE_BASE_URL = os.getenv("NSE_BASE_URL", "https://www.nseindia.com")
+BSE_BASE_URL = os.getenv("BSE_BASE_URL", "https://www.bseindia.com")
+NSE_HOME_PATH = "/"
+NSE_TRADES_PATH = "/api/historical/security-wise-trades"
+BSE_HOME_PATH = "/markets/debt/debt_search.aspx"
+BSE_SEARCH_PATH = "/markets/debt/debt_search_result.aspx"
+
+# Requests in flight at once, across hosts
+HTTP_CONCURRENCY = int(os.getenv("HTTP_INGEST_CONCURRENCY", "8"))
+# Requests per second sent to any one host
+HOST_RATE_LIMIT = float(os.getenv("HTTP_INGEST_RATE_LIMIT", "4"))
+REQUEST_TIMEOUT = 30  # seconds
+MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5  # seconds
+RETRY_MAX_DELAY = 15.0  # seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+REWARM_STATUSES = {401, 403}
+
+# BSE searches are split into date windows of this many days
+BSE_WINDOW_DAYS = 30
+# Characters of one BSE page kept in memory before its spool moves to disk
+BSE_SPOOL_MAX_CHARS = int(os.getenv("BSE_SPOOL_MAX_CHARS", str(1024 * 1024)))
+TRADE_DATE_FORMATS = ("%d-%b-%Y", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y", "%Y-%m-%d")
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to one host to at most `rate` per second.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status} from {url}")
+        self.status = status
+
+
+class MarketDataClient:
+    """
+    Concurrent NSE/BSE fetcher. Use as `async with MarketDataClient() as client`.
+    """
+
+    def __init__(self, nse_base_url: str = NSE_BASE_URL, bse_base_url: str = BSE_BASE_URL,
+                 concurrency: int = HTTP_CONCURRENCY, rate_limit: float = HOST_RATE_LIMIT):
+        self.nse_base_url = nse_base_url.rstrip("/")
+        self.bse_base_url = bse_base_url.rstrip("/")
+        self.rate_limit = rate_limit
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiters: Dict[str, HostRateLimiter] = {}
+        self._warm_locks: Dict[str, asyncio.Lock] = {}
+        self._warm_done = set()
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.stats = {"requests": 0, "retries": 0, "warmups": 0, "failures": 0}
+
+    async def __aenter__(self):
+        # unsafe=True keeps cookies for IP-address hosts such as a local stub server
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _limiter(self, url: str) -> HostRateLimiter:
+        host = urlsplit(url).netloc
+        if host not in self._limiters:
+            self._limiters[host] = HostRateLimiter(self.rate_limit)
+        return self._limiters[host]
+
+    async def _warm(self, home_url: str, headers: Dict[str, str]):
+        """
+        Visit the landing page once per session so the exchange sets its cookies.
+        """
+        host = urlsplit(home_url).netloc
+        lock = self._warm_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            if host in self._warm_done:
+                return
+            await self._limiter(home_url).wait()
+            async with self.session.get(home_url, headers=headers) as response:
+                await response.read()
+            self._warm_done.add(host)
+            self.stats["warmups"] += 1
+
+    async def _request(self, method: str, url: str, home_url: str, headers: Dict[str, str],
+                       read=aiohttp.ClientResponse.text, **kwargs) -> Any:
+        """
+        Send one request and return read(response) (by default the body as
+        text), retrying transient failures.
+        """
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                await self._warm(home_url, headers)
+                async with self._semaphore:
+                    await self._limiter(url).wait()
+                    self.stats["requests"] += 1
+                    async with self.session.request(method, url, headers=headers, **kwargs) as response:
+                        if response.status in REWARM_STATUSES:
+                            # Session cookies expired: drop them and warm up again before retrying
+                            self._warm_done.discard(urlsplit(home_url).netloc)
+                            raise RetryableStatus(response.status, url)
+                        if response.status in RETRY_STATUSES:
+                            raise RetryableStatus(response.status, url)
+                        response.raise_for_status()
+                        return await read(response)
+            except (RetryableStatus, aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError,
+                    asyncio.TimeoutError) as e:
+                if attempt == MAX_ATTEMPTS:
+                    self.stats["failures"] += 1
+                    logger.error(f"Request failed after {MAX_ATTEMPTS} attempts: {e}")
+                    raise
+                # Full jitter keeps concurrent retries from hitting the host in lockstep
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                self.stats["retries"] += 1
+                logger.warning(f"Request failed (attempt {attempt}/{MAX_ATTEMPTS}): {e}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _parse(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def fetch_nse_trades(self, isin: str, from_date: datetime, to_date: datetime,
+                               known_hash: Optional[str] = None) -> Tuple[Optional[List[Dict[str, Any]]], str]:
+        """
+        Returns (rows, content hash); rows is None when the hash equals known_hash.
+        """
+        body = await self._request(
+            "GET", self.nse_base_url + NSE_TRADES_PATH, self.nse_base_url + NSE_HOME_PATH, NSEScraper.HEADERS,
+            params=nse_trade_params(isin, from_date, to_date),
+        )
+        content_hash = payload_hash(body)
+        if content_hash == known_hash:
+            return None, content_hash
+        return await self._parse(_parse_nse_body, body, isin), content_hash
+
+    async def fetch_bse_page(self, from_date: datetime, to_date: datetime) -> Tuple[IO[str], str]:
+        """
+        Returns (the result page spooled to a temporary file, its content hash).
+        """
+        return await self._request(
+            "POST", self.bse_base_url + BSE_SEARCH_PATH, self.bse_base_url + BSE_HOME_PATH, BSEScraper.HEADERS,
+            read=spool_bse_page,
+            data=bse_search_form(from_date.strftime("%d-%m-%Y"), to_date.strftime("%d-%m-%Y")),
+        )
+
+    async def fetch_nse_many(self, starts: Dict[str, datetime], to_date: datetime,
+                             known_hashes: Optional[Dict[str, str]] = None
+                             ) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str], Dict[str, str]]:
+        """
+        Fetch NSE trades for many ISINs concurrently, each from its own start date.
+        Returns (rows per changed ISIN, ISINs that failed, content hash per fetched ISIN);
+        ISINs whose payload hash equals known_hashes are left out of the rows.
+        """
+        known_hashes = known_hashes or {}
+        isins = sorted(starts)
+        results = await asyncio.gather(
+            *(self.fetch_nse_trades(isin, starts[isin], to_date, known_hashes.get(isin)) for isin in isins),
+            return_exceptions=True,
+        )
+        rows, failed, hashes = {}, [], {}
+        for isin, result in zip(isins, results):
+            if isinstance(result, Exception):
+                logger.error(f"HTTP fetch from NSE failed for ISIN {isin}: {result}")
+                failed.append(isin)
+                continue
+            isin_rows, hashes[isin] = result
+            if isin_rows is not None:
+                rows[isin] = isin_rows
+        return rows, failed, hashes
+
+    async def fetch_bse_windows(self, windows: List[Tuple[datetime, datetime]], known_hash: Optional[str] = None
+                                ) -> Tuple[Optional[Iterator[Dict[str, Any]]], List[Tuple[datetime, datetime]],
+                                           Optional[str]]:
+        """
+        Fetch BSE trades for several date windows concurrently. Returns (rows,
+        windows that failed, content hash of all windows). Rows is a lazy
+        iterator over the spooled pages; it is None when the hash equals
+        known_hash, and the hash is None when a window failed.
+        """
+        results = await asyncio.gather(
+            *(self.fetch_bse_page(start, end) for start, end in windows), return_exceptions=True
+        )
+        failed = []
+        for window, result in zip(windows, results):
+            if isinstance(result, Exception):
+                logger.error(f"HTTP fetch from BSE failed for {window[0]:%d-%m-%Y} to {window[1]:%d-%m-%Y}: {result}")
+                failed.append(window)
+        spools = [result[0] for result in results if not isinstance(result, Exception)]
+        if failed:
+            _close_all(spools)
+            return iter(()), failed, None
+        content_hash = payload_hash("".join(page_hash for _, page_hash in results))
+        if content_hash == known_hash:
+            _close_all(spools)
+            return None, [], content_hash
+        return iter_spooled_bse_trades(spools), [], content_hash
+
+
+async def spool_bse_page(response: aiohttp.ClientResponse) -> Tuple[IO[str], str]:
+    """
+    Copy a BSE result page into a spooled temporary file chunk by chunk,
+    hashing its bse_payload_content() on the way. The hash equals
+    payload_hash(bse_payload_content(page)) of the whole page.
+    """
+    decoder = codecs.getincrementaldecoder(response.get_encoding())()
+    content = BSEPayloadContent()
+    digest = hashlib.blake2b(digest_size=16)
+    spool = tempfile.SpooledTemporaryFile(max_size=BSE_SPOOL_MAX_CHARS, mode="w+", encoding="utf-8")
+    try:
+        async for data in response.content.iter_chunked(STREAM_CHUNK_BYTES):
+            text = decoder.decode(data)
+            spool.write(text)
+            digest.update(content.feed(text).encode())
+        text = decoder.decode(b"", final=True)
+        spool.write(text)
+        digest.update((content.feed(text) + content.close()).encode())
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+
+def iter_spooled_bse_trades(spools: List[IO[str]]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the OHLC dicts of spooled BSE pages, closing the spools when done.
+    """
+    try:
+        for spool in spools:
+            yield from iter_bse_trades(iter(partial(spool.read, STREAM_CHUNK_BYTES), ""))
+    finally:
+        _close_all(spools)
+
+
+def _close_all(spools: Iterable[IO[str]]):
+    for spool in spools:
+        spool.close()
+
+
+def payload_hash(body: str) -> str:
+    """
+    Stable content hash of a fetched payload.
+    """
+    return hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+
+
+def _parse_nse_body(body: str, isin: str) -> List[Dict[str, Any]]:
+    return parse_nse_trades(json.loads(body) if body.strip() else None, isin)
+
+
+def _parse_trade_date(value: str) -> Optional[datetime]:
+    for fmt in TRADE_DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def iter_ingest_records(rows: Iterable[Dict[str, Any]]) -> Iterator[Tuple[dict, dict]]:
+    """
+    Convert OHLC dicts from the HTTP parsers into (bond_data, txn_data) pairs
+    for bulk_ingest, lazily. Each row is one day's summary: its close becomes
+    the trade price and its open/high/low are carried as bar hints.
+    """
+    for row in rows:
+        timestamp = _parse_trade_date(row.get("date") or "")
+        if timestamp is None or not row.get("isin"):
+            continue
+        exchange = Exchange.NSE if row["source"] == "NSE" else Exchange.BSE
+        bond_data = {
+            "isin": row["isin"],
+            "name": f"Bond {row['isin']}",
+            "issuer": "Unknown",
+            "exchange": exchange,
+            "face_value": 100.0,
+            "coupon_rate": 0.0,
+            "maturity_date": datetime.now() + timedelta(days=365 * 5),
+            "yield_to_maturity": 0.0,
+            "last_price": row["close"],
+            "volume": row["volume"],
+        }
+        txn_data = {
+            "timestamp": timestamp,
+            "price": row["close"],
+            "quantity": row["volume"],
+            "source": row["source"],
+            "open": row["open"] or None,
+            "high": row["high"] or None,
+            "low": row["low"] or None,
+        }
+        yield bond_data, txn_data
+
+
+def to_ingest_records(rows: Iterable[Dict[str, Any]]) -> List[Tuple[dict, dict]]:
+    return list(iter_ingest_records(rows))
+
+
+def date_windows(start: datetime, end: datetime, days: int = BSE_WINDOW_DAYS) -> List[Tuple[datetime, datetime]]:
+    windows = []
+    while start < end:
+        windows.append((start, min(start + timedelta(days=days), end)))
+        start += timedelta(days=days)
+    return windows
+
+
+def fetch_bse_records(from_date: datetime, to_date: datetime, known_hash: Optional[str] = None,
+                      **client_options) -> Tuple[Optional[Iterator[Tuple[dict, dict]]], Optional[str]]:
+    """
+    Fetch BSE trades over HTTP in concurrent date windows. Returns (records,
+    content hash). Records is None when any window failed, so the caller can
+    fall back to the Selenium scraper, and empty without parsing anything
+    when the hash equals known_hash. Otherwise records is a lazy iterator
+    over the spooled pages, meant to be consumed by bulk_ingest in chunks.
+    """
+    async def run():
+        async with MarketDataClient(**client_options) as client:
+            rows, failed, content_hash = await client.fetch_bse_windows(date_windows(from_date, to_date), known_hash)
+            if rows is None:
+                logger.info(f"BSE HTTP fetch: payload unchanged, {client.stats}")
+            elif not failed:
+                logger.info(f"BSE HTTP fetch: payload changed, {client.stats}")
+            return rows, failed, content_hash
+
+    rows, failed, content_hash = asyncio.run(run())
+    if failed:
+        return None, None
+    return iter_ingest_records(rows or ()), content_hash
+
+
+def fetch_nse_records(starts: Dict[str, datetime], to_date: datetime, known_hashes: Optional[Dict[str, str]] = None,
+                      **client_options) -> Tuple[List[Tuple[dict, dict]], set, List[str], Dict[str, str]]:
+    """
+    Fetch NSE trades over HTTP for the ISINs in starts, each from its start date.
+    Returns (records, ISINs with NSE data, ISINs whose fetch failed, content
+    hash per fetched ISIN). ISINs whose hash equals known_hashes are not parsed
+    and contribute no records.
+    """
+    async def run():
+        async with MarketDataClient(**client_options) as client:
+            rows, failed, hashes = await client.fetch_nse_many(starts, to_date, known_hashes)
+            logger.info(
+                f"NSE HTTP fetch: {sum(len(r) for r in rows.values())} rows, "
+                f"{len(hashes) - len(rows)} unchanged payloads, {client.stats}"
+            )
+            return rows, failed, hashes
+
+    rows, failed, hashes = asyncio.run(run())
+    records = to_ingest_records(row for isin_rows in rows.values() for row in isin_rows)
+    found = {isin for isin, isin_rows in rows.items() if isin_rows}
+    return records, found, failed, hashes
@@ -6,27 +6,72 @@ import time
 
 logger = logging.getLogger(__name__)
 
+def nse_trade_params(isin: str, from_date: datetime, to_date: datetime) -> Dict[str, str]:
+    """
+    Query parameters of the NSE security-wise trades API for one ISIN and date range.
+    """
+    return {
+        'symbol': isin,
+        'segmentLink': '13',  # Debt segment
+        'symbolCount': '1',
+        'series': 'ALL',
+        'dateRange': '30days',
+        'fromDate': from_date.strftime('%d-%m-%Y'),
+        'toDate': to_date.strftime('%d-%m-%Y'),
+        'dataType': 'PRICE'
+    }
+
+def parse_nse_trades(data: Any, isin: str) -> List[Dict[str, Any]]:
+    """
+    Turn a decoded NSE trades API response into OHLC dicts.
+    """
+    if not data or 'data' not in data:
+        logger.warning(f"No data found for ISIN {isin}")
+        return []
+
+    transactions = []
+    for item in data['data']:
+        try:
+            transaction = {
+                'isin': isin,
+                'date': item.get('date', ''),
+                'open': float(item.get('open', 0)),
+                'high': float(item.get('high', 0)),
+                'low': float(item.get('low', 0)),
+                'close': float(item.get('close', 0)),
+                'volume': int(item.get('volume', 0)),
+                'source': 'NSE'
+            }
+            transactions.append(transaction)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Error parsing transaction data: {e}")
+            continue
+    return transactions
+
 class NSEScraper:
     """
     Class to scrape bond data from NSE website.
     """
+    HOME_URL = "https://www.nseindia.com/"
     # Base URL for NSE historical data
     BASE_URL = "https://www.nseindia.com/api/historical/security-wise-trades"
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Referer': 'https://www.nseindia.com/get-quotes/equity?symbol=RELIANCE',
+        'X-Requested-With': 'XMLHttpRequest',
+        'sec-ch-ua': '"Google Chrome";v="91", "Chromium";v="91"',
+        'sec-ch-ua-mobile': '?0',
+        'sec-fetch-dest': 'empty',
+        'sec-fetch-mode': 'cors',
+        'sec-fetch-site': 'same-origin'
+    }
     
     def __init__(self):
         self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Referer': 'https://www.nseindia.com/get-quotes/equity?symbol=RELIANCE',
-            'X-Requested-With': 'XMLHttpRequest',
-            'sec-ch-ua': '"Google Chrome";v="91", "Chromium";v="91"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-fetch-dest': 'empty',
-            'sec-fetch-mode': 'cors',
-            'sec-fetch-site': 'same-origin'
-        })
+        self.session.headers.update(self.HEADERS)
+        self._warmed = False
 
     def _make_request(self, url: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
         """
@@ -37,14 +82,17 @@ class NSEScraper:
 
         for attempt in range(max_retries):
             try:
-                # First visit the main page to get cookies
-                self.session.get('https://www.nseindia.com/')
+                # Visit the main page for cookies once per session, and again after a failure
+                if not self._warmed:
+                    self.session.get(self.HOME_URL, timeout=30)
+                    self._warmed = True
                 
                 # Then make the actual request
                 response = self.session.get(url, params=params, timeout=30)
                 response.raise_for_status()
                 return response
             except requests.exceptions.RequestException as e:
+                self._warmed = False
                 if attempt == max_retries - 1:
                     logger.error(f"Request failed after {max_retries} attempts: {e}")
                     raise
@@ -61,53 +109,11 @@ class NSEScraper:
         to_date = datetime.now()
         from_date = to_date - timedelta(days=30)
         
-        params = {
-            'symbol': isin,
-            'segmentLink': '13',  # Debt segment
-            'symbolCount': '1',
-            'series': 'ALL',
-            'dateRange': '30days',
-            'fromDate': from_date.strftime('%d-%m-%Y'),
-            'toDate': to_date.strftime('%d-%m-%Y'),
-            'dataType': 'PRICE'
-        }
+        params = nse_trade_params(isin, from_date, to_date)
         
         try:
             response = self._make_request(self.BASE_URL, params)
-            data = response.json()
-            
-            if not data or 'data' not in data:
-                logger.warning(f"No data found for ISIN {isin}")
-                return []
-
-            transactions = []
-            for item in data['data']:
-                try:
-                    # Parse date string
-                    date_str = item.get('date', '')
-                    if date_str:
-                        try:
-                            trade_date = datetime.strptime(date_str, '%d-%b-%Y')
-                        except ValueError:
-                            trade_date = None
-                    else:
-                        trade_date = None
-
-                    transaction = {
-                        'isin': isin,
-                        'date': date_str,
-                        'open': float(item.get('open', 0)),
-                        'high': float(item.get('high', 0)),
-                        'low': float(item.get('low', 0)),
-                        'close': float(item.get('close', 0)),
-                        'volume': int(item.get('volume', 0)),
-                        'source': 'NSE'
-                    }
-                    transactions.append(transaction)
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Error parsing transaction data: {e}")
-                    continue
-
+            transactions = parse_nse_trades(response.json(), isin)
             logger.info(f"Successfully fetched {len(transactions)} transactions from NSE for ISIN: {isin}")
             return transactions
         except Exception as e:
@@ -0,0 +1,32 @@
+from itertools import islice
+from typing import Any, Iterable, List
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def dialect_insert(db: Session, table):
+    """
+    Return an INSERT construct that supports ON CONFLICT for the bound dialect,
+    or None when the dialect has no upsert support.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    return None
+
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def batched(items: Iterable[Any], size: int) -> Iterable[List[Any]]:
+    """
+    Like chunked, for any iterable (e.g. a generator), without materialising it.
+    """
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
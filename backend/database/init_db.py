@@ -2,10 +2,13 @@ from sqlalchemy.orm import Session
 from database.models import Base, Bond, Exchange
 from datetime import datetime, timedelta
 from database.session import engine, SessionLocal
+from database.migrations import run_migrations
 
 def init_db():
     # Create tables
     Base.metadata.create_all(bind=engine)
+    # Bring tables created by older versions up to date
+    run_migrations(engine)
 
 def add_sample_data(db: Session):
     # Add sample bonds
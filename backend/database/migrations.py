@@ -0,0 +1,176 @@
+"""
+Idempotent schema migrations for databases created before a model change.
+
+New databases get the full schema from Base.metadata.create_all; existing ones
+are brought up to date by running this module:
+
+    python -m database.migrations
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from database.models import Base
+from database.partitions import add_months, create_partition, is_partitioned, month_start
+
+logger = logging.getLogger(__name__)
+
+
+def _has_column(engine: Engine, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(engine).get_columns(table))
+
+
+def _has_index(engine: Engine, table: str, index: str) -> bool:
+    return any(i["name"] == index for i in inspect(engine).get_indexes(table))
+
+
+def _create_index(engine: Engine, ddl: str):
+    """
+    Create an index without holding a write lock on Postgres for the whole build.
+    CREATE INDEX CONCURRENTLY cannot run inside a transaction, hence AUTOCOMMIT.
+    Partitioned tables do not support CONCURRENTLY and are indexed per partition.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "postgresql" and not is_partitioned(conn):
+            ddl = ddl.replace("INDEX IF NOT EXISTS", "INDEX CONCURRENTLY IF NOT EXISTS")
+        conn.execute(text(ddl))
+
+
+def add_transaction_source_and_indexes(engine: Engine):
+    """
+    Add transactions.source, drop duplicate trades and create the
+    (bond_id, timestamp, source) unique index plus the descending
+    (timestamp, id) index.
+    """
+    if not _has_column(engine, "transactions", "source"):
+        logger.info("Adding transactions.source column")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE transactions ADD COLUMN source VARCHAR NOT NULL DEFAULT ''"))
+
+    # The unique index cannot be built while duplicates exist; keep the oldest copy of each trade
+    if not _has_index(engine, "transactions", "ux_transactions_bond_timestamp_source"):
+        with engine.begin() as conn:
+            result = conn.execute(text(
+                "DELETE FROM transactions WHERE id NOT IN ("
+                " SELECT MIN(id) FROM transactions GROUP BY bond_id, timestamp, source"
+                ")"
+            ))
+            if result.rowcount:
+                logger.info(f"Removed {result.rowcount} duplicate transactions")
+
+    logger.info("Creating transaction indexes")
+    _create_index(
+        engine,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_transactions_bond_timestamp_source "
+        "ON transactions (bond_id, timestamp, source)"
+    )
+    _create_index(
+        engine,
+        "CREATE INDEX IF NOT EXISTS ix_transactions_timestamp_id_desc "
+        "ON transactions (timestamp DESC, id DESC)"
+    )
+
+
+def partition_transactions(engine: Engine):
+    """
+    Convert transactions into a table partitioned by month on timestamp
+    (Postgres only). Rows are copied into per-month partitions, ids and the
+    id sequence are preserved, and the indexes are recreated on the parent.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.connect() as conn:
+        if is_partitioned(conn):
+            return
+
+    logger.info("Converting transactions to a monthly partitioned table")
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ux_transactions_bond_timestamp_source"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_transactions_timestamp_id_desc"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_transactions_id"))
+        conn.execute(text("ALTER TABLE transactions RENAME TO transactions_unpartitioned"))
+        conn.execute(text(
+            "ALTER TABLE transactions_unpartitioned RENAME CONSTRAINT transactions_pkey "
+            "TO transactions_unpartitioned_pkey"
+        ))
+        # Keep the sequence alive when the old table is dropped
+        conn.execute(text("ALTER SEQUENCE transactions_id_seq OWNED BY NONE"))
+        conn.execute(text(
+            "CREATE TABLE transactions ("
+            " id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),"
+            " bond_id INTEGER REFERENCES bonds (id),"
+            " price DOUBLE PRECISION,"
+            " quantity INTEGER,"
+            " timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,"
+            " source VARCHAR NOT NULL DEFAULT '',"
+            " PRIMARY KEY (id, timestamp)"
+            ") PARTITION BY RANGE (timestamp)"
+        ))
+        conn.execute(text("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id"))
+
+        oldest, newest = conn.execute(text(
+            "SELECT MIN(timestamp), MAX(timestamp) FROM transactions_unpartitioned"
+        )).one()
+        start = month_start(oldest or datetime.now())
+        last = month_start(max(newest or datetime.now(), datetime.now()))
+        while start <= last:
+            create_partition(conn, start)
+            start = add_months(start, 1)
+
+        conn.execute(text(
+            "INSERT INTO transactions (id, bond_id, price, quantity, timestamp, source) "
+            "SELECT id, bond_id, price, quantity, timestamp, source FROM transactions_unpartitioned "
+            "WHERE timestamp IS NOT NULL"
+        ))
+        conn.execute(text("DROP TABLE transactions_unpartitioned"))
+
+    _create_index(engine, "CREATE INDEX IF NOT EXISTS ix_transactions_id ON transactions (id)")
+    _create_index(
+        engine,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_transactions_bond_timestamp_source "
+        "ON transactions (bond_id, timestamp, source)"
+    )
+    _create_index(
+        engine,
+        "CREATE INDEX IF NOT EXISTS ix_transactions_timestamp_id_desc "
+        "ON transactions (timestamp DESC, id DESC)"
+    )
+
+
+def add_bond_analytics_columns(engine: Engine):
+    """
+    Add the duration, convexity and accrued interest columns filled by analytics.pricing.
+    """
+    for column in ("macaulay_duration", "modified_duration", "convexity", "accrued_interest"):
+        if not _has_column(engine, "bonds", column):
+            logger.info(f"Adding bonds.{column} column")
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE bonds ADD COLUMN {column} FLOAT"))
+
+
+MIGRATIONS = [
+    add_transaction_source_and_indexes,
+    partition_transactions,
+    add_bond_analytics_columns,
+]
+
+
+def run_migrations(engine: Engine):
+    """
+    Apply every migration in order. Each one checks the live schema first,
+    so running this repeatedly is safe. Tables that do not exist yet are
+    created from the models beforehand.
+    """
+    Base.metadata.create_all(bind=engine)
+    for migration in MIGRATIONS:
+        logger.info(f"Running migration: {migration.__name__}")
+        migration(engine)
+
+
+if __name__ == "__main__":
+    from database.session import engine
+
+    logging.basicConfig(level=logging.INFO)
+    run_migrations(engine)
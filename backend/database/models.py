@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Enum, Index, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 import enum
@@ -24,14 +24,138 @@ class Bond(Base):
     yield_to_maturity = Column(Float)
     last_price = Column(Float)
     volume = Column(Integer)
+    # Derived from last_price by analytics.pricing after each ingest
+    macaulay_duration = Column(Float)
+    modified_duration = Column(Float)
+    convexity = Column(Float)
+    accrued_interest = Column(Float)
     transactions = relationship("Transaction", back_populates="bond")
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Natural key of a trade: used for ON CONFLICT dedupe and per-bond lookups
+        Index("ux_transactions_bond_timestamp_source", "bond_id", "timestamp", "source", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     bond_id = Column(Integer, ForeignKey("bonds.id"))
     price = Column(Float)
     quantity = Column(Integer)
-    timestamp = Column(DateTime)
-    bond = relationship("Bond", back_populates="transactions") 
\ No newline at end of file
+    # Partition key on Postgres (monthly ranges), so it is always set
+    timestamp = Column(DateTime, nullable=False)
+    # Exchange the row was scraped from ("BSE", "NSE"); empty for rows stored before it was tracked
+    source = Column(String, nullable=False, default="", server_default="")
+    bond = relationship("Bond", back_populates="transactions")
+
+# Serves "latest N transactions" and keyset pages ordered by (timestamp, id) descending
+Index("ix_transactions_timestamp_id_desc", Transaction.timestamp.desc(), Transaction.id.desc())
+
+# Open/high/low/close/volume summary of all trades of a bond within one time bucket
+class OHLCVBar(Base):
+    __tablename__ = "ohlcv_bars"
+    __table_args__ = (
+        Index("ux_ohlcv_bars_bond_interval_start", "bond_id", "interval", "bucket_start", unique=True),
+        # Bars of one session across all bonds (market statistics)
+        Index("ix_ohlcv_bars_interval_start", "interval", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    bond_id = Column(Integer, ForeignKey("bonds.id"))
+    interval = Column(String, nullable=False)  # "1m", "1h" or "1d"
+    bucket_start = Column(DateTime, nullable=False)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Integer)
+    # sum(price * quantity) of the bar's trades; VWAP = value / volume
+    value = Column(Float)
+    trade_count = Column(Integer)
+    # Timestamps of the first and last trade folded in, so partial bars merge in the right order
+    first_trade_at = Column(DateTime)
+    last_trade_at = Column(DateTime)
+
+# Running trade totals per exchange and per exchange and day, updated by the
+# ingest together with the trades (utils.market_stats). value = sum(price * quantity).
+class TradeTotals(Base):
+    __tablename__ = "trade_totals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False, unique=True)
+    trade_count = Column(BigInteger, nullable=False, default=0)
+    volume = Column(BigInteger, nullable=False, default=0)
+    value = Column(Float, nullable=False, default=0)
+    last_trade_at = Column(DateTime)
+
+class DailyTradeTotals(Base):
+    __tablename__ = "daily_trade_totals"
+    __table_args__ = (
+        Index("ux_daily_trade_totals_date_source", "trade_date", "source", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    trade_date = Column(DateTime, nullable=False)  # start of the day, as the 1d bars
+    source = Column(String, nullable=False)
+    trade_count = Column(BigInteger, nullable=False, default=0)
+    volume = Column(BigInteger, nullable=False, default=0)
+    value = Column(Float, nullable=False, default=0)
+
+# Government zero curves fitted by analytics.curve: one row per curve date, model
+# and version, the version being a hash of the constituent bonds and prices fitted.
+class YieldCurve(Base):
+    __tablename__ = "yield_curves"
+    __table_args__ = (
+        Index("ux_yield_curves_date_model_version", "curve_date", "model", "version", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    curve_date = Column(DateTime, nullable=False)  # settlement date, start of the day
+    model = Column(String, nullable=False)  # "nelson_siegel" or "spline"
+    version = Column(String, nullable=False)
+    parameters = Column(Text, nullable=False)  # JSON, see analytics.curve.ZeroCurve
+    constituents = Column(Integer, nullable=False)
+    rmse_bp = Column(Float)  # fit error in yield basis points
+    built_at = Column(DateTime, nullable=False)
+
+# Incremental sync progress: data from `source` for `isin` is complete up to `watermark`.
+# Sources fetched market-wide (BSE date windows) use isin = "" for the whole source.
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    __table_args__ = (
+        Index("ux_sync_state_source_isin", "source", "isin", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False)
+    isin = Column(String, nullable=False, default="")
+    watermark = Column(DateTime, nullable=False)
+    # Hash of the last payload fetched over HTTP; an identical payload is skipped unparsed
+    content_hash = Column(String)
+    updated_at = Column(DateTime, nullable=False)
+
+# One work unit of a backfill run: one source, one date window and, for sources
+# fetched per ISIN (NSE), one shard of ISINs. Finished units are checkpointed
+# here so a resumed run only dispatches what is left.
+class BackfillUnit(Base):
+    __tablename__ = "backfill_units"
+    __table_args__ = (
+        Index("ux_backfill_units_run_source_window_shard", "run_id", "source", "window_start", "shard", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(String, nullable=False, index=True)
+    source = Column(String, nullable=False)
+    window_start = Column(DateTime, nullable=False)
+    window_end = Column(DateTime, nullable=False)
+    shard = Column(Integer, nullable=False, default=0)
+    isins = Column(Text)  # comma-separated ISINs of the shard; NULL for market-wide units
+    status = Column(String, nullable=False, default="pending")  # pending, running, done or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    records = Column(Integer)  # records fetched by the last successful attempt
+    transactions = Column(Integer)  # new transactions stored by it
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
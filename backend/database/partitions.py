@@ -0,0 +1,116 @@
+"""
+Monthly range partitions of the transactions table.
+
+On Postgres, transactions is partitioned by RANGE (timestamp) with one child
+table per calendar month, named transactions_pYYYY_MM. The conversion of an
+existing table is done by database.migrations. On SQLite the table stays a
+plain table and every helper here is a no-op.
+"""
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "transactions_p"
+
+
+def _dialect_name(conn) -> str:
+    if isinstance(conn, Session):
+        return conn.get_bind().dialect.name
+    return conn.dialect.name
+
+
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(start: datetime, months: int) -> datetime:
+    index = start.year * 12 + start.month - 1 + months
+    return start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{PARTITION_PREFIX}{start:%Y_%m}"
+
+
+def hot_window_start(now: Optional[datetime] = None) -> datetime:
+    """
+    Lower bound of the hot (current month) partition. Queries bounded by it
+    are pruned to a single partition on Postgres.
+    """
+    return month_start(now or datetime.now())
+
+
+def is_partitioned(conn) -> bool:
+    """
+    Whether transactions is a partitioned table. Accepts a Session or Connection.
+    """
+    if _dialect_name(conn) != "postgresql":
+        return False
+    return bool(conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'transactions')"
+    )).scalar())
+
+
+def create_partition(conn, start: datetime) -> str:
+    """
+    Create the partition holding the month starting at start, if missing.
+    """
+    name = partition_name(start)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF transactions "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{add_months(start, 1):%Y-%m-%d}')"
+    ))
+    return name
+
+
+def ensure_partitions(db: Session, timestamps: Iterable[datetime]) -> List[str]:
+    """
+    Make sure a partition exists for every month touched by timestamps and
+    commit the DDL, so it survives a rollback of the data written afterwards.
+    The existing partitions are read from the catalog on every call rather
+    than remembered, since retention in another process may drop them.
+    """
+    months = sorted({month_start(ts) for ts in timestamps if ts is not None})
+    if not months or not is_partitioned(db):
+        return []
+    existing = {name for name, _ in list_partitions(db)}
+    created = [create_partition(db, start) for start in months if partition_name(start) not in existing]
+    if created:
+        db.commit()
+        logger.info(f"Ensured transaction partitions: {', '.join(created)}")
+    return created
+
+
+def list_partitions(conn) -> List[Tuple[str, datetime]]:
+    """
+    Return (name, month start) of every monthly partition, oldest first.
+    """
+    if not is_partitioned(conn):
+        return []
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'transactions'"
+    ))
+    partitions = []
+    for (name,) in rows:
+        if name.startswith(PARTITION_PREFIX):
+            start = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y_%m")
+            partitions.append((name, start))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def drop_partition(conn, name: str):
+    """
+    Detach and drop a monthly partition. Its rows are gone afterwards, so
+    roll them up first.
+    """
+    conn.execute(text(f"ALTER TABLE transactions DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select, update
+
+from database.models import BackfillUnit, Exchange, Transaction
+from utils import backfill
+from utils.backfill import (
+    DONE, FAILED, PENDING, begin_run, mark_unit_failed, plan_units, run_unit, unfinished_unit_ids
+)
+
+RUN_ID = "backfill-test"
+NOW = datetime(2024, 6, 30)
+
+
+def bse_records(unit):
+    """
+    One trade per day of the unit's window.
+    """
+    days = (unit.window_end - unit.window_start).days
+    bond = {"isin": "INE001A07BM4", "name": "Bond", "issuer": "X", "exchange": Exchange.BSE}
+    return [
+        (bond, {"timestamp": unit.window_start + timedelta(days=day), "price": 100.0, "quantity": 1, "source": "BSE"})
+        for day in range(days)
+    ], []
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    """
+    Serves bse_records, failing the units whose ids are in `failing`; records the units fetched.
+    """
+    state = {"failing": set(), "fetched": []}
+
+    def fetch(unit):
+        state["fetched"].append(unit.id)
+        if unit.id in state["failing"]:
+            raise RuntimeError("BSE unavailable")
+        return bse_records(unit)
+
+    monkeypatch.setattr(backfill, "_bse_records", fetch)
+    return state
+
+
+def run_all(db, unit_ids):
+    for unit_id in unit_ids:
+        try:
+            run_unit(db, unit_id)
+        except RuntimeError as e:
+            db.rollback()
+            mark_unit_failed(db, unit_id, e, final=True)
+
+
+def test_plan_covers_history_once(db):
+    created = plan_units(db, RUN_ID, "BSE", now=NOW)
+
+    units = db.scalars(select(BackfillUnit).order_by(BackfillUnit.window_start)).all()
+    assert created == len(units) > 1
+    assert units[0].window_start == NOW - timedelta(days=backfill.HISTORY_DAYS)
+    assert units[-1].window_end == NOW
+    assert all(a.window_end == b.window_start for a, b in zip(units, units[1:]))
+    # Planning again, e.g. on resume, keeps the existing units
+    assert plan_units(db, RUN_ID, "BSE", now=NOW + timedelta(days=3)) == 0
+
+
+def test_nse_units_use_the_run_range_per_shard(db):
+    plan_units(db, RUN_ID, "BSE", now=NOW)
+    plan_units(db, RUN_ID, "NSE", shards=[["A", "B"], ["C"]], now=NOW + timedelta(hours=5))
+
+    bse = db.scalars(select(BackfillUnit).where(BackfillUnit.source == "BSE")).all()
+    nse = db.scalars(select(BackfillUnit).where(BackfillUnit.source == "NSE")).all()
+    assert len(nse) == 2 * len(bse)
+    assert {(u.window_start, u.window_end) for u in nse} == {(u.window_start, u.window_end) for u in bse}
+    assert {(u.shard, u.isins) for u in nse} == {(0, "A,B"), (1, "C")}
+
+
+def test_resume_runs_only_unfinished_units(db, fetcher):
+    plan_units(db, RUN_ID, "BSE", now=NOW)
+    unit_ids = unfinished_unit_ids(db, RUN_ID, "BSE")
+    fetcher["failing"] = {unit_ids[2]}
+
+    run_all(db, unit_ids)
+
+    assert unfinished_unit_ids(db, RUN_ID, "BSE") == [unit_ids[2]]
+    assert db.get(BackfillUnit, unit_ids[2]).error == "BSE unavailable"
+
+    # Resume: the same plan, and only the failed unit is fetched again
+    fetcher["failing"], fetcher["fetched"] = set(), []
+    assert plan_units(db, RUN_ID, "BSE", now=NOW + timedelta(days=1)) == 0
+    run_all(db, unfinished_unit_ids(db, RUN_ID, "BSE"))
+
+    assert fetcher["fetched"] == [unit_ids[2]]
+    assert unfinished_unit_ids(db, RUN_ID, "BSE") == []
+    units = db.scalars(select(BackfillUnit)).all()
+    assert {unit.status for unit in units} == {DONE}
+    assert db.get(BackfillUnit, unit_ids[2]).attempts == 2
+    assert db.scalar(select(func.count(Transaction.id))) == backfill.HISTORY_DAYS
+
+
+def test_done_unit_is_not_fetched_again(db, fetcher):
+    plan_units(db, RUN_ID, "BSE", now=NOW)
+    unit_id = unfinished_unit_ids(db, RUN_ID, "BSE")[0]
+    first = run_unit(db, unit_id)
+
+    again = run_unit(db, unit_id)
+
+    assert fetcher["fetched"] == [unit_id]
+    assert again == first
+    assert first["status"] == DONE and first["transactions"] == first["records"] > 0
+
+
+def test_failed_attempt_goes_back_to_pending_while_retries_remain(db, fetcher):
+    plan_units(db, RUN_ID, "BSE", now=NOW)
+    unit_id = unfinished_unit_ids(db, RUN_ID, "BSE")[0]
+    fetcher["failing"] = {unit_id}
+
+    with pytest.raises(RuntimeError):
+        run_unit(db, unit_id)
+    db.rollback()
+    mark_unit_failed(db, unit_id, RuntimeError("BSE unavailable"), final=False)
+
+    assert db.get(BackfillUnit, unit_id).status == PENDING
+    assert unit_id in unfinished_unit_ids(db, RUN_ID, "BSE")
+
+
+def test_a_claimed_run_is_not_started_twice(db):
+    run_id, dispatch = begin_run(db)
+
+    # Planned before dispatch: a second trigger sees the run in flight
+    assert dispatch and unfinished_unit_ids(db, run_id, "BSE")
+    assert begin_run(db) == (run_id, False)
+    assert begin_run(db, run_id) == (run_id, False)
+
+
+def test_latest_unfinished_run_is_resumed(db):
+    plan_units(db, RUN_ID, "BSE", now=NOW)
+    unit_ids = unfinished_unit_ids(db, RUN_ID, "BSE")
+    db.execute(update(BackfillUnit).values(status=DONE))
+    db.execute(update(BackfillUnit).where(BackfillUnit.id == unit_ids[1]).values(status=FAILED))
+    db.commit()
+
+    assert begin_run(db) == (RUN_ID, True)
+
+    assert unfinished_unit_ids(db, RUN_ID, "BSE") == [unit_ids[1]]
+    assert db.get(BackfillUnit, unit_ids[1]).status == PENDING
+    # Claimed again: no second resume while it is queued
+    assert begin_run(db) == (RUN_ID, False)
+
+
+def test_finished_run_is_followed_by_a_new_one(db):
+    plan_units(db, RUN_ID, "BSE", now=NOW)
+    plan_units(db, RUN_ID, "NSE", shards=[["A"]], now=NOW)
+    db.execute(update(BackfillUnit).values(status=DONE))
+    db.commit()
+
+    run_id, dispatch = begin_run(db)
+
+    assert dispatch and run_id != RUN_ID
+    assert unfinished_unit_ids(db, run_id, "BSE")
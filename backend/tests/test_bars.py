@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from database.models import Bond, OHLCVBar
+from utils.bars import INTERVALS, aggregate_trades, update_bars_for_trades
+
+DAY = datetime(2024, 3, 4)
+
+
+def trades():
+    # Each trade carries the source's daily range (open 99, high 103, low 97) as hints
+    hints = {"open": 99.0, "high": 103.0, "low": 97.0}
+    return [
+        dict(hints, bond_id=1, timestamp=DAY.replace(hour=10, minute=0), price=100.0, quantity=10),
+        dict(hints, bond_id=1, timestamp=DAY.replace(hour=10, minute=0, second=30), price=101.0, quantity=5),
+        dict(hints, bond_id=1, timestamp=DAY.replace(hour=11, minute=15), price=100.5, quantity=20),
+    ]
+
+
+def test_intraday_bars_ignore_daily_hints():
+    minute_bars = list(aggregate_trades(trades(), "1m"))
+    hour_bars = list(aggregate_trades(trades(), "1h"))
+
+    assert [(b["open"], b["high"], b["low"], b["close"]) for b in minute_bars] == [
+        (100.0, 101.0, 100.0, 101.0),
+        (100.5, 100.5, 100.5, 100.5),
+    ]
+    assert [(b["open"], b["high"], b["low"], b["close"]) for b in hour_bars] == [
+        (100.0, 101.0, 100.0, 101.0),
+        (100.5, 100.5, 100.5, 100.5),
+    ]
+
+
+def test_daily_bar_takes_source_range():
+    [bar] = aggregate_trades(trades(), "1d")
+
+    assert (bar["open"], bar["high"], bar["low"], bar["close"]) == (99.0, 103.0, 97.0, 100.5)
+    assert (bar["volume"], bar["trade_count"]) == (35, 3)
+    assert bar["value"] == 100.0 * 10 + 101.0 * 5 + 100.5 * 20
+
+
+def test_trades_without_hints_use_prices():
+    rows = [{k: v for k, v in t.items() if k not in ("open", "high", "low")} for t in trades()]
+    [bar] = aggregate_trades(rows, "1d")
+
+    assert (bar["open"], bar["high"], bar["low"], bar["close"]) == (100.0, 101.0, 100.0, 100.5)
+
+
+def test_out_of_order_batches_merge_into_the_same_bars(db):
+    db.execute(insert(Bond), [{"id": 1, "isin": "INE000000001", "name": "Bond 1"}])
+    rows = [
+        {"bond_id": 1, "timestamp": DAY.replace(hour=10, minute=m, second=s), "price": price, "quantity": 10}
+        for m, s, price in [(0, 5, 100.0), (0, 40, 102.0), (1, 0, 99.5), (0, 20, 98.0), (1, 30, 101.0)]
+    ]
+
+    # The later trades arrive first, the earlier ones in a second batch
+    update_bars_for_trades(db, rows[2:])
+    update_bars_for_trades(db, rows[:2])
+
+    fields = ("interval", "bucket_start", "open", "high", "low", "close", "volume", "value", "trade_count")
+    stored = db.execute(select(*(getattr(OHLCVBar, f) for f in fields)).order_by(OHLCVBar.id)).all()
+    expected = [
+        bar for interval in INTERVALS
+        for bar in aggregate_trades(sorted(rows, key=lambda row: row["timestamp"]), interval)
+    ]
+    assert sorted(tuple(row) for row in stored) == sorted(tuple(bar[f] for f in fields) for bar in expected)
@@ -0,0 +1,45 @@
+import pytest
+
+from data_acquisition.bse_scraper import BSE_TABLE_ID, iter_bse_trades, iter_table_rows, parse_bse_trades
+
+PAGE = (
+    '<html><body><table id="menu"><tr><td>Home</td></tr></table>'
+    f'<table id="{BSE_TABLE_ID}">'
+    "<tr><th>ISIN</th><th>Date</th><th>Open</th><th>High</th><th>Low</th>"
+    "<th>Close</th><th>Volume</th><th>Value</th></tr>"
+    "<tr><td>INE001A07BM4</td><td>02/01/2024</td><td>99.80</td><td>100.10</td><td>99.75</td>"
+    "<td> 100.05 </td><td>1,500</td><td>0</td></tr>"
+    # A nested table inside a cell contributes text to that cell, not rows of its own
+    "<tr><td>INE002A07BN2</td><td>02/01/2024</td><td>98.00</td><td>98.50</td><td>97.90</td>"
+    "<td><table><tr><td>98.25</td></tr></table></td><td>200</td><td>0</td></tr>"
+    "<tr><td>INE003A07BO0</td><td>02/01/2024</td><td>-</td><td></td><td></td><td>bad</td><td>1</td><td>0</td></tr>"
+    "<tr><td>INE004A07BP8</td><td>too short</td></tr>"
+    "</table></body></html>"
+)
+
+
+@pytest.mark.parametrize("size", [1, 5, 64, len(PAGE)])
+def test_rows_of_chunked_pages_match_the_whole_page(size):
+    chunks = [PAGE[i:i + size] for i in range(0, len(PAGE), size)]
+
+    assert list(iter_table_rows(chunks, BSE_TABLE_ID)) == list(iter_table_rows([PAGE], BSE_TABLE_ID))
+
+
+def test_only_the_results_table_is_read():
+    rows = list(iter_table_rows([PAGE], BSE_TABLE_ID))
+
+    assert [row[0] for row in rows] == ["INE001A07BM4", "INE002A07BN2", "INE003A07BO0", "INE004A07BP8"]
+    assert rows[1][5] == "98.25"
+
+
+def test_trades_skip_unparseable_rows():
+    trades = parse_bse_trades(PAGE)
+
+    assert [(t["isin"], t["close"], t["volume"]) for t in trades] == [
+        ("INE001A07BM4", 100.05, 1500), ("INE002A07BN2", 98.25, 200),
+    ]
+    assert trades == list(iter_bse_trades(PAGE[i:i + 7] for i in range(0, len(PAGE), 7)))
+
+
+def test_page_without_the_table_has_no_trades():
+    assert parse_bse_trades("<html><body>No records found</body></html>") == []
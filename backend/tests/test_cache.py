@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from utils.cache import CachedResponse, LRUCache, ResponseCache
+
+
+class SlowRedis:
+    """
+    In-memory stand-in for redis.asyncio.Redis that takes `delay` seconds per call.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.data = {}
+
+    async def get(self, key):
+        await asyncio.sleep(self.delay)
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        await asyncio.sleep(self.delay)
+        self.data[key] = value
+
+
+def shared_cache(redis):
+    cache = ResponseCache(redis_url=None)
+    cache._redis = redis
+    return cache
+
+
+def test_lru_evicts_oldest_by_count_and_bytes():
+    lru = LRUCache(max_entries=2, max_bytes=10)
+    lru.set("a", CachedResponse(b"1234"))
+    lru.set("b", CachedResponse(b"1234"))
+    lru.get("a")
+    lru.set("c", CachedResponse(b"1234"))
+    assert lru.get("b") is None and lru.get("a") is not None
+    lru.set("d", CachedResponse(b"123456789"))
+    assert lru.stats()["bytes"] <= 10 and lru.get("d") is not None
+
+
+def test_shared_tier_fills_other_workers():
+    redis = SlowRedis()
+    writer, reader = shared_cache(redis), shared_cache(redis)
+
+    async def run():
+        await writer.set("/bonds/", b"[]", {"X-Next-Cursor": "c"})
+        return await reader.get("/bonds/")
+
+    entry = asyncio.run(run())
+    assert entry.body == b"[]" and entry.headers == {"X-Next-Cursor": "c"}
+    assert reader.shared_hits == 1
+    # Now served by the reader's own LRU
+    assert reader.local.get("/bonds/") is not None
+
+
+def test_generation_retires_shared_entries():
+    cache = shared_cache(SlowRedis())
+
+    async def run():
+        await cache.set("/bonds/", b"old")
+        cache.invalidate(7)
+        return await cache.get("/bonds/")
+
+    assert asyncio.run(run()) is None
+    assert cache.generation == 7
+
+
+def test_slow_redis_does_not_block_the_event_loop():
+    cache = shared_cache(SlowRedis(delay=0.2))
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        task = asyncio.create_task(ticker())
+        await cache.get("/bonds/")
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(ticks) > 5
+
+
+def test_unreachable_redis_is_a_miss():
+    cache = ResponseCache(redis_url="redis://127.0.0.1:1/0")
+
+    async def run():
+        await cache.set("/bonds/", b"[]")
+        cache.local.clear()
+        return await cache.get("/bonds/")
+
+    t0 = time.monotonic()
+    assert asyncio.run(run()) is None
+    assert time.monotonic() - t0 < 2
+    assert cache.shared_errors == 2
@@ -0,0 +1,26 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.models import BackfillUnit
+from utils import celery_app as tasks
+from utils.celery_app import celery_app
+
+
+def test_beat_schedule_names_registered_tasks():
+    scheduled = {entry["task"] for entry in celery_app.conf.beat_schedule.values()}
+
+    assert scheduled == {"utils.celery_app.fetch_bond_data", "utils.celery_app.apply_transaction_retention"}
+    assert scheduled <= set(celery_app.tasks)
+
+
+def test_fetches_before_the_first_bond_start_one_backfill(db, monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(tasks, "SessionLocal", lambda: Session(db.get_bind()))
+    monkeypatch.setattr(tasks.start_backfill, "delay", dispatched.append)
+
+    # The backfill has not stored a bond yet when the next hourly fetch runs
+    tasks.fetch_bond_data()
+    tasks.fetch_bond_data()
+
+    assert len(dispatched) == 1
+    assert set(db.scalars(select(BackfillUnit.run_id))) == set(dispatched)
@@ -0,0 +1,69 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from data_acquisition import http_client
+from utils.sync_state import advance_watermarks, get_content_hashes, get_watermarks
+
+NOW = datetime(2024, 6, 30)
+
+
+def nse_body(close):
+    return json.dumps({"data": [
+        {"date": "02-Jan-2024", "open": "101.10", "high": "101.40", "low": "101.00", "close": close, "volume": "1500"},
+    ]})
+
+
+def fetch_nse(bodies, known_hashes, monkeypatch):
+    """
+    fetch_nse_many against canned bodies per ISIN; returns its result and the ISINs parsed.
+    """
+    parsed = []
+    parse = http_client._parse_nse_body
+
+    def parse_and_record(body, isin):
+        parsed.append(isin)
+        return parse(body, isin)
+
+    async def request(self, method, url, home_url, headers, params):
+        return bodies[params["symbol"]]
+
+    monkeypatch.setattr(http_client, "_parse_nse_body", parse_and_record)
+    monkeypatch.setattr(http_client.MarketDataClient, "_request", request)
+
+    async def run():
+        client = http_client.MarketDataClient()
+        return await client.fetch_nse_many(dict.fromkeys(bodies, NOW - timedelta(days=1)), NOW, known_hashes)
+
+    return asyncio.run(run()), sorted(parsed)
+
+
+def test_unchanged_payloads_are_not_parsed(monkeypatch):
+    bodies = {"INE0000000A1": nse_body("101.25"), "INE0000000B2": nse_body("99.50")}
+    (_, _, hashes), _ = fetch_nse(bodies, {}, monkeypatch)
+
+    bodies["INE0000000B2"] = nse_body("99.75")
+    (rows, failed, again), parsed = fetch_nse(bodies, hashes, monkeypatch)
+
+    assert parsed == ["INE0000000B2"]
+    assert list(rows) == ["INE0000000B2"] and rows["INE0000000B2"][0]["close"] == 99.75
+    assert failed == []
+    assert again["INE0000000A1"] == hashes["INE0000000A1"]
+    assert again["INE0000000B2"] != hashes["INE0000000B2"]
+
+
+def test_payload_hash_is_stable():
+    assert http_client.payload_hash(nse_body("101.25")) == http_client.payload_hash(nse_body("101.25"))
+    assert http_client.payload_hash(nse_body("101.25")) != http_client.payload_hash(nse_body("101.26"))
+
+
+def test_hashes_are_stored_with_watermarks(db):
+    advance_watermarks(db, "NSE", {"A": NOW, "B": NOW}, content_hashes={"A": "a1", "B": "b1"})
+    # A failed fetch of B stores no hash; its previous one is kept, and watermarks never go back
+    advance_watermarks(db, "NSE", {"A": NOW + timedelta(hours=1), "B": NOW - timedelta(days=1)},
+                       content_hashes={"A": "a2"})
+
+    assert get_content_hashes(db, "NSE") == {"A": "a2", "B": "b1"}
+    assert get_watermarks(db, "NSE") == {"A": NOW + timedelta(hours=1), "B": NOW}
+    assert get_content_hashes(db, "BSE") == {}
+
@@ -0,0 +1,136 @@
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sqlalchemy import func, insert, select, update
+
+from analytics.curve import (
+    CURVE_TENORS, CurveInputs, CurveModel, ZeroCurve, bond_spreads, build_curve, fit_curve, spline_basis
+)
+from analytics.pricing import CashFlowSchedule
+from database.models import Bond, YieldCurve
+
+SETTLEMENT = datetime(2024, 1, 1)
+TRUE_CURVE = ZeroCurve(CurveModel.NELSON_SIEGEL, [0.072, -0.012, 0.018], SETTLEMENT, tau=2.5)
+
+
+def bonds(count=40, seed=0, settlement=SETTLEMENT):
+    """
+    Bonds with random coupons and maturities up to 30 years, priced exactly off TRUE_CURVE.
+    """
+    rng = np.random.default_rng(seed)
+    maturity = np.datetime64(settlement, "D") + rng.integers(90, 30 * 365, size=count).astype("timedelta64[D]")
+    coupon = np.round(rng.uniform(0.0, 9.0, size=count), 2)
+    schedule = CashFlowSchedule(coupon, np.full(count, 100.0), maturity, settlement)
+    owner, periods, amounts = schedule.flows()
+    dirty = np.bincount(owner, weights=amounts * TRUE_CURVE.discount(periods / schedule.frequency), minlength=count)
+    clean = dirty - schedule.accrued_interest
+    return [
+        SimpleNamespace(isin=f"IN0020{i:06d}", name=f"GS {i}", coupon_rate=float(coupon[i]), face_value=100.0,
+                        maturity_date=maturity[i].astype(datetime), price=float(clean[i]))
+        for i in range(count)
+    ]
+
+
+def tenors(inputs):
+    years = inputs.schedule.years
+    return np.array([tenor for tenor in CURVE_TENORS if years.min() <= tenor <= years.max()])
+
+
+def test_nelson_siegel_fit_recovers_the_true_curve():
+    inputs = CurveInputs(bonds(), SETTLEMENT)
+
+    curve = fit_curve(inputs, CurveModel.NELSON_SIEGEL)
+
+    # Within a basis point: tau is only searched on a grid around the first guess
+    assert curve.rmse_bp < 1
+    assert curve.zero_rate(tenors(inputs)) == pytest.approx(TRUE_CURVE.zero_rate(tenors(inputs)), abs=1e-4)
+    assert curve.tau == pytest.approx(2.5, rel=0.1)
+
+
+def test_spline_fit_follows_the_true_curve():
+    inputs = CurveInputs(bonds(), SETTLEMENT)
+
+    curve = fit_curve(inputs, CurveModel.SPLINE)
+
+    error_bp = np.abs(curve.zero_rate(tenors(inputs)) - TRUE_CURVE.zero_rate(tenors(inputs))) * 1e4
+    assert error_bp.max() < 2
+    assert curve.rmse_bp < 1
+
+
+@pytest.mark.parametrize("model", list(CurveModel))
+def test_refit_from_the_previous_curve_matches_a_first_fit(model):
+    previous = fit_curve(CurveInputs(bonds(seed=1), SETTLEMENT), model)
+    inputs = CurveInputs(bonds(seed=2), SETTLEMENT)
+
+    refit = fit_curve(inputs, model, previous=previous)
+
+    assert refit.zero_rate(tenors(inputs)) == pytest.approx(
+        fit_curve(inputs, model).zero_rate(tenors(inputs)), abs=1e-6
+    )
+
+
+def test_spline_passes_through_its_knots_and_is_flat_beyond_them():
+    knots = np.array([0.5, 2.0, 5.0, 10.0, 30.0])
+    values = np.array([0.065, 0.07, 0.072, 0.071, 0.074])
+
+    assert values @ spline_basis(knots, knots) == pytest.approx(values, abs=1e-12)
+    assert values @ spline_basis(np.array([0.1, 40.0]), knots) == pytest.approx([0.065, 0.074], abs=1e-12)
+
+
+def test_par_yield_of_a_flat_curve():
+    # A flat continuously compounded 7% is 2 * (e^0.035 - 1) compounded semi-annually
+    curve = ZeroCurve(CurveModel.NELSON_SIEGEL, [0.07, 0.0, 0.0], SETTLEMENT, tau=1.0)
+
+    assert curve.par_yield([0.5, 2.0, 10.0, 30.0]) == pytest.approx(2 * np.expm1(0.035), abs=1e-12)
+
+
+def test_z_spread_is_the_shift_that_reprices_the_bond():
+    rows = bonds(count=5)
+    schedule = CurveInputs(rows, SETTLEMENT).schedule
+    owner, periods, amounts = schedule.flows()
+    years = periods / schedule.frequency
+    # The same bonds 50 bp cheaper than the curve
+    shifted = np.bincount(owner, weights=amounts * TRUE_CURVE.discount(years) * np.exp(-0.005 * years))
+    for row, dirty, accrued in zip(rows, shifted, schedule.accrued_interest):
+        row.price = float(dirty - accrued)
+
+    spreads = bond_spreads(CurveInputs(rows, SETTLEMENT), TRUE_CURVE)
+
+    assert [bond["z_spread_bp"] for bond in spreads] == pytest.approx([50.0] * 5, abs=1e-6)
+    assert all(bond["g_spread_bp"] > 0 for bond in spreads)
+
+
+def test_build_curve_stores_a_version_per_set_of_prices(db):
+    today = datetime.combine(date.today(), datetime.min.time())
+    rows = bonds(count=12, settlement=today)
+    db.execute(insert(Bond), [
+        {"isin": row.isin, "name": row.name, "coupon_rate": row.coupon_rate, "face_value": row.face_value,
+         "maturity_date": row.maturity_date, "last_price": row.price}
+        for row in rows
+    ] + [
+        # Not a government bond: never a constituent
+        {"isin": "INE001A07BM4", "coupon_rate": 9.0, "face_value": 100.0,
+         "maturity_date": today + timedelta(days=900), "last_price": 80.0},
+    ])
+    db.commit()
+
+    first = build_curve(db)
+    again = build_curve(db)
+    db.execute(update(Bond).where(Bond.isin == rows[0].isin).values(last_price=rows[0].price + 0.5))
+    db.commit()
+    moved = build_curve(db)
+
+    assert first.constituents == 12 and first.rmse_bp < 1
+    assert again.version == first.version
+    assert moved.version != first.version
+    assert db.scalar(select(func.count(YieldCurve.id))) == 2
+
+
+def test_too_few_constituents_build_no_curve(db):
+    db.execute(insert(Bond), [{"isin": "IN0020240001", "coupon_rate": 7.0, "face_value": 100.0,
+                               "maturity_date": datetime.now() + timedelta(days=3650), "last_price": 100.0}])
+    db.commit()
+
+    assert build_curve(db) is None
@@ -0,0 +1,133 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.driver_pool import DriverPool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.crashed = False
+        self.quit_calls = 0
+
+    def execute_script(self, script):
+        if self.crashed:
+            raise ConnectionError("browser gone")
+        return 1
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+@pytest.fixture
+def started():
+    return []
+
+
+@pytest.fixture
+def pool(started):
+    def factory():
+        started.append(FakeDriver())
+        return started[-1]
+
+    return DriverPool(factory, size=2, max_uses=3, max_memory_mb=1024)
+
+
+def test_idle_driver_is_reused(pool, started):
+    with pool.lease() as first:
+        pass
+    with pool.lease() as second:
+        pass
+
+    assert first is second
+    assert len(started) == 1
+    assert pool.stats["leases"] == 2
+
+
+def test_driver_is_recycled_after_max_uses(pool, started):
+    drivers = []
+    for _ in range(4):
+        with pool.lease() as driver:
+            drivers.append(driver)
+
+    assert drivers[:3] == [started[0]] * 3
+    assert drivers[3] is started[1]
+    assert started[0].quit_calls == 1
+    assert pool.stats["recycled"] == 1
+
+
+def test_scrape_error_keeps_a_healthy_driver(pool, started):
+    with pytest.raises(TimeoutError):
+        with pool.lease():
+            raise TimeoutError("element not found")
+    with pool.lease() as driver:
+        pass
+
+    assert driver is started[0]
+    assert pool.stats["crashed"] == 0
+
+
+def test_crashed_driver_is_replaced(pool, started):
+    with pytest.raises(ConnectionError):
+        with pool.lease() as driver:
+            driver.crashed = True
+            raise ConnectionError("browser gone")
+    with pool.lease() as replacement:
+        pass
+
+    assert replacement is started[1]
+    assert started[0].quit_calls == 1
+    assert pool.stats["crashed"] == 1
+
+
+def test_idle_driver_that_died_is_not_leased(pool, started):
+    with pool.lease():
+        pass
+    started[0].crashed = True
+
+    with pool.lease() as driver:
+        pass
+
+    assert driver is started[1]
+    assert pool.stats["crashed"] == 1
+
+
+def test_leases_are_bounded_by_pool_size(pool, started):
+    lock, active, peak = threading.Lock(), [0], [0]
+    # Every lease waits for a second one to be held at the same time
+    pair = threading.Barrier(2)
+
+    def scrape(_):
+        with pool.lease():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            pair.wait(timeout=5)
+            with lock:
+                active[0] -= 1
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(scrape, range(12)))
+
+    assert peak[0] == 2
+    assert len(started) - pool.stats["recycled"] <= 2
+
+
+def test_lease_times_out_when_pool_is_exhausted(pool):
+    with pool.lease(), pool.lease():
+        with pytest.raises(TimeoutError):
+            with pool.lease(timeout=0.05):
+                pass
+
+
+def test_close_quits_idle_and_returned_drivers(pool, started):
+    with pool.lease():
+        pass
+    with pool.lease() as leased:
+        with pool.lease():
+            pass
+        pool.close()
+        assert leased.quit_calls == 0
+
+    assert [driver.quit_calls for driver in started] == [1, 1]
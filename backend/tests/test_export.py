@@ -0,0 +1,101 @@
+import asyncio
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.models import Base, Bond, Transaction
+from utils import export
+from utils.export import TRANSACTION_SCHEMA, ExportFormat, stream_export
+
+START = datetime(2024, 3, 1, 9, 15, 0, 250000)
+ROWS = 10
+QUERY = (
+    select(
+        Transaction.id, Bond.isin, Transaction.timestamp, Transaction.price, Transaction.quantity, Transaction.source,
+    )
+    .join(Bond, Transaction.bond_id == Bond.id)
+    .order_by(Transaction.timestamp.asc(), Transaction.id.asc())
+)
+
+
+@pytest.fixture
+def trades(tmp_path, monkeypatch):
+    """
+    ROWS trades in a SQLite file that the export reads through an aiosqlite session.
+    """
+    path = tmp_path / "export.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    rows = [
+        {"id": i + 1, "bond_id": 1, "timestamp": START + timedelta(minutes=i), "price": 100 + i / 8,
+         "quantity": 10 * i, "source": "NSE" if i % 2 else "BSE"}
+        for i in range(ROWS)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Bond), [{"id": 1, "isin": "INE001A07BM4", "name": "Bond"}])
+        conn.execute(insert(Transaction), rows)
+    sessions = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"))
+    monkeypatch.setattr(export, "AsyncSessionLocal", sessions)
+    return [
+        (row["id"], "INE001A07BM4", row["timestamp"], row["price"], row["quantity"], row["source"]) for row in rows
+    ]
+
+
+def run_export(fmt, batch_rows=3):
+    async def collect():
+        return [chunk async for chunk in stream_export(QUERY, TRANSACTION_SCHEMA, fmt, batch_rows=batch_rows)]
+
+    return asyncio.run(collect())
+
+
+def test_parquet_export_has_a_row_group_per_batch(trades):
+    chunks = run_export(ExportFormat.PARQUET)
+
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    assert parquet.metadata.num_row_groups == 4
+    assert [tuple(row.values()) for row in parquet.read().to_pylist()] == trades
+    # Each batch is sent as soon as it is encoded, not at the end
+    assert len([chunk for chunk in chunks if chunk]) > 2
+
+
+def test_arrow_export_streams_record_batches(trades):
+    chunks = run_export(ExportFormat.ARROW)
+
+    reader = ipc.open_stream(b"".join(chunks))
+    batches = list(reader)
+    assert reader.schema == TRANSACTION_SCHEMA
+    assert [batch.num_rows for batch in batches] == [3, 3, 3, 1]
+    assert [tuple(row.values()) for batch in batches for row in batch.to_pylist()] == trades
+
+
+def test_csv_export_has_one_header(trades):
+    text = b"".join(run_export(ExportFormat.CSV, batch_rows=4)).decode()
+
+    header, *rows = list(csv.reader(io.StringIO(text)))
+    assert header == TRANSACTION_SCHEMA.names
+    assert rows == [
+        [str(trade_id), isin, ts.isoformat(), str(price), str(quantity), source]
+        for trade_id, isin, ts, price, quantity, source in trades
+    ]
+
+
+@pytest.mark.parametrize("fmt", list(ExportFormat))
+def test_empty_export_is_still_a_valid_file(trades, fmt):
+    async def collect():
+        query = QUERY.where(Transaction.source == "NSDL")
+        return b"".join([chunk async for chunk in stream_export(query, TRANSACTION_SCHEMA, fmt)])
+
+    data = asyncio.run(collect())
+
+    if fmt is ExportFormat.PARQUET:
+        assert pq.read_table(io.BytesIO(data)).num_rows == 0
+    elif fmt is ExportFormat.ARROW:
+        assert ipc.open_stream(data).read_all().num_rows == 0
+    else:
+        assert data.decode().splitlines() == [",".join(TRANSACTION_SCHEMA.names)]
@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+from aiohttp import web
+
+from data_acquisition import http_client
+from data_acquisition.bse_scraper import BSEPayloadContent, bse_payload_content, parse_bse_trades
+
+NSE_COOKIE = "bm_sv"
+NSE_BODY = (
+    '{"data": [{"date": "02-Jan-2024", "open": "101.10", "high": "101.40", "low": "101.00",'
+    ' "close": "101.25", "volume": "1500"}]}'
+)
+# Client options: no per-host spacing, so the tests do not wait on the rate limiter
+UNLIMITED = {"rate_limit": 0}
+FROM_DATE = datetime(2024, 1, 1)
+TO_DATE = datetime(2024, 3, 1)
+
+
+def bse_page(rows=300, view_state=""):
+    cells = "".join(
+        f"<tr><td>INE{i:09d}</td><td>02/01/2024</td><td>99.80</td><td>100.10</td><td>99.75</td>"
+        f"<td>{100 + i / 100:.2f}</td><td>{i + 1:,}</td><td>0</td></tr>"
+        for i in range(rows)
+    )
+    return (
+        '<html><body><form><input type="hidden" name="__VIEWSTATE" value="' + view_state + '" />'
+        '<table id="ctl00_ContentPlaceHolder1_gvDebt"><tr><th>ISIN</th></tr>' + cells + "</table></form></body></html>"
+    )
+
+
+def serve(app):
+    """
+    Serve an aiohttp app from its own event loop in a background thread; yields its base URL.
+    """
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}"
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+@pytest.fixture
+def bse_server():
+    """
+    A BSE stub whose pages differ only in their view state.
+    """
+    state = {"fail": False}
+
+    async def landing(request):
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    async def search(request):
+        if state["fail"]:
+            return web.Response(status=404)
+        return web.Response(text=bse_page(view_state=uuid.uuid4().hex), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get(http_client.BSE_HOME_PATH, landing)
+    app.router.add_post(http_client.BSE_SEARCH_PATH, search)
+    for base_url in serve(app):
+        yield base_url, state
+
+
+@pytest.fixture
+def nse_server(monkeypatch):
+    """
+    An NSE stub that requires the landing-page cookie and answers each ISIN
+    with the statuses queued for it in `statuses` before succeeding.
+    """
+    monkeypatch.setattr(http_client, "RETRY_BASE_DELAY", 0)
+    state = {"statuses": {}, "landing": 0, "api": 0}
+
+    async def landing(request):
+        state["landing"] += 1
+        response = web.Response(text="<html></html>", content_type="text/html")
+        response.set_cookie(NSE_COOKIE, str(state["landing"]))
+        return response
+
+    async def trades(request):
+        state["api"] += 1
+        queued = state["statuses"].get(request.query["symbol"], [])
+        if NSE_COOKIE not in request.cookies:
+            return web.Response(status=401)
+        if queued:
+            status = queued.pop(0)
+            if status == 401:
+                # The session expired: the cookie only works again after a new landing visit
+                state["expired"] = request.cookies[NSE_COOKIE]
+            return web.Response(status=status)
+        if request.cookies[NSE_COOKIE] == state.get("expired"):
+            return web.Response(status=401)
+        return web.Response(text=NSE_BODY, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get(http_client.NSE_HOME_PATH, landing)
+    app.router.add_get(http_client.NSE_TRADES_PATH, trades)
+    for base_url in serve(app):
+        yield base_url, state
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 100000])
+def test_payload_content_of_chunks_matches_whole_page(size):
+    page = bse_page(rows=20, view_state="x" * 50)
+    content = BSEPayloadContent()
+    pieces = [content.feed(page[i:i + size]) for i in range(0, len(page), size)]
+    assert "".join(pieces) + content.close() == bse_payload_content(page)
+
+
+def test_bse_pages_stream_into_records(bse_server, monkeypatch):
+    base_url, _ = bse_server
+    # Small chunks and spools so pages are split mid-tag and spill to disk
+    monkeypatch.setattr(http_client, "STREAM_CHUNK_BYTES", 257)
+    monkeypatch.setattr(http_client, "BSE_SPOOL_MAX_CHARS", 1024)
+
+    records, content_hash = http_client.fetch_bse_records(FROM_DATE, TO_DATE, bse_base_url=base_url, **UNLIMITED)
+
+    windows = len(http_client.date_windows(FROM_DATE, TO_DATE))
+    assert not isinstance(records, list)
+    expected = http_client.to_ingest_records(parse_bse_trades(bse_page())) * windows
+    assert [(bond["isin"], txn) for bond, txn in records] == [(bond["isin"], txn) for bond, txn in expected]
+    page_hash = http_client.payload_hash(bse_payload_content(bse_page()))
+    assert content_hash == http_client.payload_hash(page_hash * windows)
+
+
+def test_unchanged_bse_payload_is_not_parsed(bse_server, monkeypatch):
+    base_url, _ = bse_server
+    _, content_hash = http_client.fetch_bse_records(FROM_DATE, TO_DATE, bse_base_url=base_url, **UNLIMITED)
+    monkeypatch.setattr(http_client, "iter_bse_trades", pytest.fail)
+
+    records, again = http_client.fetch_bse_records(
+        FROM_DATE, TO_DATE, known_hash=content_hash, bse_base_url=base_url, **UNLIMITED
+    )
+
+    assert again == content_hash
+    assert list(records) == []
+
+
+def test_failed_bse_window_returns_no_records(bse_server):
+    base_url, state = bse_server
+    state["fail"] = True
+
+    assert http_client.fetch_bse_records(FROM_DATE, TO_DATE, bse_base_url=base_url, **UNLIMITED) == (None, None)
+
+
+def fetch_nse(base_url, isins):
+    return http_client.fetch_nse_records(dict.fromkeys(isins, FROM_DATE), TO_DATE, nse_base_url=base_url, **UNLIMITED)
+
+
+def test_landing_page_is_visited_once_for_concurrent_requests(nse_server):
+    base_url, state = nse_server
+    isins = [f"INE{i:09d}" for i in range(20)]
+
+    records, found, failed, hashes = fetch_nse(base_url, isins)
+
+    assert state["landing"] == 1
+    assert state["api"] == len(isins)
+    assert sorted(found) == isins and failed == [] and len(hashes) == len(isins)
+    assert [txn["price"] for _, txn in records] == [101.25] * len(isins)
+
+
+def test_transient_errors_are_retried(nse_server):
+    base_url, state = nse_server
+    state["statuses"] = {"INE000000001": [503, 429], "INE000000002": [502]}
+
+    records, found, failed, _ = fetch_nse(base_url, ["INE000000001", "INE000000002"])
+
+    assert failed == [] and len(records) == 2
+    assert state["api"] == 5
+
+
+def test_expired_session_is_warmed_up_again(nse_server):
+    base_url, state = nse_server
+    state["statuses"] = {"INE000000001": [401]}
+
+    records, _, failed, _ = fetch_nse(base_url, ["INE000000001"])
+
+    assert failed == [] and len(records) == 1
+    assert state["landing"] == 2
+
+
+def test_isin_failing_every_attempt_is_reported(nse_server):
+    base_url, state = nse_server
+    state["statuses"] = {"INE000000001": [503] * http_client.MAX_ATTEMPTS}
+
+    records, found, failed, hashes = fetch_nse(base_url, ["INE000000001", "INE000000002"])
+
+    assert failed == ["INE000000001"]
+    assert found == {"INE000000002"} and list(hashes) == ["INE000000002"]
+    assert state["api"] == http_client.MAX_ATTEMPTS + 1
+
+
+def test_client_errors_are_not_retried(nse_server):
+    base_url, state = nse_server
+    state["statuses"] = {"INE000000001": [404]}
+
+    _, _, failed, _ = fetch_nse(base_url, ["INE000000001"])
+
+    assert failed == ["INE000000001"]
+    assert state["api"] == 1
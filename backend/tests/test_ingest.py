@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from database.models import Bond, Exchange, OHLCVBar, Transaction
+from utils import ingest
+from utils.ingest import bulk_ingest, refresh_bond_stats
+
+NOW = datetime(2024, 6, 28, 10, 0)
+ISIN = "INE001A07BM4"
+
+
+def trades(prices, isin=ISIN):
+    """
+    One NSE trade per minute from NOW at each of the prices.
+    """
+    bond = {"isin": isin, "name": f"Bond {isin}", "issuer": "X", "exchange": Exchange.NSE}
+    return [
+        (bond, {"timestamp": NOW + timedelta(minutes=i), "price": price, "quantity": 10 + i, "source": "NSE"})
+        for i, price in enumerate(prices)
+    ]
+
+
+def stored_prices(db, isin=ISIN):
+    return db.scalars(
+        select(Transaction.price).join(Transaction.bond).where(Bond.isin == isin).order_by(Transaction.timestamp)
+    ).all()
+
+
+def test_new_bonds_and_trades_are_inserted(db):
+    stats = bulk_ingest(db, trades([100.0, 100.5]) + trades([99.0], isin="INE002A07BN2"))
+
+    assert (stats["bonds"], stats["transactions"], stats["duplicates"]) == (2, 3, 0)
+    assert stats["isins"] == [ISIN, "INE002A07BN2"]
+    assert stored_prices(db) == [100.0, 100.5]
+    assert stored_prices(db, "INE002A07BN2") == [99.0]
+
+
+def test_stored_trades_are_skipped_as_duplicates(db):
+    bulk_ingest(db, trades([100.0, 100.5]))
+
+    stats = bulk_ingest(db, trades([100.0, 100.5, 101.0]))
+
+    assert (stats["bonds"], stats["transactions"], stats["duplicates"]) == (0, 1, 2)
+    assert stored_prices(db) == [100.0, 100.5, 101.0]
+
+
+def test_corrected_trades_are_updated_in_place(db):
+    first = bulk_ingest(db, trades([100.0, 100.5, 101.0]))
+
+    # The exchange corrected the second trade's price and reported one more
+    again = bulk_ingest(db, trades([100.0, 100.75, 101.0, 101.5]))
+
+    assert (first["transactions"], first["changed"], first["duplicates"]) == (3, 0, 0)
+    assert (again["transactions"], again["changed"], again["duplicates"]) == (1, 1, 2)
+    assert stored_prices(db) == [100.0, 100.75, 101.0, 101.5]
+    # Bars covering the corrected trade are rebuilt from the stored trades
+    bars = {(bar.interval, bar.bucket_start): bar for bar in db.scalars(select(OHLCVBar))}
+    minute, day = bars["1m", NOW + timedelta(minutes=1)], bars["1d", NOW.replace(hour=0)]
+    assert (minute.open, minute.close, minute.trade_count) == (100.75, 100.75, 1)
+    assert (day.open, day.high, day.close, day.trade_count) == (100.0, 101.5, 101.5, 4)
+
+
+def test_repeated_rows_within_a_batch_are_ingested_once(db):
+    records = trades([100.0, 100.5])
+    bond, first = records[0]
+
+    stats = bulk_ingest(db, records + [(bond, dict(first)), (bond, dict(first, price=100.25))])
+
+    assert (stats["transactions"], stats["duplicates"]) == (2, 0)
+    assert stored_prices(db) == [100.0, 100.5]
+
+
+def test_each_chunk_is_committed_on_its_own(db, monkeypatch):
+    insert = ingest._insert_transactions
+    chunks = []
+
+    def fail_third_chunk(session, rows):
+        chunks.append(len(rows))
+        if len(chunks) == 3:
+            raise RuntimeError("connection lost")
+        return insert(session, rows)
+
+    monkeypatch.setattr(ingest, "_insert_transactions", fail_third_chunk)
+
+    with pytest.raises(RuntimeError):
+        bulk_ingest(db, trades([100.0, 100.25, 100.5, 100.75, 101.0]), chunk_size=2)
+
+    # The first two chunks stay committed; only the failing one is rolled back
+    assert chunks == [2, 2, 1]
+    assert db.scalar(select(func.count(Transaction.id))) == 4
+
+
+def test_bond_stats_come_from_the_latest_trade(db):
+    bulk_ingest(db, trades([100.0, 100.5, 99.75]))
+
+    refresh_bond_stats(db, [ISIN])
+
+    bond = db.scalar(select(Bond).where(Bond.isin == ISIN))
+    assert (bond.last_price, bond.volume) == (99.75, 12)
+
+
+def test_same_trade_time_on_two_exchanges_is_kept_per_source(db):
+    nse = trades([100.0, 100.5])
+    bse = [(bond, dict(txn, source="BSE", price=txn["price"] + 0.1)) for bond, txn in nse]
+    bulk_ingest(db, nse)
+
+    stats = bulk_ingest(db, bse + nse)
+
+    assert (stats["transactions"], stats["duplicates"]) == (2, 2)
+    assert db.scalars(select(Transaction.source).order_by(Transaction.timestamp, Transaction.source)).all() == [
+        "BSE", "NSE", "BSE", "NSE",
+    ]
+
+
+def test_records_are_consumed_one_chunk_at_a_time(db, monkeypatch):
+    insert = ingest._insert_transactions
+    pulled, pulled_at_insert = [], []
+
+    def records():
+        for record in trades([100.0 + i / 100 for i in range(7)]):
+            pulled.append(record)
+            yield record
+
+    def record_progress(session, rows):
+        pulled_at_insert.append(len(pulled))
+        return insert(session, rows)
+
+    monkeypatch.setattr(ingest, "_insert_transactions", record_progress)
+
+    stats = bulk_ingest(db, records(), chunk_size=3)
+
+    assert pulled_at_insert == [3, 6, 7]
+    assert stats["transactions"] == 7
@@ -0,0 +1,86 @@
+import pytest
+
+from utils.live_updates import ReplayBuffer, seq_key
+
+
+def buffer_of(seqs, size=10):
+    buffer = ReplayBuffer(size)
+    for seq in seqs:
+        buffer.append(seq, "INE001A07BM4", {"type": "new_transaction", "data": {"seq": seq}, "seq": seq})
+    return buffer
+
+
+def seqs_since(buffer, seq):
+    missed = buffer.since(seq)
+    return None if missed is None else [entry.seq for entry in missed]
+
+
+SEQS = ["1700000000000-0", "1700000000000-1", "1700000000005-0", "1700000000012-0"]
+
+
+@pytest.mark.parametrize("seq, expected", [
+    (SEQS[0], SEQS[1:]),
+    (SEQS[1], SEQS[2:]),
+    (SEQS[-1], []),
+    # Between two buffered entries: everything after it
+    ("1700000000003-0", SEQS[2:]),
+    # Before the buffer or after anything seen: replay is not possible
+    ("1699999999999-0", None),
+    ("1700000000012-1", None),
+    # Not a sequence number
+    ("", None),
+    ("latest", None),
+    ("12-x", None),
+])
+def test_since_bounds(seq, expected):
+    assert seqs_since(buffer_of(SEQS), seq) == expected
+
+
+def test_since_on_empty_buffer():
+    assert ReplayBuffer(10).since(SEQS[0]) is None
+
+
+def test_since_after_eviction():
+    seqs = [f"{1700000000000 + i}-0" for i in range(8)]
+    buffer = buffer_of(seqs, size=3)
+
+    assert (len(buffer), buffer.first_seq, buffer.last_seq) == (3, seqs[5], seqs[7])
+    assert seqs_since(buffer, seqs[4]) is None
+    assert seqs_since(buffer, seqs[5]) == seqs[6:]
+
+
+def test_seq_keys_order_numerically():
+    assert seq_key("999-10") < seq_key("1000-2") < seq_key("1000-10")
+    assert seq_key("1000") == (1000, 0)
+
+
+@pytest.fixture
+def ws_backlog(monkeypatch):
+    from api import main
+
+    buffer = buffer_of([f"{1700000000000 + i}-0" for i in range(8)], size=5)
+    monkeypatch.setattr(main.live_updates, "buffer", buffer)
+    monkeypatch.setattr(main.ws_manager, "max_queue", 3)
+    return main._ws_backlog
+
+
+def test_backlog_replays_the_gap(ws_backlog):
+    messages = ws_backlog("1700000000005-0", None)
+
+    assert [message["seq"] for message in messages] == ["1700000000006-0", "1700000000007-0"]
+
+
+@pytest.mark.parametrize("resume_from", [
+    # Evicted while the socket was accepted
+    "1700000000002-0",
+    # Still buffered, but more than the client's queue holds
+    "1700000000003-0",
+])
+def test_backlog_falls_back_to_a_fresh_snapshot(ws_backlog, resume_from):
+    stale = {"type": "initial_data", "data": [], "seq": resume_from}
+
+    [message] = ws_backlog(resume_from, stale)
+
+    assert message["type"] == "initial_data"
+    assert message["seq"] == "1700000000007-0"
+    assert [trade["seq"] for trade in message["data"]] == [f"{1700000000000 + i}-0" for i in range(7, 2, -1)]
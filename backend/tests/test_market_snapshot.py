@@ -0,0 +1,87 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.models import Exchange
+from utils.market_snapshot import BondSnapshot
+from utils.pagination import decode_cursor
+from utils.serialization import BOND_FIELDS
+
+SORTS = ("id", "isin", "name", "exchange", "last_price", "volume", "maturity_date", "yield_to_maturity")
+# Few distinct values, so the fuzz hits ties, NULLs and NULL <-> value changes
+CHOICES = {
+    "name": [None, "A", "Bond", "bond", "A much longer bond name than any before"],
+    "issuer": [None, "NHAI", "REC Ltd"],
+    "exchange": [None, *Exchange],
+    "last_price": [None, 99.5, 100.0, 100.25],
+    "volume": [None, 0, 10, 500],
+    "maturity_date": [None, datetime(2030, 1, 1), datetime(2030, 1, 1) + timedelta(days=1), datetime(2040, 6, 30)],
+    "yield_to_maturity": [None, 7.0, 7.5],
+}
+
+
+def random_bond(rng, bond_id):
+    bond = dict.fromkeys(BOND_FIELDS)
+    bond["isin"] = f"INE{bond_id:09d}"
+    bond.update({field: rng.choice(values) for field, values in CHOICES.items()})
+    return bond
+
+
+def rows(bonds):
+    return [(bond_id, *(bond[field] for field in BOND_FIELDS)) for bond_id, bond in bonds.items()]
+
+
+def pages(snapshot, sort, descending, limit=3):
+    """
+    The ISINs of every /bonds/ page, following the cursors.
+    """
+    isins, cursor = [], None
+    while True:
+        items, next_cursor = snapshot.query(["isin"], sort, descending, limit, cursor=cursor)
+        isins.append([item["isin"] for item in items])
+        if next_cursor is None:
+            return isins
+        cursor = decode_cursor(next_cursor)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_updated_snapshot_matches_a_fresh_build(seed):
+    rng = random.Random(seed)
+    bonds = {bond_id: random_bond(rng, bond_id) for bond_id in rng.sample(range(1, 100), 25)}
+    snapshot = BondSnapshot(rows(bonds))
+    # Build every sort order first, so the updates have to keep them in place
+    for sort in SORTS:
+        snapshot.order(sort, False)
+        snapshot.order(sort, True)
+
+    for step in range(200):
+        bond_id = rng.choice(list(bonds))
+        fields = rng.sample(list(CHOICES), rng.randint(1, 3))
+        payload = {"isin": bonds[bond_id]["isin"], **{field: rng.choice(CHOICES[field]) for field in fields}}
+        bonds[bond_id].update(payload)
+        if rng.random() < 0.5:
+            # As decoded from a JSON live message
+            payload = {
+                field: value.isoformat() if isinstance(value, datetime) else
+                value.value if isinstance(value, Exchange) else value
+                for field, value in payload.items()
+            }
+
+        assert snapshot.update(payload)
+
+        if step % 20 == 19:
+            fresh = BondSnapshot(rows(bonds))
+            for sort in SORTS:
+                for descending in (False, True):
+                    assert (
+                        snapshot.ids[snapshot.order(sort, descending)].tolist()
+                        == fresh.ids[fresh.order(sort, descending)].tolist()
+                    ), (sort, descending)
+                    assert pages(snapshot, sort, descending) == pages(fresh, sort, descending), (sort, descending)
+
+
+def test_unknown_isin_is_not_applied():
+    snapshot = BondSnapshot(rows({1: random_bond(random.Random(0), 1)}))
+
+    assert not snapshot.update({"isin": "INE999999999", "last_price": 100.0})
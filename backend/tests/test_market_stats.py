@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from database.models import DailyTradeTotals, Exchange, TradeTotals
+from utils.ingest import bulk_ingest
+from utils.market_stats import rebuild_trade_totals
+
+NOW = datetime(2024, 6, 27, 15, 0)
+
+
+def trades(rows):
+    """
+    Records for (isin, minutes after NOW, price, quantity, source) rows.
+    """
+    return [
+        (
+            {"isin": isin, "name": f"Bond {isin}", "issuer": "X", "exchange": Exchange(source)},
+            {"timestamp": NOW + timedelta(minutes=minutes), "price": price, "quantity": quantity, "source": source},
+        )
+        for isin, minutes, price, quantity, source in rows
+    ]
+
+
+def stored_totals(db):
+    totals = {
+        row.source: (row.trade_count, row.volume, round(row.value, 6), row.last_trade_at)
+        for row in db.scalars(select(TradeTotals))
+    }
+    daily = {
+        (row.trade_date, row.source): (row.trade_count, row.volume, round(row.value, 6))
+        for row in db.scalars(select(DailyTradeTotals))
+    }
+    return totals, daily
+
+
+def test_incremental_totals_match_a_rebuild(db):
+    # Two sessions (the batch crosses midnight) on both exchanges
+    bulk_ingest(db, trades([
+        ("INE001A07BM4", 0, 100.0, 10, "NSE"),
+        ("INE001A07BM4", 1, 100.5, 20, "NSE"),
+        ("INE002A07BN2", 0, 99.0, 5, "BSE"),
+        ("INE002A07BN2", 600, 99.25, 15, "BSE"),
+    ]))
+    # Corrections of a price and of a quantity, a duplicate and new trades on both days
+    bulk_ingest(db, trades([
+        ("INE001A07BM4", 0, 100.0, 10, "NSE"),
+        ("INE001A07BM4", 1, 100.75, 20, "NSE"),
+        ("INE002A07BN2", 0, 99.0, 7, "BSE"),
+        ("INE002A07BN2", 601, 99.5, 30, "BSE"),
+        ("INE001A07BM4", 602, 101.0, 40, "NSE"),
+    ]))
+    incremental = stored_totals(db)
+
+    rebuild_trade_totals(db)
+    db.commit()
+
+    assert stored_totals(db) == incremental
+    totals, daily = incremental
+    assert totals["NSE"][:2] == (3, 70) and totals["BSE"][:2] == (3, 52)
+    assert totals["NSE"][2] == 100.0 * 10 + 100.75 * 20 + 101.0 * 40
+    assert len(daily) == 4
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Float, Integer, MetaData, Table, create_engine, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from api.main import app
+from database.models import Base, Exchange
+from database.session import get_async_db
+from utils.ingest import bulk_ingest
+from utils.pagination import decode_cursor, encode_cursor, keyset_filter
+
+metadata = MetaData()
+rows_table = Table("rows", metadata, Column("id", Integer, primary_key=True), Column("price", Float))
+# Ties, and NULLs that sort last in both directions
+PRICES = [101.5, None, 99.0, 101.5, None, 100.25, 99.0, 101.5, 98.0, None]
+
+
+@pytest.mark.parametrize("value", ["INE001A07BM4", 101.25, 7, None, datetime(2024, 5, 31, 15, 30, 0, 250000)])
+def test_cursor_round_trip(value):
+    cursor = encode_cursor(value, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (value, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor("x", 1)[:-3], "eyJ2IjoxfQ"])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_pages_visit_every_row_once_in_order(descending):
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(rows_table), [{"id": i + 1, "price": price} for i, price in enumerate(PRICES)])
+
+    price, row_id = rows_table.c.price, rows_table.c.id
+    if descending:
+        order = (price.desc().nullslast(), row_id.desc())
+    else:
+        order = (price.asc().nullslast(), row_id.asc())
+    with engine.connect() as conn:
+        expected = conn.execute(select(row_id).order_by(*order)).scalars().all()
+        seen, cursor = [], None
+        while True:
+            query = select(row_id, price).order_by(*order).limit(3)
+            if cursor:
+                query = query.where(keyset_filter(price, row_id, *decode_cursor(cursor), descending))
+            page = conn.execute(query).all()
+            if not page:
+                break
+            seen.extend(row.id for row in page)
+            cursor = encode_cursor(page[-1].price, page[-1].id)
+
+    assert seen == expected
+    assert sorted(seen) == list(range(1, len(PRICES) + 1))
+
+
+def test_bond_transactions_are_paged(tmp_path):
+    path = tmp_path / "bonds.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    start = datetime(2024, 1, 2, 10)
+    with Session(engine) as db:
+        bulk_ingest(db, [
+            ({"isin": isin, "name": "Bond", "issuer": "X", "exchange": Exchange.NSE},
+             {"timestamp": start.replace(minute=i), "price": 100.0 + i, "quantity": 10, "source": "NSE"})
+            for i in range(7) for isin in ("INE001A07BM4", "INE002A07BM4")
+        ])
+
+    sessions = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"))
+
+    async def get_test_db():
+        async with sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = get_test_db
+    try:
+        client = TestClient(app)
+        pages, params = [], {"limit": 3}
+        while True:
+            response = client.get("/transactions/INE001A07BM4/", params=params)
+            assert response.status_code == 200
+            pages.append([(trade["isin"], trade["price"]) for trade in response.json()])
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+        missing = client.get("/transactions/INE999999999/")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == [("INE001A07BM4", 100.0 + i) for i in reversed(range(7))]
+    assert missing.status_code == 404
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import pytest
+
+from database import partitions
+from database.partitions import add_months, ensure_partitions, month_start, partition_name
+
+
+@pytest.mark.parametrize("ts, name", [
+    (datetime(2024, 1, 1), "transactions_p2024_01"),
+    (datetime(2024, 2, 29, 23, 59, 59, 999999), "transactions_p2024_02"),
+    (datetime(2024, 12, 31, 23, 59, 59, 999999), "transactions_p2024_12"),
+    (datetime(2025, 1, 1, 0, 0, 0, 1), "transactions_p2025_01"),
+])
+def test_timestamp_routes_to_its_month(ts, name):
+    start = month_start(ts)
+    assert partition_name(start) == name
+    assert start <= ts < add_months(start, 1)
+
+
+@pytest.mark.parametrize("months, expected", [
+    (1, datetime(2025, 1, 1)), (-11, datetime(2024, 1, 1)), (-12, datetime(2023, 12, 1)), (25, datetime(2027, 1, 1)),
+])
+def test_add_months_crosses_years(months, expected):
+    assert add_months(datetime(2024, 12, 1), months) == expected
+
+
+class FakeCatalog:
+    """
+    Stands in for a partitioned Postgres transactions table: CREATE TABLE
+    statements add to the partitions, and other processes drop them directly.
+    """
+
+    def __init__(self):
+        self.partitions = set()
+        self.created = []
+
+    def execute(self, statement):
+        name = str(statement).split()[5]
+        if name not in self.partitions:
+            self.partitions.add(name)
+            self.created.append(name)
+
+    def commit(self):
+        pass
+
+    def list(self, conn):
+        return [(name, datetime.strptime(name[len(partitions.PARTITION_PREFIX):], "%Y_%m"))
+                for name in sorted(self.partitions)]
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    catalog = FakeCatalog()
+    monkeypatch.setattr(partitions, "is_partitioned", lambda conn: True)
+    monkeypatch.setattr(partitions, "list_partitions", catalog.list)
+    return catalog
+
+
+def test_ensure_partitions_creates_only_missing_months(catalog):
+    created = ensure_partitions(catalog, [datetime(2024, 3, 5), datetime(2024, 3, 20), datetime(2024, 4, 1), None])
+
+    assert created == ["transactions_p2024_03", "transactions_p2024_04"]
+    assert ensure_partitions(catalog, [datetime(2024, 3, 9)]) == []
+
+
+def test_partition_dropped_elsewhere_is_recreated(catalog):
+    ensure_partitions(catalog, [datetime(2024, 3, 5)])
+    # Retention in another process drops the month
+    catalog.partitions.discard("transactions_p2024_03")
+
+    assert ensure_partitions(catalog, [datetime(2024, 3, 6)]) == ["transactions_p2024_03"]
+    assert "transactions_p2024_03" in catalog.partitions
@@ -0,0 +1,33 @@
+import numpy as np
+import orjson
+import pytest
+
+from analytics.portfolio import parse_positions
+
+
+def test_parse_positions():
+    isins, quantities = parse_positions(orjson.dumps({"positions": [
+        {"isin": "INE001A07BM4", "quantity": 100}, {"isin": "INE002A08534", "quantity": -25.5},
+    ]}))
+
+    assert isins == ["INE001A07BM4", "INE002A08534"]
+    assert quantities.dtype == np.float64
+    assert quantities.tolist() == [100.0, -25.5]
+
+
+@pytest.mark.parametrize("body, message", [
+    (b"{not json", "Request body is not valid JSON"),
+    (b"[]", 'Expected a JSON object {"positions": [{"isin": ..., "quantity": ...}, ...]}'),
+    (b'{"positions": {"isin": "X"}}', 'Expected a JSON object {"positions": [{"isin": ..., "quantity": ...}, ...]}'),
+    (b'{"positions": [{"isin": "X", "quantity": 1}, 5]}', "positions[1] must be an object with an isin and a quantity"),
+    (b'{"positions": [{"quantity": 1}]}', "positions[0].isin must be a string"),
+    (b'{"positions": [{"isin": 7, "quantity": 1}]}', "positions[0].isin must be a string"),
+    (b'{"positions": [{"isin": "X", "quantity": 1}, {"isin": "Y"}]}', "positions[1].quantity must be a finite number"),
+    (b'{"positions": [{"isin": "X", "quantity": "lots"}]}', "positions[0].quantity must be a finite number"),
+    (b'{"positions": [{"isin": "X", "quantity": [1, 2]}]}', "positions[0].quantity must be a finite number"),
+    (b'{"positions": [{"isin": "X", "quantity": {"n": 1}}]}', "positions[0].quantity must be a finite number"),
+])
+def test_invalid_positions_name_the_problem(body, message):
+    with pytest.raises(ValueError) as excinfo:
+        parse_positions(body)
+    assert str(excinfo.value) == message
@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import insert, select, update
+
+from analytics.pricing import (
+    CashFlowSchedule, _coupon_date, compute_bond_analytics, refresh_bond_analytics, solve_yield
+)
+from database.models import Bond
+
+SETTLEMENT = datetime(2024, 1, 1)
+
+
+def analytics(coupon_rate, clean_price, maturity, settlement=SETTLEMENT):
+    results = compute_bond_analytics([coupon_rate], [100.0], np.array([maturity], dtype="datetime64[D]"),
+                                     [clean_price], settlement=settlement)
+    return {name: float(values[0]) for name, values in results.items()}
+
+
+def test_par_bond_on_a_coupon_date():
+    # 6% semi-annual, five years: at par the yield is the coupon, and
+    # Macaulay duration is (1 + y) / y * (1 - (1 + y)^-n) periods with y = 3%, n = 10
+    result = analytics(6.0, 100.0, "2029-01-01")
+
+    assert result["yield_to_maturity"] == pytest.approx(6.0, abs=1e-9)
+    assert result["accrued_interest"] == 0.0
+    assert result["macaulay_duration"] == pytest.approx(1.03 / 0.03 * (1 - 1.03 ** -10) / 2, abs=1e-9)
+    assert result["modified_duration"] == pytest.approx(result["macaulay_duration"] / 1.03, abs=1e-12)
+
+
+def test_zero_coupon_bond():
+    # 100 / 1.05^10 is a five-year zero at 10% compounded semi-annually
+    result = analytics(0.0, 100 / 1.05 ** 10, "2029-01-01")
+
+    assert result["yield_to_maturity"] == pytest.approx(10.0, abs=1e-9)
+    assert result["macaulay_duration"] == pytest.approx(5.0, abs=1e-9)
+    assert result["modified_duration"] == pytest.approx(5.0 / 1.05, abs=1e-9)
+    assert result["convexity"] == pytest.approx(10 * 11 / 4 / 1.05 ** 2, abs=1e-9)
+
+
+def test_accrued_interest_counts_actual_days():
+    # Coupons on 1 Jan and 1 Jul: 91 of the 182 days from 1 Jan to 1 Jul 2024 have passed
+    result = analytics(8.0, 99.0, "2026-01-01", settlement=datetime(2024, 4, 1))
+
+    assert result["accrued_interest"] == pytest.approx(4.0 * 91 / 182, abs=1e-12)
+
+
+def test_coupon_dates_clip_to_month_end():
+    maturity = np.array(["2025-08-31", "2025-08-31", "2024-08-30"], dtype="datetime64[D]")
+
+    dates = _coupon_date(maturity, np.array([6, 18, 6]))
+
+    assert dates.tolist() == np.array(["2025-02-28", "2024-02-29", "2024-02-29"], dtype="datetime64[D]").tolist()
+
+
+def test_yield_round_trips_through_price():
+    maturities = np.array(["2024-03-15", "2027-06-30", "2034-01-01", "2054-11-15"], dtype="datetime64[D]")
+    coupons = np.array([7.5, 0.0, 6.25, 9.0])
+    yields = np.array([0.02, 0.074, 0.0625, 0.18])
+    schedule = CashFlowSchedule(coupons, np.full(4, 100.0), maturities, datetime(2024, 2, 10))
+    clean = schedule.dirty_price(yields) - schedule.accrued_interest
+
+    assert solve_yield(schedule, clean) == pytest.approx(yields, abs=1e-10)
+
+
+def test_invalid_inputs_are_nan():
+    results = compute_bond_analytics(
+        [7.0, np.nan, 7.0, 7.0], [100.0, 100.0, 100.0, 100.0],
+        np.array(["2030-01-01", "2030-01-01", "2020-01-01", "NaT"], dtype="datetime64[D]"),
+        [100.0, 100.0, 100.0, 100.0], settlement=SETTLEMENT,
+    )
+
+    assert np.isfinite(results["yield_to_maturity"]).tolist() == [True, False, False, False]
+    assert np.isnan(results["modified_duration"][1:]).all()
+
+
+def test_refresh_writes_analytics_back_to_bonds(db):
+    db.execute(insert(Bond), [
+        {"isin": "INE000000001", "coupon_rate": 6.0, "face_value": 100.0,
+         "maturity_date": datetime(2029, 1, 1), "last_price": 100.0},
+        # Never traded: no yield, but its accrued interest is known
+        {"isin": "INE000000002", "coupon_rate": 6.0, "face_value": 100.0, "maturity_date": datetime(2029, 1, 1)},
+    ])
+    db.commit()
+
+    assert sorted(refresh_bond_analytics(db, settlement=SETTLEMENT)) == ["INE000000001", "INE000000002"]
+
+    rows = db.execute(select(Bond.isin, Bond.yield_to_maturity, Bond.accrued_interest).order_by(Bond.isin)).all()
+    assert rows[0].yield_to_maturity == pytest.approx(6.0) and rows[0].accrued_interest == 0.0
+    assert rows[1].yield_to_maturity is None and rows[1].accrued_interest == 0.0
+
+
+def test_refresh_reports_only_bonds_whose_analytics_changed(db):
+    db.execute(insert(Bond), [
+        {"isin": f"INE00000000{i}", "coupon_rate": 6.0, "face_value": 100.0,
+         "maturity_date": datetime(2029, 1, 1), "last_price": 100.0}
+        for i in range(1, 4)
+    ])
+    db.commit()
+    refresh_bond_analytics(db, settlement=SETTLEMENT)
+
+    # Nothing traded and the same settlement date: nothing to announce
+    assert refresh_bond_analytics(db, settlement=SETTLEMENT) == []
+    db.execute(update(Bond).where(Bond.isin == "INE000000002").values(last_price=99.0))
+    db.commit()
+    assert refresh_bond_analytics(db, settlement=SETTLEMENT) == ["INE000000002"]
+    # A day later every bond has accrued interest, traded or not
+    assert sorted(refresh_bond_analytics(db, settlement=datetime(2024, 1, 2))) == [
+        "INE000000001", "INE000000002", "INE000000003",
+    ]
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from database.models import Bond, OHLCVBar, Transaction
+from utils.retention import BAR_RETENTION_DAYS, apply_retention
+
+NOW = datetime(2024, 6, 15, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def bond(db):
+    db.execute(insert(Bond), [{"id": 1, "isin": "INE000000001", "name": "Bond 1"}])
+    db.commit()
+
+
+def bar(interval, start):
+    return {
+        "bond_id": 1, "interval": interval, "bucket_start": start, "open": 100.0, "high": 100.0, "low": 100.0,
+        "close": 100.0, "volume": 1, "value": 100.0, "trade_count": 1,
+        "first_trade_at": start, "last_trade_at": start,
+    }
+
+
+def test_intraday_bars_are_pruned_to_their_horizons(db):
+    ages = [1, BAR_RETENTION_DAYS["1m"] - 1, BAR_RETENTION_DAYS["1m"] + 1, BAR_RETENTION_DAYS["1h"] + 1, 5000]
+    db.execute(insert(OHLCVBar), [
+        bar(interval, NOW - timedelta(days=age)) for interval in ("1m", "1h", "1d") for age in ages
+    ])
+    db.commit()
+
+    stats = apply_retention(db, now=NOW)
+
+    kept = {interval: sorted((NOW - start).days for start in db.scalars(
+        select(OHLCVBar.bucket_start).where(OHLCVBar.interval == interval)
+    )) for interval in ("1m", "1h", "1d")}
+    assert kept["1m"] == [1, BAR_RETENTION_DAYS["1m"] - 1]
+    assert kept["1h"] == [1, BAR_RETENTION_DAYS["1m"] - 1, BAR_RETENTION_DAYS["1m"] + 1]
+    assert kept["1d"] == ages
+    assert stats["bars_deleted"] == {"1m": 3, "1h": 2}
+
+
+def test_dropped_trades_are_rolled_up_into_daily_bars(db):
+    old, recent = datetime(2023, 1, 10, 10, 0), datetime(2024, 6, 3, 10, 0)
+    db.execute(insert(Transaction), [
+        {"bond_id": 1, "timestamp": ts, "price": 100.0, "quantity": 5, "source": "NSE"} for ts in (old, recent)
+    ])
+    db.commit()
+
+    stats = apply_retention(db, keep_months=12, now=NOW)
+
+    assert db.scalars(select(Transaction.timestamp)).all() == [recent]
+    assert db.scalars(select(OHLCVBar.bucket_start).where(OHLCVBar.interval == "1d")).all() == [datetime(2023, 1, 10)]
+    assert stats["rows_deleted"] == 1
@@ -0,0 +1,47 @@
+import json
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import insert, select
+
+from database.models import Bond, Exchange, Transaction
+from utils.serialization import (
+    BOND_FIELDS, BOND_PAYLOAD_COLUMNS, TRANSACTION_PAYLOAD_COLUMNS, bond_payload, dumps, dumps_text,
+    rows_to_dicts, transaction_payload,
+)
+
+TRADED_AT = datetime(2024, 5, 31, 15, 30, 0, 250000)
+
+
+def test_datetimes_enums_and_numpy_values_encode_natively():
+    payload = {"timestamp": TRADED_AT, "exchange": Exchange.NSE, "price": np.float64(101.25), "count": np.int64(3)}
+
+    assert json.loads(dumps(payload)) == {
+        "timestamp": "2024-05-31T15:30:00.250000", "exchange": "NSE", "price": 101.25, "count": 3,
+    }
+    assert dumps_text(payload) == dumps(payload).decode()
+
+
+def test_payload_rows_come_straight_from_the_selected_columns(db):
+    db.execute(insert(Bond), [{"id": 1, "isin": "INE001A07BM4", "name": "Bond", "exchange": Exchange.BSE}])
+    db.execute(insert(Transaction), [
+        {"id": 7, "bond_id": 1, "timestamp": TRADED_AT, "price": 99.5, "quantity": 20, "source": "BSE"},
+    ])
+
+    bond = bond_payload(db.execute(select(*BOND_PAYLOAD_COLUMNS)).one())
+    trade = transaction_payload(db.execute(
+        select(*TRANSACTION_PAYLOAD_COLUMNS).join(Bond, Transaction.bond_id == Bond.id)
+    ).one())
+
+    assert list(bond) == list(BOND_FIELDS)
+    assert (bond["isin"], bond["exchange"], bond["last_price"]) == ("INE001A07BM4", Exchange.BSE, None)
+    assert json.loads(dumps(trade)) == {
+        "id": 7, "bond_id": 1, "isin": "INE001A07BM4", "timestamp": "2024-05-31T15:30:00.250000",
+        "price": 99.5, "quantity": 20, "source": "BSE",
+    }
+
+
+def test_rows_to_dicts_zips_names():
+    assert rows_to_dicts(("isin", "price"), [("A", 1.0), ("B", None)]) == [
+        {"isin": "A", "price": 1.0}, {"isin": "B", "price": None},
+    ]
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+from utils.sync_state import ALL_ISINS, HISTORY_DAYS, SYNC_OVERLAP, advance_watermarks, get_watermarks, window_start
+
+NOW = datetime(2024, 6, 30, 18, 0)
+
+
+def test_window_starts_before_the_watermark():
+    assert window_start(NOW - timedelta(days=2), NOW) == NOW - timedelta(days=2) - SYNC_OVERLAP
+    assert window_start(NOW, NOW, overlap=timedelta(0)) == NOW
+
+
+def test_first_sync_fetches_the_full_history():
+    assert window_start(None, NOW) == NOW - timedelta(days=HISTORY_DAYS)
+
+
+def test_watermarks_only_move_forward(db):
+    advance_watermarks(db, "NSE", {"A": NOW, "B": NOW})
+    advance_watermarks(db, "NSE", {"A": NOW + timedelta(hours=1), "B": NOW - timedelta(days=1), "C": NOW})
+
+    assert get_watermarks(db, "NSE") == {"A": NOW + timedelta(hours=1), "B": NOW, "C": NOW}
+
+
+def test_watermarks_are_kept_per_source(db):
+    advance_watermarks(db, "NSE", {"A": NOW})
+    advance_watermarks(db, "BSE", {ALL_ISINS: NOW - timedelta(days=3)})
+
+    assert get_watermarks(db, "BSE") == {ALL_ISINS: NOW - timedelta(days=3)}
+    assert get_watermarks(db, "NSE", isins=["A", "B"]) == {"A": NOW}
+    assert get_watermarks(db, "NSDL") == {}
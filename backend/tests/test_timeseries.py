@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from database.models import Bond, Exchange
+from utils.ingest import bulk_ingest
+from utils import retention
+from utils.timeseries import (
+    MILLISECOND, Aggregation, bucket_rows, bucket_width, lttb, series, source_interval
+)
+
+# Recent enough that retention still keeps the minute bars and trades
+START = (datetime.now() - timedelta(days=7)).replace(hour=9, minute=0, second=0, microsecond=0)
+ISIN = "INE001A07BM4"
+
+
+def ingest(db, trades):
+    """
+    Ingest (timestamp, price, quantity) trades of one bond, building its bars; returns its id.
+    """
+    bond = {"isin": ISIN, "name": "Bond", "issuer": "X", "exchange": Exchange.NSE}
+    bulk_ingest(db, [
+        (bond, {"timestamp": ts, "price": price, "quantity": quantity, "source": "NSE"})
+        for ts, price, quantity in trades
+    ])
+    return db.scalar(select(Bond.id).where(Bond.isin == ISIN))
+
+
+def test_bucket_width_is_whole_milliseconds():
+    assert bucket_width(START, START + timedelta(days=1), 7) == timedelta(milliseconds=12342857)
+    assert bucket_width(START, START + timedelta(days=1), 24) == timedelta(hours=1)
+    # Never zero, however short the range
+    assert bucket_width(START, START + timedelta(microseconds=10), 5) == MILLISECOND
+
+
+def test_bar_on_a_bucket_edge_lands_in_that_bucket(db):
+    # One 1m bar per bucket: each bar starts exactly on its bucket's edge
+    bond_id = ingest(db, [(START + timedelta(minutes=i, seconds=30), 100.0 + i / 100, 1) for i in range(600)])
+
+    rows = bucket_rows(db, bond_id, START, START + timedelta(minutes=600), 600)
+
+    assert [row.bucket for row in rows] == list(range(600))
+    assert all(row.trade_count == 1 for row in rows)
+
+
+def test_bucket_rows_take_the_first_open_and_last_close(db):
+    bond_id = ingest(db, [
+        (START + timedelta(minutes=0, seconds=5), 100.0, 10),
+        (START + timedelta(minutes=1, seconds=20), 103.0, 5),
+        (START + timedelta(minutes=2, seconds=40), 98.0, 20),
+        (START + timedelta(minutes=3, seconds=55), 101.0, 15),
+        # Next bucket
+        (START + timedelta(minutes=6, seconds=10), 102.0, 10),
+    ])
+
+    # Five-minute buckets, each aggregating the 1m bars in it
+    first, second = bucket_rows(db, bond_id, START, START + timedelta(minutes=10), 2)
+
+    assert (first.open, first.high, first.low, first.close) == (100.0, 103.0, 98.0, 101.0)
+    assert first.last_at == START + timedelta(minutes=3, seconds=55)
+    assert (first.volume, first.trade_count) == (50, 4)
+    assert first.value == 100.0 * 10 + 103.0 * 5 + 98.0 * 20 + 101.0 * 15
+    assert (second.bucket, second.open, second.close) == (1, 102.0, 102.0)
+
+
+def test_short_buckets_read_the_trades(db):
+    bond_id = ingest(db, [
+        (START + timedelta(seconds=5), 100.0, 10),
+        (START + timedelta(seconds=8), 100.5, 10),
+        (START + timedelta(seconds=25), 99.5, 10),
+    ])
+
+    rows = bucket_rows(db, bond_id, START, START + timedelta(seconds=30), 3)
+
+    assert [(row.bucket, row.open, row.close, row.trade_count) for row in rows] == [
+        (0, 100.0, 100.5, 2), (2, 99.5, 99.5, 1),
+    ]
+
+
+@pytest.mark.parametrize("aggregation", list(Aggregation))
+@pytest.mark.parametrize("points", [1, 7, 50])
+def test_series_has_at_most_the_requested_points(db, aggregation, points):
+    rng = np.random.default_rng(0)
+    bond_id = ingest(db, [
+        (START + timedelta(minutes=int(minute)), float(price), 10)
+        for minute, price in zip(np.unique(rng.integers(0, 3 * 24 * 60, 400)), 100 + rng.normal(0, 1, 400))
+    ])
+
+    items = series(db, bond_id, START, START + timedelta(days=3), points, aggregation)
+
+    assert 0 < len(items) <= points
+    assert [item["timestamp"] for item in items] == sorted(item["timestamp"] for item in items)
+
+
+def test_vwap_weighs_prices_by_volume(db):
+    bond_id = ingest(db, [(START + timedelta(minutes=1), 100.0, 10), (START + timedelta(minutes=2), 103.0, 20)])
+
+    [point] = series(db, bond_id, START, START + timedelta(hours=1), 1, Aggregation.VWAP)
+
+    assert point == {"timestamp": START, "value": pytest.approx(102.0), "volume": 30}
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[437] = 5.0
+    y[812] = -5.0
+
+    kept = lttb(x, y, 40)
+
+    assert len(kept) == 40
+    assert (kept[0], kept[-1]) == (0, 999)
+    assert {437, 812} <= set(kept.tolist())
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_keeps_every_point_under_the_threshold():
+    x = np.arange(10, dtype=np.float64)
+
+    assert lttb(x, x, 10).tolist() == list(range(10))
+    assert lttb(x, x, 2).tolist() == [0, 9]
+
+
+def test_series_source_skips_pruned_intervals(monkeypatch):
+    now = datetime.now()
+    monkeypatch.setattr(retention, "BAR_RETENTION_DAYS", {"1m": 30, "1h": 365})
+
+    # Recent ranges read the interval matching the bucket width
+    assert source_interval(timedelta(minutes=5), now - timedelta(days=1)) == "1m"
+    assert source_interval(timedelta(hours=3), now - timedelta(days=100)) == "1h"
+    # Minute bars are gone but the trades are kept: read the trades
+    assert source_interval(timedelta(minutes=5), now - timedelta(days=60)) is None
+    # Hourly bars are gone: fall back past minute bars and trades to daily bars
+    assert source_interval(timedelta(hours=3), now - timedelta(days=700)) == "1d"
@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import msgpack
+
+from database.models import Exchange
+from utils.websocket_manager import CompactClientConnection
+from utils.ws_protocols import DELTA_FIELDS, DeltaEncoder, MsgpackEncoder, Protocol
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+    async def send_text(self, data):
+        self.frames.append(data)
+
+
+def make_ticks(start, count):
+    """
+    Trades alternating over two ISINs, with prices and quantities that often repeat.
+    """
+    t0 = datetime(2024, 1, 1, 10)
+    return [
+        {
+            "id": i,
+            "isin": "INE000000001" if i % 2 else "INE000000002",
+            "bond_id": 1 if i % 2 else 2,
+            "timestamp": (t0 + timedelta(seconds=i)).isoformat(),
+            "price": 100 + (i // 6) * 0.25,
+            "quantity": 10 * (1 + (i // 4) % 2),
+            "source": "NSE",
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def decode_ticks(frames):
+    """
+    What a delta client rebuilds: each trade by id, fields not marked changed
+    taken from the previous trade of the same ISIN it received.
+    """
+    last, trades = {}, {}
+    for frame in frames:
+        message = msgpack.unpackb(frame)
+        if message["type"] != "ticks":
+            continue
+        columns = message["columns"]
+        for row in range(message["count"]):
+            previous = last.get(columns["isin"][row], {})
+            changed = columns["changed"][row]
+            values = {
+                field: columns[field][row] if changed >> bit & 1 else previous.get(field)
+                for bit, field in enumerate(DELTA_FIELDS)
+            }
+            last[values["isin"]] = values
+            trades[values["id"]] = values
+    return trades
+
+
+async def drain(client):
+    async def on_error(websocket):
+        raise AssertionError("send failed")
+
+    client.start(on_error)
+    while client.queue_depth:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    await client.stop()
+
+
+def test_delta_round_trip():
+    encoder = DeltaEncoder()
+    ticks = make_ticks(0, 40)
+    frames = [encoder.encode_ticks(ticks[i:i + 7]) for i in range(0, len(ticks), 7)]
+    expected = DeltaEncoder()
+    assert decode_ticks(frames) == {tick["id"]: expected._values(tick) for tick in ticks}
+
+
+def test_delta_elides_unchanged_fields():
+    encoder = DeltaEncoder()
+    tick = make_ticks(1, 1)[0]
+    encoder.encode_ticks([tick])
+    frame = msgpack.unpackb(encoder.encode_ticks([dict(tick, id=99)]))
+    columns = frame["columns"]
+    assert columns["id"] == [99] and columns["isin"] == [tick["isin"]]
+    assert columns["price"] == [None] and columns["quantity"] == [None]
+    # Only id and isin were sent
+    assert columns["changed"] == [0b11]
+
+
+def test_delta_change_to_null_round_trips():
+    encoder = DeltaEncoder()
+    first, second, third = (dict(tick, isin="INE000000001") for tick in make_ticks(1, 3))
+    # Price and source change to null, then source changes back while price stays null
+    ticks = [first, dict(second, price=None, source=None), dict(third, price=None)]
+    frames = [encoder.encode_ticks([tick]) for tick in ticks]
+
+    assert decode_ticks(frames) == {tick["id"]: DeltaEncoder()._values(tick) for tick in ticks}
+
+
+def test_delta_snapshot_carries_every_field():
+    ticks = make_ticks(0, 3)
+    frame = msgpack.unpackb(DeltaEncoder(price_scale=100).encode({"type": "initial_data", "data": ticks}))
+
+    assert (frame["type"], frame["count"], frame["price_scale"]) == ("initial_data", 3, 100)
+    assert frame["columns"]["price"] == [round(tick["price"] * 100) for tick in ticks]
+    # 2024-01-01 10:00:00 as if it were UTC, in milliseconds
+    assert frame["columns"]["timestamp"] == [1704103200000, 1704103201000, 1704103202000]
+    assert None not in frame["columns"]["quantity"]
+
+
+def test_msgpack_messages_keep_the_json_shape():
+    message = {"type": "bond_update", "data": {"exchange": Exchange.NSE, "at": datetime(2024, 1, 1, 10)}}
+
+    assert msgpack.unpackb(MsgpackEncoder().encode(message)) == {
+        "type": "bond_update", "data": {"exchange": "NSE", "at": "2024-01-01T10:00:00"},
+    }
+
+
+def test_dropped_delta_frames_do_not_corrupt_client_state():
+    async def run():
+        websocket = FakeWebSocket()
+        client = CompactClientConnection(websocket, Protocol.DELTA, max_queue=2, flush_interval=3600)
+        delivered = []
+        # Ten one-batch frames into a queue of two: the oldest eight are dropped
+        for batch in range(10):
+            ticks = make_ticks(batch * 3, 3)
+            for tick in ticks:
+                client.deliver({"type": "new_transaction", "data": tick})
+            client.flush()
+            delivered.append(ticks)
+        await drain(client)
+        # Later frames, again overflowing the queue, follow what the client actually received
+        for batch in range(10, 14):
+            ticks = make_ticks(batch * 3, 3)
+            for tick in ticks:
+                client.deliver({"type": "new_transaction", "data": tick})
+            client.flush()
+            delivered.append(ticks)
+        await drain(client)
+        return client, websocket, delivered
+
+    client, websocket, delivered = asyncio.run(run())
+    assert client.dropped == 10
+    received = decode_ticks(websocket.frames)
+    expected = DeltaEncoder()
+    sent = [tick for batch in (8, 9, 12, 13) for tick in delivered[batch]]
+    assert received == {tick["id"]: expected._values(tick) for tick in sent}
@@ -0,0 +1,347 @@
+"""
+Sharded history backfill.
+
+A backfill run splits HISTORY_DAYS of history into work units: BSE per date
+window (BSE is searched market-wide) and NSE per date window and shard of
+ISINs. utils.celery_app runs the BSE units as a chord whose callback plans and
+runs the NSE units (their ISINs are the bonds BSE stored), whose callback in
+turn finishes the run. Every unit is checkpointed in backfill_units, so
+starting a run again only dispatches the units that are not done, and running
+a unit twice is harmless because ingest skips stored trades. begin_run()
+claims a run before it is dispatched, so triggers never start a run twice.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from analytics.curve import refresh_yield_curves
+from analytics.pricing import refresh_bond_analytics
+from data_acquisition.http_client import date_windows, fetch_bse_records, fetch_nse_records
+from database.bulk import chunked
+from database.models import BackfillUnit, Bond
+from utils.ingest import bulk_ingest, refresh_bond_stats
+from utils.live_updates import publish_bond_updates
+from utils.selenium_bond_scraper import HTTP_INGEST_ENABLED, scrape_bse_bonds, scrape_nse_parallel
+from utils.sync_state import ALL_ISINS, HISTORY_DAYS, advance_watermarks
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_WINDOW_DAYS = int(os.getenv("BACKFILL_WINDOW_DAYS", "30"))
+# ISINs per NSE work unit
+BACKFILL_SHARD_SIZE = int(os.getenv("BACKFILL_SHARD_SIZE", "50"))
+# Retries of a failing unit before it is marked failed (it is retried on resume)
+BACKFILL_UNIT_RETRIES = int(os.getenv("BACKFILL_UNIT_RETRIES", "3"))
+# Pending or running units untouched for this long are treated as abandoned (e.g. a worker died)
+BACKFILL_STALE_AFTER = timedelta(minutes=int(os.getenv("BACKFILL_STALE_MINUTES", "120")))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+def new_run_id(now: Optional[datetime] = None) -> str:
+    return f"backfill-{now or datetime.now():%Y%m%d%H%M%S}"
+
+
+def latest_run_id(db: Session) -> Optional[str]:
+    return db.scalar(
+        select(BackfillUnit.run_id).order_by(BackfillUnit.created_at.desc(), BackfillUnit.id.desc()).limit(1)
+    )
+
+
+def run_in_flight(db: Session, run_id: str) -> bool:
+    """
+    Whether a run still has units queued or running (ignoring abandoned ones).
+    """
+    cutoff = datetime.now() - BACKFILL_STALE_AFTER
+    unit = db.scalar(
+        select(BackfillUnit.id)
+        .where(
+            BackfillUnit.run_id == run_id,
+            BackfillUnit.status.in_([PENDING, RUNNING]),
+            BackfillUnit.updated_at >= cutoff,
+        )
+        .limit(1)
+    )
+    return unit is not None
+
+
+def run_finished(db: Session, run_id: str) -> bool:
+    """
+    Whether every unit of a run is done, NSE units included (they are only planned after BSE).
+    """
+    statuses = db.execute(
+        select(BackfillUnit.source, BackfillUnit.status).where(BackfillUnit.run_id == run_id).distinct()
+    ).all()
+    return any(source == "NSE" for source, _ in statuses) and all(status == DONE for _, status in statuses)
+
+
+def _run_range(db: Session, run_id: str) -> Optional[Tuple[datetime, datetime]]:
+    row = db.execute(
+        select(func.min(BackfillUnit.window_start), func.max(BackfillUnit.window_end)).where(BackfillUnit.run_id == run_id)
+    ).one()
+    return (row[0], row[1]) if row[0] else None
+
+
+def plan_units(db: Session, run_id: str, source: str, shards: Optional[List[List[str]]] = None,
+               now: Optional[datetime] = None) -> int:
+    """
+    Create the work units of one source for a run: one per date window (and
+    per ISIN shard when shards are given). The date range is the run's own
+    once it has units, otherwise HISTORY_DAYS up to now. A source that is
+    already planned is left as it is, so resuming keeps the same units.
+    Returns the number of units created.
+    """
+    already = db.scalar(
+        select(func.count(BackfillUnit.id)).where(BackfillUnit.run_id == run_id, BackfillUnit.source == source)
+    )
+    if already:
+        return 0
+    now = now or datetime.now()
+    start, end = _run_range(db, run_id) or (now - timedelta(days=HISTORY_DAYS), now)
+    rows = [
+        {
+            "run_id": run_id, "source": source, "window_start": window_start, "window_end": window_end,
+            "shard": shard, "isins": ",".join(isins) if isins else None, "status": PENDING, "attempts": 0,
+            "created_at": now, "updated_at": now,
+        }
+        for window_start, window_end in date_windows(start, end, BACKFILL_WINDOW_DAYS)
+        for shard, isins in enumerate(shards or [None])
+    ]
+    try:
+        db.execute(insert(BackfillUnit), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"Planned {len(rows)} {source} units for {run_id}")
+    return len(rows)
+
+
+def plan_nse_units(db: Session, run_id: str) -> int:
+    """
+    Plan the NSE units of a run, sharding every known ISIN.
+    """
+    isins = sorted(db.scalars(select(Bond.isin).where(Bond.isin.isnot(None))))
+    return plan_units(db, run_id, "NSE", shards=list(chunked(isins, BACKFILL_SHARD_SIZE)))
+
+
+def unfinished_unit_ids(db: Session, run_id: str, source: str) -> List[int]:
+    return list(db.scalars(
+        select(BackfillUnit.id)
+        .where(BackfillUnit.run_id == run_id, BackfillUnit.source == source, BackfillUnit.status != DONE)
+        .order_by(BackfillUnit.window_start, BackfillUnit.shard)
+    ))
+
+
+def begin_run(db: Session, run_id: Optional[str] = None, now: Optional[datetime] = None) -> Tuple[str, bool]:
+    """
+    Claim a run before it is dispatched: run_id, else the latest run while it
+    is unfinished, else a new one. Its BSE units are planned and its unfinished
+    units set back to pending here, so as soon as this returns run_in_flight()
+    sees the run and another trigger or the hourly fetch does not start it
+    again. Returns the run id and whether to dispatch it (False when it is
+    already in flight).
+    """
+    if run_id is None:
+        latest = latest_run_id(db)
+        if latest is not None and not run_finished(db, latest):
+            run_id = latest
+    if run_id is not None and run_in_flight(db, run_id):
+        return run_id, False
+
+    now = now or datetime.now()
+    run_id = run_id or new_run_id(now)
+    try:
+        plan_units(db, run_id, "BSE", now=now)
+    except IntegrityError:
+        # A concurrent trigger planned the same run first and dispatches it
+        return run_id, False
+    db.execute(
+        update(BackfillUnit)
+        .where(BackfillUnit.run_id == run_id, BackfillUnit.status != DONE)
+        .values(status=PENDING, updated_at=now)
+    )
+    db.commit()
+    return run_id, True
+
+
+def _bse_records(unit: BackfillUnit):
+    records = None
+    if HTTP_INGEST_ENABLED:
+        records, _ = fetch_bse_records(unit.window_start, unit.window_end)
+    if records is None:
+        logger.info(f"Falling back to Selenium for BSE unit {unit.id}")
+        records = scrape_bse_bonds(fetch_all=False, last_run_time=unit.window_start, until=unit.window_end)
+    return records, []
+
+
+def _nse_records(unit: BackfillUnit):
+    isins = unit.isins.split(",") if unit.isins else []
+    starts = dict.fromkeys(isins, unit.window_start)
+    records, pending = [], isins
+    if HTTP_INGEST_ENABLED and isins:
+        records, _, pending, _ = fetch_nse_records(starts, unit.window_end)
+    failed = set()
+    if pending:
+        logger.info(f"Falling back to Selenium for {len(pending)} ISINs of NSE unit {unit.id}")
+        selenium_records, _, failed = scrape_nse_parallel(pending, fetch_all=False, starts=starts)
+        # The NSE page has no end date; the rest of the range belongs to later units
+        records.extend(record for record in selenium_records if record[1]["timestamp"] < unit.window_end)
+    return records, sorted(failed)
+
+
+def run_unit(db: Session, unit_id: int) -> Dict[str, Any]:
+    """
+    Fetch and ingest one work unit, then checkpoint it as done. A unit that is
+    already done is skipped. Raises when anything in the unit failed; what was
+    fetched is stored first, so a retry only adds what is missing.
+    """
+    unit = db.get(BackfillUnit, unit_id)
+    if unit is None:
+        raise ValueError(f"Unknown backfill unit {unit_id}")
+    if unit.status == DONE:
+        logger.info(f"Backfill unit {unit_id} already done; skipping")
+        return unit_result(unit)
+
+    now = datetime.now()
+    unit.status, unit.attempts, unit.error = RUNNING, unit.attempts + 1, None
+    unit.started_at = unit.updated_at = now
+    db.commit()
+
+    records, failed = (_bse_records if unit.source == "BSE" else _nse_records)(unit)
+    stats = bulk_ingest(db, records)
+    if failed:
+        raise RuntimeError(f"Fetch failed for {len(failed)} ISINs: {', '.join(failed[:10])}")
+
+    unit.status = DONE
+    unit.records = stats["transactions"] + stats["changed"] + stats["duplicates"]
+    unit.transactions = stats["transactions"]
+    unit.finished_at = unit.updated_at = datetime.now()
+    db.commit()
+    logger.info(
+        f"Backfill unit {unit_id} ({unit.source} {unit.window_start:%Y-%m-%d}..{unit.window_end:%Y-%m-%d} "
+        f"shard {unit.shard}) done: {unit.records} records, {unit.transactions} new transactions "
+        f"in {(unit.finished_at - now).total_seconds():.1f}s"
+    )
+    progress = backfill_progress(db, unit.run_id)
+    logger.info(
+        f"Backfill {unit.run_id}: {progress['units']['done']}/{progress['units']['total']} units, "
+        f"{progress['records']} records, {progress['records_per_second']} records/s"
+    )
+    return unit_result(unit)
+
+
+def mark_unit_failed(db: Session, unit_id: int, error: Exception, final: bool):
+    """
+    Record a failed attempt. The unit goes back to pending while it will be
+    retried, and to failed once the retries are used up.
+    """
+    unit = db.get(BackfillUnit, unit_id)
+    if unit is None:
+        return
+    unit.status = FAILED if final else PENDING
+    unit.error = str(error)
+    unit.updated_at = datetime.now()
+    db.commit()
+
+
+def unit_result(unit: BackfillUnit) -> Dict[str, Any]:
+    return {
+        "unit": unit.id, "source": unit.source, "shard": unit.shard, "status": unit.status,
+        "records": unit.records, "transactions": unit.transactions, "attempts": unit.attempts,
+    }
+
+
+def backfill_progress(db: Session, run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Unit counts by source and status, records stored, throughput and an ETA
+    for a run (the latest one by default). NSE units only count once BSE is
+    done and they are planned.
+    """
+    run_id = run_id or latest_run_id(db)
+    if run_id is None:
+        return None
+    rows = db.execute(
+        select(
+            BackfillUnit.source, BackfillUnit.status, func.count(BackfillUnit.id),
+            func.sum(BackfillUnit.records), func.sum(BackfillUnit.transactions),
+            func.min(BackfillUnit.started_at), func.max(BackfillUnit.finished_at),
+        )
+        .where(BackfillUnit.run_id == run_id)
+        .group_by(BackfillUnit.source, BackfillUnit.status)
+    ).all()
+    if not rows:
+        return None
+
+    units = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+    by_source: Dict[str, Dict[str, int]] = {}
+    records = transactions = 0
+    started = finished = None
+    for source, status, count, status_records, status_transactions, first_start, last_finish in rows:
+        units[status] = units.get(status, 0) + count
+        by_source.setdefault(source, {})[status] = count
+        records += status_records or 0
+        transactions += status_transactions or 0
+        if first_start and (started is None or first_start < started):
+            started = first_start
+        if last_finish and (finished is None or last_finish > finished):
+            finished = last_finish
+    total = sum(units.values())
+    complete = "NSE" in by_source and units[DONE] == total
+
+    end = finished if complete else datetime.now()
+    elapsed = (end - started).total_seconds() if started else 0.0
+    remaining = total - units[DONE] - units[FAILED]
+    units_per_second = units[DONE] / elapsed if elapsed else 0.0
+    return {
+        "run_id": run_id,
+        "complete": complete,
+        "in_flight": run_in_flight(db, run_id),
+        "units": dict(units, total=total),
+        "by_source": by_source,
+        "records": records,
+        "transactions": transactions,
+        "elapsed_seconds": round(elapsed, 1),
+        "records_per_second": round(records / elapsed, 1) if elapsed else 0.0,
+        "units_per_minute": round(units_per_second * 60, 2),
+        "eta_seconds": round(remaining / units_per_second) if units_per_second and remaining else None,
+    }
+
+
+def finish_run(db: Session, run_id: str) -> Dict[str, Any]:
+    """
+    Wrap up a run after its NSE units: refresh the stats and analytics of the
+    bonds it covered, advance the sync watermarks of what is complete (BSE once
+    all its windows are done, an NSE ISIN once every window of its shard is),
+    and push the refreshed bonds to dashboards. Safe on a partial run; a
+    resumed run finishes again.
+    """
+    units = db.scalars(select(BackfillUnit).where(BackfillUnit.run_id == run_id)).all()
+    bse = [unit for unit in units if unit.source == "BSE"]
+    if bse and all(unit.status == DONE for unit in bse):
+        advance_watermarks(db, "BSE", {ALL_ISINS: max(unit.window_end for unit in bse)})
+
+    shards: Dict[int, List[BackfillUnit]] = {}
+    for unit in units:
+        if unit.source == "NSE":
+            shards.setdefault(unit.shard, []).append(unit)
+    isins, watermarks = set(), {}
+    for shard_units in shards.values():
+        shard_isins = shard_units[0].isins.split(",") if shard_units[0].isins else []
+        isins.update(shard_isins)
+        if all(unit.status == DONE for unit in shard_units):
+            mark = max(unit.window_end for unit in shard_units)
+            watermarks.update(dict.fromkeys(shard_isins, mark))
+    advance_watermarks(db, "NSE", watermarks)
+
+    refresh_bond_stats(db, isins)
+    repriced = refresh_bond_analytics(db)
+    refresh_yield_curves(db)
+    publish_bond_updates(db, isins.union(repriced))
+    progress = backfill_progress(db, run_id)
+    logger.info(f"Finished backfill {run_id}: {progress}")
+    return progress
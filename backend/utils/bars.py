@@ -0,0 +1,212 @@
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import case, delete, select
+from sqlalchemy.orm import Session
+
+from database.bulk import dialect_insert
+from database.models import OHLCVBar, Transaction
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = ("1m", "1h", "1d")
+INTERVAL_LENGTHS = {
+    "1m": timedelta(minutes=1),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+BACKFILL_BATCH_SIZE = 10000
+
+
+def bucket_start(ts: datetime, interval: str) -> datetime:
+    """
+    Floor a timestamp to the start of its bucket.
+    """
+    if interval == "1m":
+        return ts.replace(second=0, microsecond=0)
+    if interval == "1h":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if interval == "1d":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unsupported bar interval: {interval}")
+
+
+def aggregate_trades(rows: Iterable[Dict[str, Any]], interval: str) -> Iterator[Dict[str, Any]]:
+    """
+    Fold trades into bars. Rows are mappings with bond_id, timestamp, price and
+    quantity, plus optional open/high/low when the source already reports a
+    daily range, and must be ordered by (bond_id, timestamp). That range
+    covers the whole trading day, so only 1d bars take it; 1m and 1h bars are
+    built from the trade prices alone. Bars are yielded as soon as their
+    bucket is complete, so memory stays flat for any input size.
+    value is sum(price * quantity), from which VWAP is read.
+    """
+    daily = interval == "1d"
+    bar = None
+    for row in rows:
+        price = row["price"]
+        open_, high, low = (row.get("open"), row.get("high"), row.get("low")) if daily else (None, None, None)
+        start = bucket_start(row["timestamp"], interval)
+        if bar is None or bar["bond_id"] != row["bond_id"] or bar["bucket_start"] != start:
+            if bar is not None:
+                yield bar
+            bar = {
+                "bond_id": row["bond_id"],
+                "interval": interval,
+                "bucket_start": start,
+                "open": open_ or price,
+                "high": price,
+                "low": price,
+                "close": price,
+                "volume": 0,
+                "value": 0.0,
+                "trade_count": 0,
+                "first_trade_at": row["timestamp"],
+                "last_trade_at": row["timestamp"],
+            }
+        bar["high"] = max(bar["high"], high or price)
+        bar["low"] = min(bar["low"], low or price)
+        bar["close"] = price
+        bar["volume"] += row["quantity"] or 0
+        bar["value"] += price * (row["quantity"] or 0)
+        bar["trade_count"] += 1
+        bar["last_trade_at"] = row["timestamp"]
+    if bar is not None:
+        yield bar
+
+
+def merge_bars(db: Session, bars: List[Dict[str, Any]]) -> int:
+    """
+    Merge partial bars built from newly inserted trades into the stored bars.
+    High/low/volume/count combine, while open and close come from whichever
+    side traded first and last, so out-of-order batches still merge correctly.
+    """
+    if not bars:
+        return 0
+    stored = OHLCVBar.__table__.c
+    stmt = dialect_insert(db, OHLCVBar)
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OHLCVBar.bond_id, OHLCVBar.interval, OHLCVBar.bucket_start],
+        set_={
+            "open": case((new.first_trade_at < stored.first_trade_at, new.open), else_=stored.open),
+            "close": case((new.last_trade_at >= stored.last_trade_at, new.close), else_=stored.close),
+            "high": case((new.high > stored.high, new.high), else_=stored.high),
+            "low": case((new.low < stored.low, new.low), else_=stored.low),
+            "volume": stored.volume + new.volume,
+            "value": stored.value + new.value,
+            "trade_count": stored.trade_count + new.trade_count,
+            "first_trade_at": case(
+                (new.first_trade_at < stored.first_trade_at, new.first_trade_at), else_=stored.first_trade_at
+            ),
+            "last_trade_at": case(
+                (new.last_trade_at > stored.last_trade_at, new.last_trade_at), else_=stored.last_trade_at
+            ),
+        },
+    )
+    db.execute(stmt, bars)
+    return len(bars)
+
+
+def fill_bars(db: Session, bars: List[Dict[str, Any]]) -> int:
+    """
+    Insert bars for buckets that have none yet, leaving stored bars untouched.
+    Used to backfill history that predates incremental maintenance.
+    """
+    if not bars:
+        return 0
+    stmt = dialect_insert(db, OHLCVBar).on_conflict_do_nothing(
+        index_elements=[OHLCVBar.bond_id, OHLCVBar.interval, OHLCVBar.bucket_start]
+    )
+    db.execute(stmt, bars)
+    return len(bars)
+
+
+def update_bars_for_trades(db: Session, trades: List[Dict[str, Any]], intervals: Sequence[str] = INTERVALS) -> int:
+    """
+    Fold a batch of newly inserted trades into the bars of every interval.
+    Call inside the transaction that inserted the trades so both commit together.
+    """
+    if not trades:
+        return 0
+    trades = sorted(trades, key=lambda t: (t["bond_id"], t["timestamp"]))
+    written = 0
+    for interval in intervals:
+        written += merge_bars(db, list(aggregate_trades(trades, interval)))
+    return written
+
+
+def rebuild_bars_for_trades(db: Session, trades: List[Dict[str, Any]], intervals: Sequence[str] = INTERVALS) -> int:
+    """
+    Recompute from the stored trades the bars of every bucket touched by
+    trades whose price or quantity was corrected; folding them in again would
+    count them twice. Call inside the transaction that updated the trades.
+    """
+    if not trades:
+        return 0
+    # The corrected trades themselves may carry the source's daily range as hints
+    corrected = {(t["bond_id"], t["timestamp"], t["source"]): t for t in trades}
+    written = 0
+    for interval in intervals:
+        buckets = sorted({(t["bond_id"], bucket_start(t["timestamp"], interval)) for t in trades})
+        bars = []
+        for bond_id, start in buckets:
+            rows = db.execute(
+                select(
+                    Transaction.bond_id, Transaction.timestamp, Transaction.source,
+                    Transaction.price, Transaction.quantity,
+                )
+                .where(
+                    Transaction.bond_id == bond_id,
+                    Transaction.timestamp >= start,
+                    Transaction.timestamp < start + INTERVAL_LENGTHS[interval],
+                )
+                .order_by(Transaction.timestamp, Transaction.id)
+            ).mappings()
+            rows = (corrected.get((row["bond_id"], row["timestamp"], row["source"]), row) for row in rows)
+            bars.extend(aggregate_trades(rows, interval))
+            db.execute(delete(OHLCVBar).where(
+                OHLCVBar.bond_id == bond_id, OHLCVBar.interval == interval, OHLCVBar.bucket_start == start
+            ))
+        written += fill_bars(db, bars)
+    return written
+
+
+def backfill_bars(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  intervals: Sequence[str] = INTERVALS) -> int:
+    """
+    Build missing bars from stored trades in [start, end), streaming trades in
+    batches so the whole range never sits in memory. The caller commits.
+    """
+    written = 0
+    for interval in intervals:
+        query = select(Transaction.bond_id, Transaction.timestamp, Transaction.price, Transaction.quantity)
+        if start:
+            query = query.where(Transaction.timestamp >= start)
+        if end:
+            query = query.where(Transaction.timestamp < end)
+        query = query.order_by(Transaction.bond_id, Transaction.timestamp, Transaction.id)
+        rows = db.execute(query.execution_options(yield_per=BACKFILL_BATCH_SIZE)).mappings()
+        bars = aggregate_trades(rows, interval)
+        while True:
+            batch = list(islice(bars, BACKFILL_BATCH_SIZE))
+            if not batch:
+                break
+            written += fill_bars(db, batch)
+        logger.info(f"Backfilled {interval} bars")
+    return written
+
+
+if __name__ == "__main__":
+    from database.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        count = backfill_bars(db)
+        db.commit()
+        logger.info(f"Backfilled {count} bars from stored transactions")
+    finally:
+        db.close()
@@ -0,0 +1,275 @@
+"""
+Read-through cache for pre-serialized API responses.
+
+Two tiers: a per-process LRU with TTL and size limits, and an optional
+Redis tier shared by every API worker (enabled when REDIS_URL is set). The
+LRU is synchronous; the Redis tier is asyncio (ResponseCache.get/set are
+awaited) and bounded by a short socket timeout, so a slow or unreachable
+Redis never blocks the event loop and only degrades to cache misses.
+Bond data only changes when the Celery ingest task runs, so the task calls
+publish_ingest_completed(); every worker listening on INVALIDATION_CHANNEL
+then clears its LRU and moves to a new generation, which also retires all
+shared entries because the generation is part of their Redis key.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Longest a request waits on the shared tier before treating it as a miss
+SHARED_TIMEOUT_SECONDS = float(os.getenv("RESPONSE_CACHE_REDIS_TIMEOUT_MS", "100")) / 1000
+RECONNECT_DELAY_SECONDS = 1.0
+MAX_RECONNECT_DELAY_SECONDS = 30.0
+
+INVALIDATION_CHANNEL = "bond_dashboard:ingest_completed"
+GENERATION_KEY = "bond_dashboard:cache_generation"
+SHARED_KEY_PREFIX = "bond_dashboard:response"
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "headers", "expires_at")
+
+    def __init__(self, body: bytes, headers: Optional[Dict[str, str]] = None, ttl: float = CACHE_TTL_SECONDS):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.headers = headers or {}
+        self.expires_at = time.monotonic() + ttl
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps({"etag": self.etag, "headers": self.headers}).encode()
+        return len(header).to_bytes(4, "big") + header + self.body
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, ttl: float) -> "CachedResponse":
+        size = int.from_bytes(raw[:4], "big")
+        meta = json.loads(raw[4:4 + size])
+        entry = cls.__new__(cls)
+        entry.body = raw[4 + size:]
+        entry.etag = meta["etag"]
+        entry.headers = meta["headers"]
+        entry.expires_at = time.monotonic() + ttl
+        return entry
+
+
+class LRUCache:
+    """
+    Thread-safe LRU bounded by entry count and total body size, with a TTL per entry.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: str, entry: CachedResponse):
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class ResponseCache:
+    """
+    Local LRU in front of an optional shared Redis tier.
+    """
+
+    def __init__(self, redis_url: Optional[str] = REDIS_URL, ttl: float = CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.local = LRUCache()
+        self.generation = 0
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+        self.invalidations = 0
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        if redis_url:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.Redis.from_url(
+                redis_url, socket_timeout=SHARED_TIMEOUT_SECONDS, socket_connect_timeout=SHARED_TIMEOUT_SECONDS
+            )
+
+    def _shared_key(self, key: str) -> str:
+        return f"{SHARED_KEY_PREFIX}:{self.generation}:{key}"
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self.local.get(key)
+        if entry is not None or self._redis is None:
+            return entry
+        try:
+            raw = await self._redis.get(self._shared_key(key))
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning(f"Shared response cache unavailable: {e}")
+            return None
+        if raw is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        entry = CachedResponse.from_bytes(raw, self.ttl)
+        self.local.set(key, entry)
+        return entry
+
+    async def set(self, key: str, body: bytes, headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        entry = CachedResponse(body, headers, self.ttl)
+        self.local.set(key, entry)
+        if self._redis is not None:
+            try:
+                await self._redis.set(self._shared_key(key), entry.to_bytes(), ex=int(self.ttl))
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning(f"Shared response cache unavailable: {e}")
+        return entry
+
+    def invalidate(self, generation: Optional[int] = None):
+        """
+        Drop every cached response of this worker. Passing the generation
+        announced by the ingest event also switches shared keys over to it.
+        """
+        self.local.clear()
+        self.generation = generation if generation is not None else self.generation + 1
+        self.invalidations += 1
+        logger.info(f"Response cache invalidated (generation {self.generation})")
+
+    def start_listener(self):
+        """
+        Follow ingest-completed events in a background task on the running event loop.
+        """
+        if self._redis is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+
+        delay = RECONNECT_DELAY_SECONDS
+        while True:
+            # Without the request timeout: the subscription waits for events indefinitely
+            client = aioredis.Redis.from_url(self.redis_url)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Read after subscribing, so an ingest missed while disconnected is not lost
+                current = await client.get(GENERATION_KEY)
+                if current is not None and int(current) != self.generation:
+                    self.invalidate(int(current))
+                delay = RECONNECT_DELAY_SECONDS
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._on_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning(f"Cache invalidation subscription lost: {e}; retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+    def _on_message(self, message):
+        try:
+            payload = json.loads(message["data"])
+            self.invalidate(int(payload["generation"]))
+        except (ValueError, KeyError, TypeError):
+            self.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "invalidations": self.invalidations,
+            "local": self.local.stats(),
+            "shared": {
+                "enabled": self._redis is not None,
+                "hits": self.shared_hits,
+                "misses": self.shared_misses,
+                "errors": self.shared_errors,
+            },
+        }
+
+
+def publish_ingest_completed(redis_url: Optional[str] = REDIS_URL, **details) -> Optional[int]:
+    """
+    Announce that new bond data was committed. Called by the Celery ingest task.
+    Returns the new cache generation, or None when no Redis is configured.
+    """
+    if not redis_url:
+        return None
+    import redis
+
+    client = redis.Redis.from_url(redis_url)
+    generation = client.incr(GENERATION_KEY)
+    client.publish(INVALIDATION_CHANNEL, json.dumps({"generation": generation, **details}))
+    logger.info(f"Published ingest-completed event (generation {generation})")
+    return generation
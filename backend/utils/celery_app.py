@@ -1,4 +1,4 @@
-from celery import Celery
+from celery import Celery, chord
 from data_acquisition.nse_scraper import NSEScraper
 from data_acquisition.bse_scraper import BSEScraper
 from database.session import SessionLocal
@@ -6,6 +6,12 @@ from database.models import Bond, Transaction, Exchange
 from datetime import datetime, timedelta
 from sqlalchemy.exc import IntegrityError
 from utils.selenium_bond_scraper import run_selenium_scraper, check_for_updates
+from utils.retention import apply_retention
+from utils.cache import publish_ingest_completed
+from utils.backfill import (
+    BACKFILL_UNIT_RETRIES, FAILED, begin_run, finish_run, latest_run_id, mark_unit_failed,
+    new_run_id, plan_nse_units, plan_units, run_in_flight, run_unit, unfinished_unit_ids,
+)
 import logging
 
 # Configure logging
@@ -31,22 +37,41 @@ def fetch_bond_data(self):
     """
     Celery task to fetch bond data from NSE and BSE.
     This task will:
-    1. Do a full fetch if no data exists
-    2. Otherwise, fetch only new data since last run
+    1. Start a sharded backfill if no data exists
+    2. Do nothing while a backfill is in flight
+    3. Otherwise, fetch only new data since last run
     """
     db = SessionLocal()
     try:
+        # A running backfill fetches the same history; let it finish first
+        run_id = latest_run_id(db)
+        if run_id and run_in_flight(db, run_id):
+            logger.info(f"Backfill {run_id} in progress; skipping this fetch")
+            return
+        
         # Check if we have any data
         bond_count = db.query(Bond).count()
         
         if bond_count == 0:
-            logger.info("No existing data found. Performing full data fetch.")
-            run_selenium_scraper(fetch_all=True)
+            # Claimed before dispatch, so the next hourly run sees it in flight
+            run_id, dispatch = begin_run(db)
+            if dispatch:
+                logger.info(f"No existing data found. Starting backfill {run_id}.")
+                start_backfill.delay(run_id)
+            return
         else:
             logger.info("Existing data found. Checking for updates.")
-            check_for_updates()
+            report = check_for_updates()
             
         logger.info("Successfully completed bond data fetch task")
+
+        # Cached API responses are stale now; a failed announcement must not re-run the fetch
+        try:
+            publish_ingest_completed(task="fetch_bond_data")
+        except Exception as e:
+            logger.error(f"Error publishing ingest-completed event: {str(e)}")
+        # Payloads skipped as unchanged and rows actually written, for the task result
+        return report
         
     except Exception as e:
         logger.error(f"Error in bond data fetch task: {str(e)}")
@@ -56,14 +81,113 @@ def fetch_bond_data(self):
     finally:
         db.close()
 
+@celery_app.task
+def start_backfill(run_id=None):
+    """
+    Start a sharded history backfill, or resume run_id, in which case only the
+    units that are not done yet are dispatched. The BSE units run as a chord
+    whose callback plans and runs the NSE units. Triggers claim the run with
+    begin_run() before dispatching this task.
+    """
+    db = SessionLocal()
+    try:
+        run_id = run_id or new_run_id()
+        plan_units(db, run_id, "BSE")
+        unit_ids = unfinished_unit_ids(db, run_id, "BSE")
+    finally:
+        db.close()
+    logger.info(f"Backfill {run_id}: dispatching {len(unit_ids)} BSE units")
+    if unit_ids:
+        chord(backfill_unit.si(unit_id) for unit_id in unit_ids)(plan_nse_backfill.si(run_id))
+    else:
+        plan_nse_backfill.delay(run_id)
+    return run_id
+
+@celery_app.task(bind=True, max_retries=BACKFILL_UNIT_RETRIES)
+def backfill_unit(self, unit_id):
+    """
+    Run one backfill work unit, retrying it with exponential backoff. A unit
+    that still fails is marked failed and reported rather than raised, so the
+    rest of the chord carries on; resuming the run retries it.
+    """
+    db = SessionLocal()
+    try:
+        return run_unit(db, unit_id)
+    except Exception as e:
+        db.rollback()
+        final = self.request.retries >= self.max_retries
+        mark_unit_failed(db, unit_id, e, final)
+        if final:
+            logger.error(f"Backfill unit {unit_id} failed after {self.request.retries + 1} attempts: {str(e)}")
+            return {"unit": unit_id, "status": FAILED, "error": str(e)}
+        retry_in = (2 ** self.request.retries) * 30  # seconds
+        raise self.retry(exc=e, countdown=retry_in)
+    finally:
+        db.close()
+
+@celery_app.task
+def plan_nse_backfill(run_id):
+    """
+    Chord callback of the BSE units: shard the ISINs now known and run the NSE units.
+    """
+    db = SessionLocal()
+    try:
+        plan_nse_units(db, run_id)
+        unit_ids = unfinished_unit_ids(db, run_id, "NSE")
+    finally:
+        db.close()
+    logger.info(f"Backfill {run_id}: dispatching {len(unit_ids)} NSE units")
+    if unit_ids:
+        chord(backfill_unit.si(unit_id) for unit_id in unit_ids)(finish_backfill.si(run_id))
+    else:
+        finish_backfill.delay(run_id)
+
+@celery_app.task
+def finish_backfill(run_id):
+    """
+    Chord callback of the NSE units: refresh derived data, advance the sync
+    watermarks and return the run's progress and throughput.
+    """
+    db = SessionLocal()
+    try:
+        progress = finish_run(db, run_id)
+    finally:
+        db.close()
+    try:
+        publish_ingest_completed(task="backfill", run_id=run_id)
+    except Exception as e:
+        logger.error(f"Error publishing ingest-completed event: {str(e)}")
+    return progress
+
+@celery_app.task
+def apply_transaction_retention():
+    """
+    Celery task that rolls transactions older than the retention window up
+    into daily OHLCV bars and drops the raw rows (whole partitions on Postgres).
+    """
+    db = SessionLocal()
+    try:
+        stats = apply_retention(db)
+        logger.info(f"Applied transaction retention: {stats}")
+        return stats
+    except Exception as e:
+        logger.error(f"Error applying transaction retention: {str(e)}")
+        raise
+    finally:
+        db.close()
+
 # Schedule periodic tasks
 celery_app.conf.beat_schedule = {
     'fetch-bond-data-hourly': {
-        'task': 'celery_app.fetch_bond_data',
+        'task': 'utils.celery_app.fetch_bond_data',
         'schedule': 3600.0,  # Run every hour
     },
+    'apply-transaction-retention-daily': {
+        'task': 'utils.celery_app.apply_transaction_retention',
+        'schedule': 86400.0,  # Run once a day
+    },
 }
 
 # Example usage:
-# To start the worker: celery -A celery_app worker --loglevel=info
-# To start the beat scheduler: celery -A celery_app beat --loglevel=info 
\ No newline at end of file
+# To start the worker: celery -A utils.celery_app worker --loglevel=info
+# To start the beat scheduler: celery -A utils.celery_app beat --loglevel=info 
\ No newline at end of file
@@ -0,0 +1,171 @@
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Drivers kept warm at once; also the number of ISINs scraped in parallel
+DRIVER_POOL_SIZE = int(os.getenv("SELENIUM_POOL_SIZE", "4"))
+# Chromium leaks memory over long sessions, so drivers are replaced after this many leases
+DRIVER_MAX_USES = int(os.getenv("SELENIUM_DRIVER_MAX_USES", "50"))
+# Resident memory (MB) of one driver's process tree above which it is replaced
+DRIVER_MAX_MEMORY_MB = int(os.getenv("SELENIUM_DRIVER_MAX_MEMORY_MB", "1024"))
+LEASE_TIMEOUT = 300  # seconds
+
+
+def _process_tree_rss_mb(root_pid: int) -> Optional[float]:
+    """
+    Resident memory of a process and all its descendants, read from /proc.
+    Returns None where /proc is unavailable.
+    """
+    children: Dict[int, list] = {}
+    rss_pages: Dict[int, int] = {}
+    try:
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                with open(f"/proc/{entry}/statm") as f:
+                    rss_pages[int(entry)] = int(f.read().split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(int(fields[1]), []).append(int(entry))
+    except OSError:
+        return None
+
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss_pages.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+    def memory_mb(self) -> Optional[float]:
+        process = getattr(getattr(self.driver, "service", None), "process", None)
+        if process is None:
+            return None
+        return _process_tree_rss_mb(process.pid)
+
+
+class DriverPool:
+    """
+    Bounded pool of warm WebDriver instances shared by scraper threads.
+
+    lease() hands out an idle driver (starting one if the pool is not full,
+    otherwise waiting for one to come back). A driver is health-checked
+    before each lease and replaced when the browser stopped responding,
+    served max_uses leases or grew beyond max_memory_mb.
+    """
+
+    def __init__(self, factory: Callable, size: int = DRIVER_POOL_SIZE, max_uses: int = DRIVER_MAX_USES,
+                 max_memory_mb: int = DRIVER_MAX_MEMORY_MB):
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self._idle: "queue.LifoQueue[PooledDriver]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"started": 0, "leases": 0, "recycled": 0, "crashed": 0}
+
+    @contextmanager
+    def lease(self, timeout: float = LEASE_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No WebDriver available after {timeout}s")
+        pooled = None
+        try:
+            pooled = self._checkout()
+            try:
+                yield pooled.driver
+            except Exception:
+                # Scrape errors (timeouts, missing elements) leave the driver usable;
+                # only a browser that stopped responding is replaced
+                if not self._healthy(pooled):
+                    self._discard(pooled, "crashed")
+                    pooled = None
+                raise
+            pooled.uses += 1
+            if self._worn_out(pooled):
+                self._discard(pooled, "recycled")
+                pooled = None
+        finally:
+            if pooled is not None:
+                if self._closed:
+                    self._discard(pooled)
+                else:
+                    self._idle.put(pooled)
+            self._slots.release()
+
+    def _checkout(self) -> PooledDriver:
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._healthy(pooled):
+                self._count("leases")
+                return pooled
+            self._discard(pooled, "crashed")
+        pooled = PooledDriver(self.factory())
+        self._count("started")
+        self._count("leases")
+        return pooled
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _healthy(self, pooled: PooledDriver) -> bool:
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _worn_out(self, pooled: PooledDriver) -> bool:
+        if pooled.uses >= self.max_uses:
+            return True
+        memory = pooled.memory_mb()
+        if memory is not None and memory > self.max_memory_mb:
+            logger.info(f"Recycling WebDriver using {memory:.0f} MB")
+            return True
+        return False
+
+    def _discard(self, pooled: PooledDriver, reason: Optional[str] = None):
+        if reason:
+            self._count(reason)
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting WebDriver: {e}")
+
+    def close(self):
+        """
+        Quit every idle driver. Drivers still leased are quit when returned.
+        """
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
+        logger.info(f"WebDriver pool closed: {self.stats}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,200 @@
+import csv
+import enum
+import io
+import logging
+import os
+from typing import AsyncIterator, List, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from sqlalchemy.sql import Select
+from starlette.concurrency import run_in_threadpool
+
+from database.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor and encoded per step; bounds the memory of one export
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "10000"))
+
+
+class ExportFormat(str, enum.Enum):
+    CSV = "csv"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+EXTENSIONS = {
+    ExportFormat.CSV: "csv",
+    ExportFormat.ARROW: "arrows",
+    ExportFormat.PARQUET: "parquet",
+}
+
+TRANSACTION_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("isin", pa.string()),
+    ("timestamp", pa.timestamp("us")),
+    ("price", pa.float64()),
+    ("quantity", pa.int64()),
+    ("source", pa.string()),
+])
+BAR_SCHEMA = pa.schema([
+    ("isin", pa.string()),
+    ("interval", pa.string()),
+    ("bucket_start", pa.timestamp("us")),
+    ("open", pa.float64()),
+    ("high", pa.float64()),
+    ("low", pa.float64()),
+    ("close", pa.float64()),
+    ("volume", pa.int64()),
+    ("trade_count", pa.int64()),
+])
+
+
+class _Sink(io.RawIOBase):
+    """
+    Write-only file that keeps what was written since the last drain(), so
+    Arrow writers can be flushed to the response batch by batch.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class _Encoder:
+    """
+    Incremental encoder: begin() returns the leading bytes (header/schema),
+    write() the bytes of one batch of rows and end() the trailing bytes.
+    """
+
+    def __init__(self, schema: pa.Schema):
+        self.schema = schema
+
+    def begin(self) -> bytes:
+        return b""
+
+    def write(self, rows: Sequence[Tuple]) -> bytes:
+        raise NotImplementedError
+
+    def end(self) -> bytes:
+        return b""
+
+    def record_batch(self, rows: Sequence[Tuple]) -> pa.RecordBatch:
+        columns = list(zip(*rows))
+        return pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+
+
+class _CSVEncoder(_Encoder):
+    def _encode(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(
+            [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+            for row in rows
+        )
+        return buffer.getvalue().encode()
+
+    def begin(self) -> bytes:
+        return self._encode([self.schema.names])
+
+    def write(self, rows) -> bytes:
+        return self._encode(rows)
+
+
+class _ArrowEncoder(_Encoder):
+    def __init__(self, schema):
+        super().__init__(schema)
+        self.sink = _Sink()
+        self.writer = ipc.new_stream(self.sink, schema)
+
+    def begin(self) -> bytes:
+        return self.sink.drain()
+
+    def write(self, rows) -> bytes:
+        self.writer.write_batch(self.record_batch(rows))
+        return self.sink.drain()
+
+    def end(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+class _ParquetEncoder(_Encoder):
+    """
+    One row group per batch; the footer (written by end()) indexes them all.
+    """
+
+    def __init__(self, schema):
+        super().__init__(schema)
+        self.sink = _Sink()
+        self.writer = pq.ParquetWriter(self.sink, schema, compression="zstd")
+
+    def begin(self) -> bytes:
+        return self.sink.drain()
+
+    def write(self, rows) -> bytes:
+        self.writer.write_batch(self.record_batch(rows))
+        return self.sink.drain()
+
+    def end(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+ENCODERS = {
+    ExportFormat.CSV: _CSVEncoder,
+    ExportFormat.ARROW: _ArrowEncoder,
+    ExportFormat.PARQUET: _ParquetEncoder,
+}
+
+
+async def stream_export(query: Select, schema: pa.Schema, fmt: ExportFormat,
+                        batch_rows: int = None) -> AsyncIterator[bytes]:
+    """
+    Stream the rows of query encoded as fmt. The query's columns must match
+    schema in order. Rows are read from a server-side cursor batch_rows at a
+    time and each batch is encoded (off the event loop) and sent before the
+    next one is fetched, so memory stays bounded whatever the size of the
+    export and the header goes out before the query has produced a row.
+    """
+    batch_rows = batch_rows or EXPORT_BATCH_ROWS
+    encoder = ENCODERS[fmt](schema)
+    yield encoder.begin()
+    total = 0
+    # The session is owned by the stream: it must outlive the endpoint that returned the response
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_rows))
+        async for rows in result.partitions(batch_rows):
+            chunk = await run_in_threadpool(encoder.write, rows)
+            total += len(rows)
+            if chunk:
+                yield chunk
+    yield encoder.end()
+    logger.info(f"Exported {total} rows as {fmt.value}")
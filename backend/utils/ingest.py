@@ -0,0 +1,249 @@
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+from database.bulk import batched, chunked, dialect_insert
+from database.models import Bond, Transaction
+from database.partitions import ensure_partitions
+from utils.bars import rebuild_bars_for_trades, update_bars_for_trades
+from utils.live_updates import publish_transactions
+from utils.market_stats import update_trade_totals
+
+logger = logging.getLogger(__name__)
+
+# Number of transaction rows written per database transaction
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+
+BOND_FIELDS = (
+    "isin", "name", "issuer", "exchange", "face_value", "coupon_rate",
+    "maturity_date", "yield_to_maturity", "last_price", "volume",
+)
+TRANSACTION_FIELDS = ("timestamp", "price", "quantity", "source")
+# Optional daily range reported by some sources; feeds the bars store, not the transactions table
+BAR_HINT_FIELDS = ("open", "high", "low")
+
+
+def dedupe_records(records: Iterable[Tuple[dict, dict]]) -> Tuple[Dict[str, dict], List[Tuple[str, dict]]]:
+    """
+    Collapse scraped (bond_data, txn_data) pairs into one bond per ISIN and one
+    transaction per (ISIN, timestamp, source), keeping the first occurrence of each.
+    Trades without a timestamp cannot be placed in a partition and are dropped.
+    """
+    bonds: Dict[str, dict] = {}
+    transactions: Dict[Tuple[str, Any], dict] = {}
+    for bond_data, txn_data in records:
+        isin = bond_data["isin"]
+        if isin not in bonds:
+            bonds[isin] = {field: bond_data.get(field) for field in BOND_FIELDS}
+        if txn_data.get("timestamp") is None:
+            continue
+        key = (isin, txn_data["timestamp"], txn_data.get("source") or "")
+        if key not in transactions:
+            txn = {field: txn_data.get(field) for field in TRANSACTION_FIELDS}
+            txn["source"] = key[2]
+            txn.update({field: txn_data[field] for field in BAR_HINT_FIELDS if txn_data.get(field) is not None})
+            transactions[key] = txn
+    return bonds, [(key[0], txn) for key, txn in transactions.items()]
+
+
+def _ensure_bonds(db: Session, bonds: List[dict]) -> int:
+    """
+    Insert bonds that do not exist yet. Existing rows are left untouched so that
+    names filled in by BSE are not overwritten by sparse NSE rows.
+    """
+    if not bonds:
+        return 0
+    stmt = dialect_insert(db, Bond)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Bond.isin]).returning(Bond.id)
+        return len(db.execute(stmt, bonds).all())
+
+    existing = set(db.scalars(select(Bond.isin).where(Bond.isin.in_([b["isin"] for b in bonds]))))
+    missing = [b for b in bonds if b["isin"] not in existing]
+    if missing:
+        db.execute(insert(Bond), missing)
+    return len(missing)
+
+
+def _bond_ids(db: Session, isins: Iterable[str]) -> Dict[str, int]:
+    rows = db.execute(select(Bond.isin, Bond.id).where(Bond.isin.in_(list(isins))))
+    return {isin: bond_id for isin, bond_id in rows}
+
+
+def _stored_transactions(db: Session, rows: List[dict]) -> Dict[Tuple[int, Any, str], Any]:
+    """
+    Fetch the stored trades matching the natural keys of a chunk, keyed by
+    (bond_id, timestamp, source), using one range-bounded query.
+    """
+    bond_ids = {row["bond_id"] for row in rows}
+    timestamps = [row["timestamp"] for row in rows if row["timestamp"] is not None]
+    if not timestamps:
+        return {}
+    query = select(
+        Transaction.id, Transaction.bond_id, Transaction.timestamp, Transaction.source,
+        Transaction.price, Transaction.quantity,
+    ).where(
+        Transaction.bond_id.in_(bond_ids),
+        Transaction.timestamp.between(min(timestamps), max(timestamps)),
+    )
+    return {(r.bond_id, r.timestamp, r.source): r for r in db.execute(query)}
+
+
+def _insert_transactions(db: Session, rows: List[dict]) -> List[dict]:
+    """
+    Insert a chunk of new transactions, skipping any stored meanwhile, and
+    return the rows that were actually inserted, with their new id where the
+    dialect can report it.
+    """
+    if not rows:
+        return []
+    values = [
+        {field: row[field] for field in TRANSACTION_FIELDS + ("bond_id",)}
+        for row in rows
+    ]
+    stmt = dialect_insert(db, Transaction)
+    if stmt is not None:
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=[Transaction.bond_id, Transaction.timestamp, Transaction.source]
+        ).returning(Transaction.id, Transaction.bond_id, Transaction.timestamp, Transaction.source)
+        inserted = {(r.bond_id, r.timestamp, r.source): r.id for r in db.execute(stmt, values)}
+    else:
+        db.execute(insert(Transaction), values)
+        inserted = {(v["bond_id"], v["timestamp"], v["source"]): None for v in values}
+    return [
+        dict(row, id=inserted[key])
+        for row in rows
+        if (key := (row["bond_id"], row["timestamp"], row["source"])) in inserted
+    ]
+
+
+def _update_transactions(db: Session, rows: List[dict]):
+    """
+    Write corrected price/quantity of stored trades. The timestamp is part of
+    the match so Postgres only touches the trade's own partition.
+    """
+    if not rows:
+        return
+    table = Transaction.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("_id"), table.c.timestamp == bindparam("_timestamp"))
+        .values(price=bindparam("price"), quantity=bindparam("quantity"))
+    )
+    db.execute(stmt, [
+        {"_id": row["id"], "_timestamp": row["timestamp"], "price": row["price"], "quantity": row["quantity"]}
+        for row in rows
+    ])
+
+
+def _write_transactions(db: Session, rows: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """
+    Diff a chunk against the stored trades and write only what differs: new
+    trades are inserted and trades whose price or quantity changed (late
+    corrections) are updated; identical ones cause no write at all.
+    Returns (inserted rows, changed rows).
+    """
+    if not rows:
+        return [], []
+    stored = _stored_transactions(db, rows)
+    new, changed = [], []
+    for row in rows:
+        current = stored.get((row["bond_id"], row["timestamp"], row["source"]))
+        if current is None:
+            new.append(row)
+        elif (current.price, current.quantity) != (row["price"], row["quantity"]):
+            changed.append(dict(row, id=current.id, previous_price=current.price, previous_quantity=current.quantity))
+    _update_transactions(db, changed)
+    return _insert_transactions(db, new), changed
+
+
+def bulk_ingest(db: Session, records: Iterable[Tuple[dict, dict]], chunk_size: int = None) -> Dict[str, Any]:
+    """
+    Ingest scraped (bond_data, txn_data) pairs in bulk.
+
+    Records are consumed in chunks of chunk_size, so a generator (e.g. a
+    streaming parser) is never held in memory as a whole. Each chunk is
+    deduplicated, inserts its missing bonds, and is diffed against the stored
+    trades: only new trades are inserted and only trades whose price or
+    quantity changed are updated. New trades are folded into the OHLCV bars
+    and the trade totals, bars of corrected trades are rebuilt and their
+    difference applied to the totals, and the chunk is committed as a
+    single database transaction, so a failing chunk only rolls back its own
+    rows. Committed trades are then published to the API workers as live updates.
+    """
+    chunk_size = chunk_size or INGEST_CHUNK_SIZE
+    stats = {"bonds": 0, "transactions": 0, "changed": 0, "duplicates": 0, "isins": set()}
+    bond_ids: Dict[str, int] = {}
+
+    for batch in batched(records, chunk_size):
+        bonds, transactions = dedupe_records(batch)
+        stats["isins"].update(bonds)
+
+        # Monthly partitions (Postgres) must exist before any row of the month is inserted
+        ensure_partitions(db, (txn["timestamp"] for _, txn in transactions))
+
+        try:
+            missing = [isin for isin in sorted(bonds) if isin not in bond_ids]
+            if missing:
+                stats["bonds"] += _ensure_bonds(db, [bonds[isin] for isin in missing])
+                bond_ids.update(_bond_ids(db, missing))
+
+            rows = [dict(txn, bond_id=bond_ids[isin], isin=isin) for isin, txn in transactions]
+            inserted, changed = _write_transactions(db, rows)
+            update_bars_for_trades(db, inserted)
+            rebuild_bars_for_trades(db, changed)
+            update_trade_totals(db, inserted, changed)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        publish_transactions(inserted)
+        unchanged = len(rows) - len(inserted) - len(changed)
+        stats["transactions"] += len(inserted)
+        stats["changed"] += len(changed)
+        stats["duplicates"] += unchanged
+        logger.info(
+            f"Ingested chunk: {len(inserted)} new transactions, {len(changed)} changed, {unchanged} duplicates"
+        )
+
+    stats["isins"] = sorted(stats["isins"])
+    logger.info(
+        f"Bulk ingest finished: {stats['bonds']} new bonds, {stats['transactions']} new transactions, "
+        f"{stats['changed']} changed, {stats['duplicates']} duplicates skipped"
+    )
+    return stats
+
+
+def refresh_bond_stats(db: Session, isins: Iterable[str], chunk_size: int = None):
+    """
+    Set last_price and volume of the given bonds from their latest transaction
+    with one UPDATE per chunk of ISINs.
+    """
+    chunk_size = chunk_size or INGEST_CHUNK_SIZE
+
+    def latest(column):
+        return (
+            select(column)
+            .where(Transaction.bond_id == Bond.id)
+            .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    has_transactions = select(Transaction.id).where(Transaction.bond_id == Bond.id).exists()
+
+    for chunk in chunked(sorted(set(isins)), chunk_size):
+        try:
+            db.execute(
+                update(Bond)
+                .where(Bond.isin.in_(chunk), has_transactions)
+                .values(last_price=latest(Transaction.price), volume=latest(Transaction.quantity))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
@@ -0,0 +1,278 @@
+"""
+Live updates across API workers.
+
+The ingest path (Celery) appends every newly stored transaction and every
+refreshed bond to the LIVE_STREAM Redis stream. Each API worker runs one
+LiveUpdateSubscriber that reads the stream and relays the messages to the
+WebSockets connected to that worker, so updates reach every client whichever
+worker it landed on. Entries carry the message in its WebSocket form
+({"type", "data"} JSON) next to its type and ISIN, so workers route them to
+the clients following that ISIN.
+
+The stream entry id is the message's sequence number ("seq"), the same on
+every worker. Each worker keeps the latest messages in a ReplayBuffer, loaded
+from the stream on start, so a reconnecting client that sends the last seq it
+saw is sent only what it missed.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.bulk import chunked
+from database.models import Bond
+from utils.cache import REDIS_URL
+from utils.serialization import BOND_PAYLOAD_COLUMNS, TRANSACTION_FIELDS, bond_payload, dumps, dumps_text
+
+logger = logging.getLogger(__name__)
+
+LIVE_STREAM = "bond_dashboard:live"
+# Entries kept in the Redis stream (trimmed approximately on every append)
+LIVE_STREAM_MAXLEN = int(os.getenv("LIVE_STREAM_MAXLEN", "100000"))
+# Messages kept in memory by each API worker for resuming clients
+REPLAY_BUFFER_SIZE = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "10000"))
+PUBLISH_BATCH_SIZE = 1000
+STREAM_READ_COUNT = 1000
+STREAM_BLOCK_MS = 5000
+RECONNECT_DELAY_SECONDS = 1.0
+MAX_RECONNECT_DELAY_SECONDS = 30.0
+
+_publisher = None
+
+
+def seq_key(seq: str) -> Tuple[int, int]:
+    """
+    Sort key of a sequence number (a Redis stream id, "<millis>-<n>").
+    Raises ValueError for anything else.
+    """
+    millis, _, n = seq.partition("-")
+    return int(millis), int(n or 0)
+
+
+def _get_publisher(redis_url: Optional[str]):
+    global _publisher
+    if _publisher is None:
+        import redis
+
+        _publisher = redis.Redis.from_url(redis_url)
+    return _publisher
+
+
+def publish_messages(messages: Iterable[Dict[str, Any]], redis_url: Optional[str] = REDIS_URL) -> int:
+    """
+    Append WebSocket messages to the live stream read by every API worker, pipelined in batches.
+    Live updates are best effort: failures are logged, never raised into the ingest.
+    """
+    if not redis_url:
+        return 0
+    published = 0
+    try:
+        client = _get_publisher(redis_url)
+        for batch in chunked(list(messages), PUBLISH_BATCH_SIZE):
+            pipe = client.pipeline(transaction=False)
+            for message in batch:
+                pipe.xadd(LIVE_STREAM, {
+                    "type": message["type"],
+                    "isin": message["data"].get("isin") or "",
+                    "payload": dumps(message),
+                }, maxlen=LIVE_STREAM_MAXLEN, approximate=True)
+            pipe.execute()
+            published += len(batch)
+    except Exception as e:
+        logger.warning(f"Could not publish live updates: {e}")
+    return published
+
+
+def publish_transactions(rows: List[Dict[str, Any]], redis_url: Optional[str] = REDIS_URL) -> int:
+    """
+    Announce newly inserted transactions (rows as returned by the bulk insert).
+    """
+    return publish_messages((
+        {"type": "new_transaction", "data": {field: row.get(field) for field in TRANSACTION_FIELDS}}
+        for row in rows
+    ), redis_url)
+
+
+def publish_bond_updates(db: Session, isins: Iterable[str], redis_url: Optional[str] = REDIS_URL) -> int:
+    """
+    Announce the current state of the given bonds, read back after stats and analytics were refreshed.
+    """
+    if not redis_url:
+        return 0
+    published = 0
+    for chunk in chunked(sorted(set(isins)), PUBLISH_BATCH_SIZE):
+        rows = db.execute(select(*BOND_PAYLOAD_COLUMNS).where(Bond.isin.in_(chunk))).all()
+        published += publish_messages((
+            {"type": "bond_update", "data": bond_payload(row)}
+            for row in rows
+        ), redis_url)
+    return published
+
+
+class ReplayEntry(NamedTuple):
+    key: Tuple[int, int]
+    seq: str
+    isin: Optional[str]
+    message: Dict[str, Any]
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of the latest live messages, in sequence order.
+    """
+
+    def __init__(self, size: int = REPLAY_BUFFER_SIZE):
+        self._entries = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._entries.maxlen
+
+    @property
+    def first_seq(self) -> Optional[str]:
+        return self._entries[0].seq if self._entries else None
+
+    @property
+    def last_seq(self) -> Optional[str]:
+        return self._entries[-1].seq if self._entries else None
+
+    def append(self, seq: str, isin: Optional[str], message: Dict[str, Any]):
+        self._entries.append(ReplayEntry(seq_key(seq), seq, isin, message))
+
+    def since(self, seq: str) -> Optional[List[ReplayEntry]]:
+        """
+        Entries after seq, or None when they are not all buffered: seq is
+        older than the buffer, unknown (newer than anything seen) or invalid.
+        """
+        try:
+            key = seq_key(seq)
+        except ValueError:
+            return None
+        if not self._entries or key < self._entries[0].key or key > self._entries[-1].key:
+            return None
+        missed = []
+        for entry in reversed(self._entries):
+            if entry.key <= key:
+                break
+            missed.append(entry)
+        missed.reverse()
+        return missed
+
+    def latest_transactions(self, limit: int, partial: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """
+        Data of the latest limit transactions, newest first, or None when fewer
+        are buffered (unless partial, which takes whatever the buffer holds).
+        """
+        latest = []
+        for entry in reversed(self._entries):
+            if entry.message["type"] == "new_transaction":
+                latest.append(entry.message["data"])
+                if len(latest) == limit:
+                    return latest
+        return latest if partial else None
+
+
+class LiveUpdateSubscriber:
+    """
+    Per-worker Redis stream reader relaying live updates to the local
+    WebSocketManager and keeping them in a ReplayBuffer. Reconnects with
+    exponential backoff if Redis goes away, resuming after the last entry read.
+    """
+
+    def __init__(self, manager, redis_url: Optional[str] = REDIS_URL, buffer_size: int = REPLAY_BUFFER_SIZE):
+        self.manager = manager
+        self.redis_url = redis_url
+        self.buffer = ReplayBuffer(buffer_size)
+        # Called with each relayed message, e.g. to keep in-memory state current
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.received = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.redis_url and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        import redis.asyncio as aioredis
+
+        delay = RECONNECT_DELAY_SECONDS
+        while True:
+            client = aioredis.Redis.from_url(self.redis_url, decode_responses=True)
+            try:
+                if not len(self.buffer):
+                    await self._load_buffer(client)
+                # Entries appended while disconnected are still relayed, from where reading stopped
+                last_id = self.buffer.last_seq or "0-0"
+                logger.info(f"Reading live updates from {LIVE_STREAM} after {last_id}")
+                delay = RECONNECT_DELAY_SECONDS
+                while True:
+                    response = await client.xread(
+                        {LIVE_STREAM: last_id}, count=STREAM_READ_COUNT, block=STREAM_BLOCK_MS
+                    )
+                    for _, entries in response:
+                        for entry_id, fields in entries:
+                            last_id = entry_id
+                            await self._relay(entry_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Live update subscription lost: {e}; retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+            finally:
+                await client.aclose()
+
+    async def _load_buffer(self, client):
+        """
+        Fill the replay buffer with the latest stream entries, without relaying them.
+        """
+        entries = await client.xrevrange(LIVE_STREAM, count=self.buffer.size)
+        for entry_id, fields in reversed(entries):
+            self._remember(entry_id, fields)
+        logger.info(f"Loaded {len(entries)} live updates into the replay buffer")
+
+    def _remember(self, entry_id: str, fields: Dict[str, str]):
+        message = orjson.loads(fields["payload"])
+        message["seq"] = entry_id
+        isin = fields.get("isin") or None
+        self.buffer.append(entry_id, isin, message)
+        return message, isin
+
+    async def _relay(self, entry_id: str, fields: Dict[str, str]):
+        self.received += 1
+        message, isin = self._remember(entry_id, fields)
+        for listener in self.listeners:
+            try:
+                listener(message)
+            except Exception as e:
+                logger.warning(f"Live update listener failed on {entry_id}: {e}")
+        # Only the newest state of a bond matters to a client that fell behind
+        coalesce_key = (message["type"], isin) if message["type"] == "bond_update" else None
+        await self.manager.broadcast_message(
+            dumps_text(message), isin=isin, coalesce_key=coalesce_key, decoded=message
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "buffered": len(self.buffer),
+            "first_seq": self.buffer.first_seq,
+            "last_seq": self.buffer.last_seq,
+        }
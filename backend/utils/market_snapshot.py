@@ -0,0 +1,351 @@
+"""
+Per-worker columnar snapshot of the bond universe, serving /bonds/ from
+memory with vectorized filters and sorts instead of a query per request.
+
+Every bond column is held as a NumPy array (floats with NaN and datetime64
+with NaT for NULL, for filtering and sorting) next to the original values
+(for output), with an ISIN -> row index. bond_update live messages are applied
+to their row in place; an unknown ISIN, and every SNAPSHOT_RELOAD_SECONDS,
+triggers a reload that builds a new snapshot and swaps the reference, so a
+request always reads one consistent snapshot and never waits for a reload.
+
+Rows are ordered like the SQL path (NULLs last, id as tie-break) with the
+same keyset cursors. Strings compare by code point, which is the SQLite
+ordering; Postgres collations may order mixed-case names differently.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from database.models import Bond, Exchange
+from database.session import AsyncSessionLocal
+from utils.pagination import encode_cursor
+from utils.serialization import BOND_FIELDS, BOND_PAYLOAD_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ENABLED = os.getenv("BOND_SNAPSHOT_ENABLED", "true").lower() in ("1", "true", "yes")
+SNAPSHOT_RELOAD_SECONDS = float(os.getenv("BOND_SNAPSHOT_RELOAD_SECONDS", "300"))
+
+FLOAT_FIELDS = (
+    "face_value", "coupon_rate", "yield_to_maturity", "last_price", "volume",
+    "macaulay_duration", "modified_duration", "convexity", "accrued_interest",
+)
+DATETIME_FIELDS = ("maturity_date",)
+
+
+def _as_datetime64(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value is None:
+        return np.datetime64("NaT", "us")
+    return np.datetime64(value.replace(tzinfo=None), "us")
+
+
+def _as_value(field: str, value):
+    """
+    Convert a field of a bond_update message (decoded JSON) to the type the database returns.
+    """
+    if value is None:
+        return None
+    if field in DATETIME_FIELDS and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if field == "exchange" and not isinstance(value, Exchange):
+        return Exchange(value)
+    return value
+
+
+def _sort_key(field: str, value):
+    if field in FLOAT_FIELDS:
+        return np.nan if value is None else value
+    if field in DATETIME_FIELDS:
+        return _as_datetime64(value)
+    if value is None:
+        return ""
+    return value.value if isinstance(value, Exchange) else value
+
+
+class BondSnapshot:
+    """
+    Columnar copy of the bonds table. Only MarketSnapshot mutates it, and
+    only on the event loop, so a request never sees a half-applied update.
+    """
+
+    def __init__(self, rows: Sequence[Tuple]):
+        # Rows are (id, *BOND_FIELDS)
+        columns = list(zip(*rows)) if rows else [()] * (len(BOND_FIELDS) + 1)
+        self.ids = np.array(columns[0], dtype=np.int64)
+        self.values: Dict[str, np.ndarray] = {}
+        for field, column in zip(BOND_FIELDS, columns[1:]):
+            values = np.empty(len(column), dtype=object)
+            values[:] = column
+            self.values[field] = values
+        self.row_of = {isin: row for row, isin in enumerate(self.values["isin"])}
+        self._keys: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # Per field: (rows in ascending order, number of non-NULL rows leading it)
+        self._ascending: Dict[str, Tuple[np.ndarray, int]] = {}
+        self._descending: Dict[str, np.ndarray] = {}
+        self._categories: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def keys(self, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (comparable values, NULL mask) of a field, built on first use.
+        """
+        if field == "id":
+            return self.ids, np.zeros(len(self.ids), dtype=bool)
+        if field not in self._keys:
+            values = self.values[field]
+            dtype = np.float64 if field in FLOAT_FIELDS else "datetime64[us]" if field in DATETIME_FIELDS else str
+            keys = np.array([_sort_key(field, value) for value in values], dtype=dtype)
+            null = np.array([value is None for value in values], dtype=bool)
+            self._keys[field] = (keys, null)
+        return self._keys[field]
+
+    def categories(self, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (distinct values, row -> distinct value position) of a string field, built on first use.
+        Equality and substring filters test each distinct value once instead of every row.
+        """
+        if field not in self._categories:
+            keys, _ = self.keys(field)
+            self._categories[field] = np.unique(keys, return_inverse=True)
+        return self._categories[field]
+
+    def order(self, field: str, descending: bool) -> np.ndarray:
+        """
+        Row positions in ORDER BY field [DESC] NULLS LAST, id [DESC] order, built on first use.
+        """
+        if field not in self._ascending:
+            keys, null = self.keys(field)
+            present = np.flatnonzero(~null)
+            present = present[np.lexsort((self.ids[present], keys[present]))]
+            missing = np.flatnonzero(null)
+            missing = missing[np.argsort(self.ids[missing], kind="stable")]
+            self._ascending[field] = (np.concatenate([present, missing]), len(present))
+        ascending, present = self._ascending[field]
+        if not descending:
+            return ascending
+        if field not in self._descending:
+            # Both the non-NULL rows and the trailing NULLs reversed, so NULLs stay last
+            self._descending[field] = np.concatenate([ascending[:present][::-1], ascending[present:][::-1]])
+        return self._descending[field]
+
+    def _reorder(self, field: str, row: int, was_null: bool):
+        """
+        Move a row whose key changed to its new place in the field's sort order,
+        a binary search and one array copy instead of a full re-sort.
+        """
+        if field not in self._ascending:
+            return
+        ascending, present = self._ascending[field]
+        keys, null = self._keys[field]
+        ids = self.ids
+        ascending = np.delete(ascending, np.flatnonzero(ascending == row)[0])
+        if not was_null:
+            present -= 1
+        if null[row]:
+            position = present + np.searchsorted(ids[ascending[present:]], ids[row])
+        else:
+            ranked = keys[ascending[:present]]
+            low = np.searchsorted(ranked, keys[row], "left")
+            high = np.searchsorted(ranked, keys[row], "right")
+            position = low + np.searchsorted(ids[ascending[low:high]], ids[row])
+            present += 1
+        self._ascending[field] = (np.insert(ascending, position, row), present)
+        self._descending.pop(field, None)
+
+    def _update_key(self, field: str, row: int, value):
+        self._categories.pop(field, None)
+        if field not in self._keys:
+            return
+        keys, null = self._keys[field]
+        key = _sort_key(field, value)
+        if keys.dtype.kind == "U" and len(key) > keys.dtype.itemsize // 4:
+            # Longer than the string array holds: rebuilt on next use
+            del self._keys[field]
+            self._ascending.pop(field, None)
+            self._descending.pop(field, None)
+            return
+        was_null = bool(null[row])
+        keys[row] = key
+        null[row] = value is None
+        self._reorder(field, row, was_null)
+
+    def update(self, payload: Dict[str, Any]) -> bool:
+        """
+        Apply a bond_update payload to its row in place; False if the ISIN is not in the snapshot.
+        """
+        row = self.row_of.get(payload.get("isin"))
+        if row is None:
+            return False
+        for field, value in payload.items():
+            if field not in self.values or field == "isin":
+                continue
+            value = _as_value(field, value)
+            if self.values[field][row] == value:
+                continue
+            self.values[field][row] = value
+            self._update_key(field, row, value)
+        return True
+
+    def _equals_mask(self, field: str, value: str) -> np.ndarray:
+        labels, codes = self.categories(field)
+        return np.isin(labels, [value])[codes]
+
+    def _contains_mask(self, field: str, text: str) -> np.ndarray:
+        """
+        Rows whose field contains text, ignoring case (ILIKE '%text%').
+        """
+        labels, codes = self.categories(field)
+        text = text.lower()
+        return np.array([text in label.lower() for label in labels], dtype=bool)[codes]
+
+    def _range_mask(self, field: str, low=None, high=None, high_inclusive=True) -> np.ndarray:
+        keys, null = self.keys(field)
+        mask = ~null
+        if field in DATETIME_FIELDS:
+            low = None if low is None else _as_datetime64(low)
+            high = None if high is None else _as_datetime64(high)
+        if low is not None:
+            mask &= keys >= low
+        if high is not None:
+            mask &= (keys <= high) if high_inclusive else (keys < high)
+        return mask
+
+    def _after_cursor(self, field: str, value: Any, last_id: int, descending: bool) -> np.ndarray:
+        """
+        Rows strictly after (value, last_id), as utils.pagination.keyset_filter.
+        """
+        keys, null = self.keys(field)
+        ids = self.ids
+        if value is None:
+            return null & ((ids < last_id) if descending else (ids > last_id))
+        if field in DATETIME_FIELDS:
+            value = _as_datetime64(value)
+        elif isinstance(value, Exchange):
+            value = value.value
+        beyond = (keys < value) if descending else (keys > value)
+        tie = (keys == value) & ((ids < last_id) if descending else (ids > last_id))
+        return (~null & (beyond | tie)) | null
+
+    def query(self, names: List[str], sort: str, descending: bool, limit: int,
+              cursor: Optional[Tuple[Any, int]] = None, isins: Optional[List[str]] = None,
+              exchange: Optional[Exchange] = None, issuer: Optional[str] = None,
+              maturity_from: Optional[datetime] = None, maturity_to: Optional[datetime] = None,
+              min_price: Optional[float] = None, max_price: Optional[float] = None,
+              min_volume: Optional[int] = None, max_volume: Optional[int] = None):
+        """
+        The /bonds/ page for these filters: (rows as dicts of names, next cursor).
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if isins:
+            rows = [self.row_of[isin] for isin in isins if isin in self.row_of]
+            mask = np.zeros(len(self), dtype=bool)
+            mask[rows] = True
+        if exchange:
+            mask &= self._equals_mask("exchange", exchange.value)
+        if issuer:
+            mask &= self._contains_mask("issuer", issuer)
+        if maturity_from or maturity_to:
+            mask &= self._range_mask("maturity_date", maturity_from, maturity_to, high_inclusive=False)
+        if min_price is not None or max_price is not None:
+            mask &= self._range_mask("last_price", min_price, max_price)
+        if min_volume is not None or max_volume is not None:
+            mask &= self._range_mask("volume", min_volume, max_volume)
+        if cursor is not None:
+            mask &= self._after_cursor(sort, cursor[0], cursor[1], descending)
+
+        order = self.order(sort, descending)
+        rows = order[mask[order]][:limit + 1]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        columns = [self.values[name][rows].tolist() for name in names]
+        items = [dict(zip(names, values)) for values in zip(*columns)]
+        next_cursor = None
+        if has_more and len(rows):
+            last = rows[-1]
+            value = int(self.ids[last]) if sort == "id" else self.values[sort][last]
+            next_cursor = encode_cursor(value.value if isinstance(value, Exchange) else value, int(self.ids[last]))
+        return items, next_cursor
+
+
+class MarketSnapshot:
+    """
+    Holds the worker's current BondSnapshot and keeps it fresh.
+    """
+
+    def __init__(self, reload_interval: float = SNAPSHOT_RELOAD_SECONDS):
+        self.reload_interval = reload_interval
+        self.current: Optional[BondSnapshot] = None
+        self.reloads = 0
+        self.updates = 0
+        self.loaded_at: Optional[datetime] = None
+        self._reload_requested = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def reload(self):
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(Bond.id, *BOND_PAYLOAD_COLUMNS))).all()
+        snapshot = await run_in_threadpool(BondSnapshot, rows)
+        # A single reference swap: requests hold either the old or the new snapshot
+        self.current = snapshot
+        self.reloads += 1
+        self.loaded_at = datetime.now()
+        logger.info(f"Loaded bond snapshot with {len(snapshot)} bonds")
+
+    def apply_message(self, message: Dict[str, Any]):
+        """
+        Live update listener: fold bond_update messages into the snapshot.
+        """
+        if message.get("type") != "bond_update" or self.current is None:
+            return
+        if self.current.update(message["data"]):
+            self.updates += 1
+        else:
+            self._reload_requested.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Requests fall back to the database until a reload succeeds
+                logger.warning(f"Could not load bond snapshot: {e}")
+            try:
+                await asyncio.wait_for(self._reload_requested.wait(), self.reload_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._reload_requested.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bonds": len(self.current) if self.current is not None else None,
+            "reloads": self.reloads,
+            "updates": self.updates,
+            "loaded_at": self.loaded_at,
+        }
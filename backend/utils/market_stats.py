@@ -0,0 +1,288 @@
+"""
+Market statistics served by /stats/, read from aggregates the ingest keeps
+up to date instead of from the transaction history:
+
+- trade_totals / daily_trade_totals: trade count, volume and value per
+  exchange (all time and per day), folded in by update_trade_totals() in the
+  same database transaction as the trades;
+- the 1d OHLCV bars of the latest session, for advancers/decliners and the
+  most active ISINs;
+- the bonds table, for counts and the yield curve by maturity bucket.
+
+Each read touches at most one row per bond, however long the history is.
+Totals for history stored before the aggregates existed are rebuilt with:
+
+    python -m utils.market_stats
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session, aliased
+
+from database.bulk import dialect_insert
+from database.models import Bond, DailyTradeTotals, Exchange, OHLCVBar, TradeTotals, Transaction
+from utils.bars import BACKFILL_BATCH_SIZE, bucket_start
+
+logger = logging.getLogger(__name__)
+
+MOST_ACTIVE_LIMIT = 10
+# Yield curve buckets by years to maturity: (label, lower bound, upper bound)
+MATURITY_BUCKETS = (
+    ("0-1y", 0, 1),
+    ("1-3y", 1, 3),
+    ("3-5y", 3, 5),
+    ("5-10y", 5, 10),
+    ("10y+", 10, None),
+)
+
+
+def _fold_trades(inserted: List[Dict[str, Any]], changed: List[Dict[str, Any]]) -> Dict[Tuple[datetime, str], list]:
+    """
+    Sum trades into [trade_count, volume, value, last_trade_at] per (day, source).
+    Corrected trades (carrying previous_price/previous_quantity) add the difference only.
+    """
+    totals = defaultdict(lambda: [0, 0, 0.0, None])
+    for trade in inserted:
+        entry = totals[(bucket_start(trade["timestamp"], "1d"), trade["source"])]
+        quantity = trade["quantity"] or 0
+        entry[0] += 1
+        entry[1] += quantity
+        entry[2] += (trade["price"] or 0) * quantity
+        entry[3] = max(entry[3] or trade["timestamp"], trade["timestamp"])
+    for trade in changed:
+        entry = totals[(bucket_start(trade["timestamp"], "1d"), trade["source"])]
+        quantity, previous = trade["quantity"] or 0, trade["previous_quantity"] or 0
+        entry[1] += quantity - previous
+        entry[2] += (trade["price"] or 0) * quantity - (trade["previous_price"] or 0) * previous
+    return totals
+
+
+def _merge_totals(db: Session, daily: Dict[Tuple[datetime, str], list]):
+    """
+    Add per-day totals to the stored daily and per-exchange rows with one upsert each,
+    so concurrent ingests (e.g. backfill units) never overwrite each other's counts.
+    """
+    per_source = defaultdict(lambda: [0, 0, 0.0, None])
+    for (_, source), (count, volume, value, last_trade_at) in daily.items():
+        entry = per_source[source]
+        entry[0] += count
+        entry[1] += volume
+        entry[2] += value
+        if last_trade_at is not None:
+            entry[3] = max(entry[3] or last_trade_at, last_trade_at)
+
+    stored = DailyTradeTotals.__table__.c
+    stmt = dialect_insert(db, DailyTradeTotals)
+    new = stmt.excluded
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DailyTradeTotals.trade_date, DailyTradeTotals.source],
+            set_={
+                "trade_count": stored.trade_count + new.trade_count,
+                "volume": stored.volume + new.volume,
+                "value": stored.value + new.value,
+            },
+        ),
+        [
+            {"trade_date": day, "source": source, "trade_count": count, "volume": volume, "value": value}
+            for (day, source), (count, volume, value, _) in daily.items()
+        ],
+    )
+
+    stored = TradeTotals.__table__.c
+    stmt = dialect_insert(db, TradeTotals)
+    new = stmt.excluded
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[TradeTotals.source],
+            set_={
+                "trade_count": stored.trade_count + new.trade_count,
+                "volume": stored.volume + new.volume,
+                "value": stored.value + new.value,
+                "last_trade_at": case(
+                    (stored.last_trade_at.is_(None), new.last_trade_at),
+                    (new.last_trade_at > stored.last_trade_at, new.last_trade_at),
+                    else_=stored.last_trade_at,
+                ),
+            },
+        ),
+        [
+            {"source": source, "trade_count": count, "volume": volume, "value": value, "last_trade_at": last}
+            for source, (count, volume, value, last) in per_source.items()
+        ],
+    )
+
+
+def update_trade_totals(db: Session, inserted: List[Dict[str, Any]], changed: List[Dict[str, Any]]) -> int:
+    """
+    Fold newly inserted and corrected trades into the trade totals.
+    Call inside the transaction that wrote the trades so both commit together.
+    """
+    if not inserted and not changed:
+        return 0
+    daily = _fold_trades(inserted, changed)
+    _merge_totals(db, daily)
+    return len(daily)
+
+
+def rebuild_trade_totals(db: Session) -> int:
+    """
+    Recompute all trade totals from the stored trades, streaming them in
+    batches. The caller commits.
+    """
+    db.execute(delete(DailyTradeTotals))
+    db.execute(delete(TradeTotals))
+    query = select(Transaction.timestamp, Transaction.source, Transaction.price, Transaction.quantity)
+    rows = db.execute(query.execution_options(yield_per=BACKFILL_BATCH_SIZE)).mappings()
+    daily = _fold_trades(rows, [])
+    if daily:
+        _merge_totals(db, daily)
+    return len(daily)
+
+
+def _latest_session(db: Session) -> Optional[datetime]:
+    return db.scalar(select(func.max(DailyTradeTotals.trade_date)))
+
+
+def _session_movers(db: Session, session: datetime) -> Dict[str, Any]:
+    """
+    Advancers/decliners and most active ISINs of a session, from its 1d bars
+    compared with each bond's previous daily bar.
+    """
+    previous = aliased(OHLCVBar)
+    previous_close = (
+        select(previous.close)
+        .where(
+            previous.bond_id == OHLCVBar.bond_id,
+            previous.interval == "1d",
+            previous.bucket_start < session,
+        )
+        .order_by(previous.bucket_start.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(
+            Bond.isin, Bond.name, OHLCVBar.close, OHLCVBar.volume, OHLCVBar.trade_count,
+            previous_close.label("previous_close"),
+        )
+        .join(Bond, OHLCVBar.bond_id == Bond.id)
+        .where(OHLCVBar.interval == "1d", OHLCVBar.bucket_start == session)
+    ).all()
+
+    breadth = {"advancers": 0, "decliners": 0, "unchanged": 0, "new": 0}
+    for row in rows:
+        if row.previous_close is None or row.close is None:
+            breadth["new"] += 1
+        elif row.close > row.previous_close:
+            breadth["advancers"] += 1
+        elif row.close < row.previous_close:
+            breadth["decliners"] += 1
+        else:
+            breadth["unchanged"] += 1
+
+    most_active = sorted(rows, key=lambda row: row.volume or 0, reverse=True)[:MOST_ACTIVE_LIMIT]
+    return {
+        **breadth,
+        "most_active": [
+            {
+                "isin": row.isin,
+                "name": row.name,
+                "volume": row.volume,
+                "trade_count": row.trade_count,
+                "close": row.close,
+                "change_pct": (
+                    (row.close - row.previous_close) / row.previous_close * 100
+                    if row.previous_close and row.close is not None else None
+                ),
+            }
+            for row in most_active
+        ],
+    }
+
+
+def _yield_curve(db: Session, now: datetime) -> List[Dict[str, Any]]:
+    """
+    Bond count and average yield per maturity bucket, over bonds not yet matured.
+    """
+    year = timedelta(days=365.25)
+    bucket = case(
+        *[
+            (Bond.maturity_date < now + upper * year, label)
+            for label, _, upper in MATURITY_BUCKETS if upper is not None
+        ],
+        else_=MATURITY_BUCKETS[-1][0],
+    )
+    rows = db.execute(
+        select(bucket.label("bucket"), func.count(Bond.id), func.avg(Bond.yield_to_maturity))
+        .where(Bond.maturity_date >= now)
+        .group_by(bucket)
+    ).all()
+    found = {label: (count, average) for label, count, average in rows}
+    return [
+        {
+            "bucket": label,
+            "min_years": lower,
+            "max_years": upper,
+            "bonds": found.get(label, (0, None))[0],
+            "avg_yield": found.get(label, (0, None))[1],
+        }
+        for label, lower, upper in MATURITY_BUCKETS
+    ]
+
+
+def market_stats(db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+    now = now or datetime.now()
+    bonds_by_source = {exchange.value: 0 for exchange in Exchange}
+    for exchange, count in db.execute(select(Bond.exchange, func.count(Bond.id)).group_by(Bond.exchange)):
+        if exchange is not None:
+            bonds_by_source[exchange.value] = count
+
+    totals = db.execute(select(TradeTotals)).scalars().all()
+    trades_by_source = {exchange.value: 0 for exchange in Exchange}
+    trades_by_source.update({row.source or "unknown": row.trade_count for row in totals})
+
+    session = _latest_session(db)
+    session_stats = None
+    if session is not None:
+        daily = db.execute(select(DailyTradeTotals).where(DailyTradeTotals.trade_date == session)).scalars().all()
+        session_stats = {
+            "date": session,
+            "trade_count": sum(row.trade_count for row in daily),
+            "volume": sum(row.volume for row in daily),
+            "value": sum(row.value for row in daily),
+            "by_source": {row.source or "unknown": row.volume for row in daily},
+            **_session_movers(db, session),
+        }
+
+    return {
+        "latest_update": max((row.last_trade_at for row in totals if row.last_trade_at), default=None),
+        "bonds": {
+            "total": db.scalar(select(func.count(Bond.id))),
+            "by_source": bonds_by_source,
+        },
+        "transactions": {
+            "total": sum(row.trade_count for row in totals),
+            "volume": sum(row.volume for row in totals),
+            "value": sum(row.value for row in totals),
+            "by_source": trades_by_source,
+        },
+        "session": session_stats,
+        "yield_curve": _yield_curve(db, now),
+    }
+
+
+if __name__ == "__main__":
+    from database.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        count = rebuild_trade_totals(db)
+        db.commit()
+        logger.info(f"Rebuilt trade totals for {count} exchange days from stored transactions")
+    finally:
+        db.close()
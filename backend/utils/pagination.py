@@ -0,0 +1,86 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(value: Any, last_id: int) -> str:
+    """
+    Encode the (sort value, id) pair of the last row on a page into an opaque cursor.
+    """
+    if isinstance(value, datetime):
+        payload = {"v": value.isoformat(), "t": "dt", "id": last_id}
+    else:
+        payload = {"v": value, "id": last_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """
+    Decode a cursor produced by encode_cursor back into (sort value, id).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = payload["v"]
+        if payload.get("t") == "dt" and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(column, id_column, value: Any, last_id: int, descending: bool):
+    """
+    Build the WHERE clause selecting rows strictly after (value, last_id) in an
+    ORDER BY column [DESC] NULLS LAST, id [DESC] ordering.
+    """
+    if value is None:
+        # Already inside the trailing NULL block: only the id tie-break remains
+        return and_(column.is_(None), id_column < last_id if descending else id_column > last_id)
+
+    if descending:
+        return or_(
+            column < value,
+            and_(column == value, id_column < last_id),
+            column.is_(None),
+        )
+    return or_(
+        column > value,
+        and_(column == value, id_column > last_id),
+        column.is_(None),
+    )
+
+
+def parse_sort(sort: str, allowed: Dict[str, Any]) -> Tuple[str, bool]:
+    """
+    Parse a sort parameter like "timestamp" or "-timestamp" into (field, descending).
+    """
+    descending = sort.startswith("-")
+    name = sort.lstrip("-+")
+    if name not in allowed:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot sort by '{name}'. Allowed: {', '.join(sorted(allowed))}"
+        )
+    return name, descending
+
+
+def parse_fields(fields: Optional[str], allowed: Dict[str, Any]) -> List[str]:
+    """
+    Parse a comma separated fields= projection, defaulting to every allowed field.
+    """
+    if not fields:
+        return list(allowed)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return names
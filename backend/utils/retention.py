@@ -0,0 +1,109 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from database.models import OHLCVBar, Transaction
+from database.partitions import (
+    add_months, month_start, is_partitioned, list_partitions, drop_partition
+)
+from utils.bars import backfill_bars
+
+logger = logging.getLogger(__name__)
+
+# Months of raw trades kept, including the current one; older months survive only as OHLCV bars
+RETENTION_MONTHS = int(os.getenv("TRANSACTION_RETENTION_MONTHS", "12"))
+# Days of intraday bars kept, per interval; daily bars are kept forever
+BAR_RETENTION_DAYS = {
+    "1m": int(os.getenv("BAR_RETENTION_DAYS_1M", "90")),
+    "1h": int(os.getenv("BAR_RETENTION_DAYS_1H", "730")),
+}
+
+
+def transaction_cutoff(now: Optional[datetime] = None, keep_months: Optional[int] = None) -> datetime:
+    """
+    The oldest moment whose raw trades are kept.
+    """
+    return add_months(month_start(now or datetime.now()), -((keep_months or RETENTION_MONTHS) - 1))
+
+
+def bar_cutoff(interval: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    The oldest bucket start of `interval` bars that is kept, or None when they are kept forever.
+    """
+    days = BAR_RETENTION_DAYS.get(interval)
+    if days is None:
+        return None
+    return (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+
+
+def prune_bars(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Delete intraday bars older than their interval's retention horizon, one
+    interval per transaction. Returns the bars deleted per interval.
+    """
+    deleted = {}
+    for interval in BAR_RETENTION_DAYS:
+        cutoff = bar_cutoff(interval, now)
+        try:
+            result = db.execute(
+                delete(OHLCVBar).where(OHLCVBar.interval == interval, OHLCVBar.bucket_start < cutoff)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        deleted[interval] = result.rowcount or 0
+        if deleted[interval]:
+            logger.info(f"Deleted {deleted[interval]} {interval} bars older than {cutoff:%Y-%m-%d}")
+    return deleted
+
+
+def apply_retention(db: Session, keep_months: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Make sure months older than the retention window have daily bars (trades
+    ingested before the bars store existed are rolled up here), then drop
+    their raw trades: whole partitions on Postgres, a range DELETE on SQLite.
+    Each month is handled in its own transaction. Intraday bars are then
+    pruned to their own horizons (BAR_RETENTION_DAYS).
+    """
+    cutoff = transaction_cutoff(now, keep_months)
+    stats = {"cutoff": cutoff.isoformat(), "months": 0, "bars": 0, "rows_deleted": 0}
+
+    if is_partitioned(db):
+        for name, start in list_partitions(db):
+            if add_months(start, 1) > cutoff:
+                break
+            try:
+                stats["bars"] += backfill_bars(db, start, add_months(start, 1), intervals=("1d",))
+                drop_partition(db, name)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            stats["months"] += 1
+            logger.info(f"Rolled up and dropped partition {name}")
+    else:
+        oldest = db.execute(select(func.min(Transaction.timestamp))).scalar()
+        start = month_start(oldest) if oldest else cutoff
+        while start < cutoff:
+            end = add_months(start, 1)
+            try:
+                stats["bars"] += backfill_bars(db, start, end, intervals=("1d",))
+                result = db.execute(
+                    delete(Transaction).where(Transaction.timestamp >= start, Transaction.timestamp < end)
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            stats["months"] += 1
+            stats["rows_deleted"] += result.rowcount or 0
+            logger.info(f"Rolled up and deleted transactions for {start:%Y-%m}")
+            start = end
+
+    stats["bars_deleted"] = prune_bars(db, now)
+    return stats
@@ -8,23 +8,33 @@ from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
-from sqlalchemy.orm import Session
-from database.models import Bond, Transaction, Exchange
+from database.models import Bond, Exchange
 from database.session import SessionLocal
+from utils.ingest import bulk_ingest, refresh_bond_stats
+from analytics.curve import refresh_yield_curves
+from analytics.pricing import refresh_bond_analytics
+from utils.live_updates import publish_bond_updates
+from utils.driver_pool import DriverPool
+from data_acquisition.http_client import fetch_bse_records, fetch_nse_records
+from utils.sync_state import (
+    ALL_ISINS, HISTORY_DAYS, advance_watermarks, get_content_hashes, get_watermarks, window_start,
+)
+from concurrent.futures import ThreadPoolExecutor
 import csv
 from io import StringIO
 from selenium.webdriver.chrome.service import Service
 import os
-from bs4 import BeautifulSoup
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # --- CONFIG ---
-NSE_URL = "https://www.nseindia.com/historical/security-wise-trades-data"
+NSE_URL = os.getenv("NSE_URL", "https://www.nseindia.com/historical/security-wise-trades-data")
 BSE_URL = "https://www.bseindia.com/markets/debt/debt_search.aspx"
 WAIT_TIMEOUT = 30  # seconds
+# Fetch through the async HTTP client first and use Selenium only for what it could not get
+HTTP_INGEST_ENABLED = os.getenv("HTTP_INGEST_ENABLED", "1") == "1"
 
 # --- UTILS ---
 def get_headless_chrome():
@@ -71,34 +81,83 @@ def wait_for_element(driver, by, value, timeout=WAIT_TIMEOUT):
         logger.error(f"Timeout waiting for element: {value}")
         raise
 
-def upsert_bond_and_transaction(db: Session, bond_data: dict, txn_data: dict):
-    try:
-        bond = db.query(Bond).filter(Bond.isin == bond_data['isin']).first()
-        if not bond:
-            bond = Bond(**bond_data)
-            db.add(bond)
-            db.commit()
-            db.refresh(bond)
-            logger.info(f"Created new bond: {bond_data['isin']}")
-        
-        # Check for duplicate transaction
-        exists = db.query(Transaction).filter(
-            Transaction.bond_id == bond.id,
-            Transaction.timestamp == txn_data['timestamp']
-        ).first()
-        
-        if not exists:
-            txn = Transaction(bond_id=bond.id, **txn_data)
-            db.add(txn)
-            db.commit()
-            logger.info(f"Added new transaction for bond: {bond_data['isin']}")
-    except Exception as e:
-        logger.error(f"Error upserting bond/transaction: {str(e)}")
-        db.rollback()
-        raise
-
 # --- BSE SCRAPER ---
-def scrape_bse_bonds(fetch_all=True, last_run_time=None):
+# Table rows copied out of the browser per round trip
+BSE_ROW_BATCH = int(os.getenv("BSE_ROW_BATCH", "5000"))
+
+# Returns the <td> texts of rows [start, end) of a table, without serialising its HTML
+TABLE_ROWS_SCRIPT = """
+const rows = arguments[0].rows;
+const batch = [];
+for (let i = arguments[1]; i < Math.min(arguments[2], rows.length); i++) {
+    batch.push(Array.from(rows[i].cells).filter(cell => cell.tagName === 'TD').map(cell => cell.textContent.trim()));
+}
+return batch;
+"""
+
+def parse_bse_row(cols):
+    """
+    Turn the cell texts of one gvDebt row into a (bond_data, txn_data) record,
+    or None when the row is not a trade.
+    """
+    if len(cols) < 8:
+        return None
+    isin = cols[0]
+    timestamp = datetime.strptime(cols[1], '%d/%m/%Y')
+    price = float(cols[5].replace(',', '')) if cols[5] else 0.0
+    quantity = int(cols[6].replace(',', '')) if cols[6] else 0
+    
+    bond_data = {
+        'isin': isin,
+        'name': cols[2] or f"Bond {isin}",
+        'issuer': cols[3] or "Unknown",
+        'exchange': Exchange.BSE,
+        'face_value': 100.0,
+        'coupon_rate': 0.0,
+        'maturity_date': datetime.now() + timedelta(days=365*5),
+        'yield_to_maturity': 0.0,
+        'last_price': price,
+        'volume': quantity
+    }
+    
+    txn_data = {
+        'timestamp': timestamp,
+        'price': price,
+        'quantity': quantity,
+        'source': 'BSE'
+    }
+    return bond_data, txn_data
+
+def iter_bse_rows(rows):
+    """
+    Parse gvDebt rows (lists of cell texts) into records, logging and skipping bad rows.
+    """
+    for cols in rows:
+        try:
+            record = parse_bse_row(cols)
+        except Exception as e:
+            logger.error(f"Error parsing BSE row: {str(e)}")
+            continue
+        if record:
+            yield record
+
+def iter_bse_table_records(driver, table, row_count, batch_size=None):
+    """
+    Read the results table out of the browser BSE_ROW_BATCH rows at a time
+    (skipping the header row) and yield parsed records, so memory stays flat
+    however many rows the search returned.
+    """
+    batch_size = batch_size or BSE_ROW_BATCH
+    for start in range(1, row_count, batch_size):
+        rows = driver.execute_script(TABLE_ROWS_SCRIPT, table, start, start + batch_size)
+        yield from iter_bse_rows(rows)
+
+def scrape_bse_bonds(fetch_all=True, last_run_time=None, until=None):
+    """
+    Search BSE debt trades in a browser and yield (bond_data, txn_data) records
+    as the result table is read. The search ends at until (default: today).
+    This is a generator: the browser is closed once it is exhausted or closed.
+    """
     driver = None
     try:
         driver = get_headless_chrome()
@@ -123,9 +182,10 @@ def scrape_bse_bonds(fetch_all=True, last_run_time=None):
         primary_market_radio.click()
         logger.info("Clicked primary market radio button")
         
-        # Set date range to 6 months ago to today
-        from_date = (datetime.now() - timedelta(days=180)).strftime("%d/%m/%Y")
-        to_date = datetime.now().strftime("%d/%m/%Y")
+        # Search from the last sync (incremental runs) or six months back (full fetch)
+        start = last_run_time if (last_run_time and not fetch_all) else datetime.now() - timedelta(days=HISTORY_DAYS)
+        from_date = start.strftime("%d/%m/%Y")
+        to_date = (until or datetime.now()).strftime("%d/%m/%Y")
         
         logger.info(f"Setting date range: {from_date} to {to_date}")
         
@@ -237,10 +297,10 @@ def scrape_bse_bonds(fetch_all=True, last_run_time=None):
                     table = wait_for_element(driver, By.ID, "ContentPlaceHolder1_gvDebt", timeout=180)  # Increased timeout to 3 minutes
                     logger.info("Found results table")
                     
-                    # Check if table has data
-                    rows = table.find_elements(By.TAG_NAME, "tr")
-                    if len(rows) > 1:  # More than just header row
-                        logger.info(f"Table has {len(rows)-1} rows of data")
+                    # Check if table has data (counted in the page, not one WebElement per row)
+                    row_count = driver.execute_script("return arguments[0].rows.length", table)
+                    if row_count > 1:  # More than just header row
+                        logger.info(f"Table has {row_count-1} rows of data")
                     else:
                         logger.warning("Table appears to be empty")
                     
@@ -264,51 +324,7 @@ def scrape_bse_bonds(fetch_all=True, last_run_time=None):
                     # Wait for download to complete
                     time.sleep(5)
                     
-                    # Get the table content
-                    table_content = table.get_attribute("outerHTML")
-                    
-                    # Parse table content
-                    bse_data = []
-                    soup = BeautifulSoup(table_content, 'html.parser')
-                    rows = soup.find_all('tr')[1:]  # Skip header row
-                    
-                    for row in rows:
-                        try:
-                            cols = row.find_all('td')
-                            if len(cols) >= 8:
-                                isin = cols[0].text.strip()
-                                date_str = cols[1].text.strip()
-                                timestamp = datetime.strptime(date_str, '%d/%m/%Y')
-                                price = float(cols[5].text.strip().replace(',', '')) if cols[5].text.strip() else 0.0
-                                quantity = int(cols[6].text.strip().replace(',', '')) if cols[6].text.strip() else 0
-                                
-                                bond_data = {
-                                    'isin': isin,
-                                    'name': cols[2].text.strip() or f"Bond {isin}",
-                                    'issuer': cols[3].text.strip() or "Unknown",
-                                    'exchange': Exchange.BSE,
-                                    'face_value': 100.0,
-                                    'coupon_rate': 0.0,
-                                    'maturity_date': datetime.now() + timedelta(days=365*5),
-                                    'yield_to_maturity': 0.0,
-                                    'last_price': price,
-                                    'volume': quantity
-                                }
-                                
-                                txn_data = {
-                                    'timestamp': timestamp,
-                                    'price': price,
-                                    'quantity': quantity
-                                }
-                                
-                                bse_data.append((bond_data, txn_data))
-                                logger.info(f"Successfully parsed bond: {isin}")
-                        except Exception as e:
-                            logger.error(f"Error parsing BSE row: {str(e)}")
-                            continue
-                    
-                    logger.info(f"Successfully scraped {len(bse_data)} bonds from BSE")
-                    return bse_data
+                    break
                     
                 except Exception as table_error:
                     logger.error(f"Error finding results table: {str(table_error)}")
@@ -321,6 +337,13 @@ def scrape_bse_bonds(fetch_all=True, last_run_time=None):
                     raise Exception(f"Failed to submit form after {submit_retries} attempts: {str(e)}")
                 time.sleep(5)  # Wait before retry
         
+        # Stream the rows out in batches; the records go to the ingest pipeline as they are read
+        count = 0
+        for record in iter_bse_table_records(driver, table, row_count):
+            count += 1
+            yield record
+        logger.info(f"Successfully scraped {count} bonds from BSE")
+        
     except Exception as e:
         logger.error(f"Error in BSE scraping: {str(e)}")
         if driver:
@@ -331,10 +354,15 @@ def scrape_bse_bonds(fetch_all=True, last_run_time=None):
             driver.quit()
 
 # --- NSE SCRAPER ---
-def scrape_nse_for_isin(isin, fetch_all=True, last_run_time=None):
-    driver = None
+def scrape_nse_for_isin(isin, fetch_all=True, last_run_time=None, driver=None):
+    """
+    Scrape NSE trades for one ISIN. Pass a driver leased from a DriverPool to
+    reuse a warm browser; otherwise a new one is started and quit afterwards.
+    """
+    owns_driver = driver is None
     try:
-        driver = get_headless_chrome()
+        if owns_driver:
+            driver = get_headless_chrome()
         logger.info(f"Starting NSE scraping for ISIN: {isin}")
         
         driver.get(NSE_URL)
@@ -346,10 +374,6 @@ def scrape_nse_for_isin(isin, fetch_all=True, last_run_time=None):
         isin_input.send_keys(isin)
         time.sleep(1)
         
-        # Set date range if needed
-        if not fetch_all and last_run_time:
-            # TODO: Implement date range selection
-            pass
         
         # Click download button
         download_button = wait_for_element(driver, By.ID, "CFanncEquity-download")
@@ -386,7 +410,8 @@ def scrape_nse_for_isin(isin, fetch_all=True, last_run_time=None):
                     txn_data = {
                         'timestamp': timestamp,
                         'price': price,
-                        'quantity': quantity
+                        'quantity': quantity,
+                        'source': 'NSE'
                     }
                     
                     nse_data.append((bond_data, txn_data))
@@ -394,6 +419,10 @@ def scrape_nse_for_isin(isin, fetch_all=True, last_run_time=None):
                 logger.error(f"Error parsing NSE row: {str(e)}")
                 continue
         
+        # The page has no date filter; keep only rows inside the incremental window
+        if not fetch_all and last_run_time:
+            nse_data = [record for record in nse_data if record[1]['timestamp'] >= last_run_time]
+        
         logger.info(f"Successfully scraped {len(nse_data)} transactions from NSE for ISIN: {isin}")
         return nse_data
         
@@ -401,89 +430,158 @@ def scrape_nse_for_isin(isin, fetch_all=True, last_run_time=None):
         logger.error(f"Error in NSE scraping for ISIN {isin}: {str(e)}")
         raise
     finally:
-        if driver:
+        if owns_driver and driver:
             driver.quit()
 
+def scrape_nse_parallel(isins, fetch_all=True, last_run_time=None, pool=None, starts=None):
+    """
+    Scrape NSE for many ISINs across a pool of warm drivers, one ISIN per pooled
+    driver at a time. A pool is created (and closed) here unless one is given.
+    starts optionally maps ISINs to their own last_run_time.
+    Returns (records, ISINs that had NSE data, ISINs that failed); failures are logged.
+    """
+    isins = sorted(isins)
+    starts = starts or {}
+    failed = set()
+    own_pool = pool is None
+    if own_pool:
+        pool = DriverPool(get_headless_chrome)
+
+    def scrape(isin):
+        try:
+            with pool.lease() as driver:
+                return scrape_nse_for_isin(
+                    isin, fetch_all=fetch_all, last_run_time=starts.get(isin, last_run_time), driver=driver
+                )
+        except Exception as e:
+            logger.error(f"Error processing NSE data for ISIN {isin}: {str(e)}")
+            failed.add(isin)
+            return []
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="nse") as executor:
+            results = list(executor.map(scrape, isins))
+    finally:
+        if own_pool:
+            pool.close()
+
+    records = []
+    nse_isins = set()
+    for isin, nse_data in zip(isins, results):
+        if nse_data:
+            records.extend(nse_data)
+            nse_isins.add(isin)
+    return records, nse_isins, failed
+
 # --- MAIN ORCHESTRATOR ---
-def run_selenium_scraper(fetch_all=True, last_run_time=None):
+def _ratio(part, whole):
+    return round(part / whole, 4) if whole else 0.0
+
+def run_selenium_scraper(fetch_all=True, last_run_time=None, chunk_size=None):
+    """
+    Fetch BSE and NSE trades and store them. A full fetch reads HISTORY_DAYS of
+    history; otherwise each source (BSE market-wide, NSE per ISIN) is fetched
+    from its persisted watermark minus the overlap margin, unless last_run_time
+    forces a start. Watermarks advance only after the data they cover is committed.
+    
+    HTTP payloads whose content hash matches the previous fetch are skipped
+    without parsing; the rest are diffed against the stored trades so only
+    new or corrected trades are written. Returns a report of payloads skipped
+    and rows changed.
+    """
     db = SessionLocal()
     try:
         logger.info("Starting bond data scraping process")
         
-        # 1. Scrape BSE for all ISINs and bond transactions
-        bse_data = scrape_bse_bonds(fetch_all=fetch_all, last_run_time=last_run_time)
-        isins = set()
+        now = datetime.now()
+        payloads = {'BSE': {'fetched': 0, 'unchanged': 0}, 'NSE': {'fetched': 0, 'unchanged': 0}}
+        rows = {'new': 0, 'changed': 0, 'unchanged': 0}
         
-        # First pass: Store all BSE data
-        for bond_data, txn_data in bse_data:
-            try:
-                # Store BSE data
-                upsert_bond_and_transaction(db, bond_data, txn_data)
-                isins.add(bond_data['isin'])
-                logger.info(f"Stored BSE data for ISIN: {bond_data['isin']}")
-            except Exception as e:
-                logger.error(f"Error processing BSE data for ISIN {bond_data['isin']}: {str(e)}")
-                continue
+        def start_for(watermark):
+            if fetch_all:
+                return now - timedelta(days=HISTORY_DAYS)
+            return last_run_time or window_start(watermark, now)
         
-        # 2. For each ISIN, fetch and store NSE data
-        for isin in isins:
-            try:
-                logger.info(f"Fetching NSE data for ISIN: {isin}")
-                nse_data = scrape_nse_for_isin(isin, fetch_all=fetch_all, last_run_time=last_run_time)
-                
-                # Get the bond from database to update with NSE data
-                bond = db.query(Bond).filter(Bond.isin == isin).first()
-                if not bond:
-                    logger.warning(f"Bond not found in database for ISIN: {isin}")
-                    continue
-                
-                # Update bond with NSE data if available
-                if nse_data:
-                    latest_nse_data = nse_data[0][0]  # Get the first bond data entry
-                    bond.last_price = latest_nse_data['last_price']
-                    bond.volume = latest_nse_data['volume']
-                    bond.exchange = Exchange.NSE  # Update exchange to NSE if we have NSE data
-                    db.commit()
-                    logger.info(f"Updated bond with NSE data for ISIN: {isin}")
-                
-                # Store NSE transactions
-                for bond_data, txn_data in nse_data:
-                    try:
-                        # Use the existing bond ID
-                        txn_data['bond_id'] = bond.id
-                        txn = Transaction(**txn_data)
-                        db.add(txn)
-                        db.commit()
-                        logger.info(f"Added NSE transaction for ISIN: {isin}")
-                    except Exception as e:
-                        logger.error(f"Error storing NSE transaction for ISIN {isin}: {str(e)}")
-                        db.rollback()
-                        continue
-                
-            except Exception as e:
-                logger.error(f"Error processing NSE data for ISIN {isin}: {str(e)}")
-                continue
+        def count_rows(stats):
+            rows['new'] += stats['transactions']
+            rows['changed'] += stats['changed']
+            rows['unchanged'] += stats['duplicates']
         
-        # 3. Update bond statistics
-        for isin in isins:
-            try:
-                bond = db.query(Bond).filter(Bond.isin == isin).first()
-                if bond:
-                    # Get latest transaction
-                    latest_txn = db.query(Transaction).filter(
-                        Transaction.bond_id == bond.id
-                    ).order_by(Transaction.timestamp.desc()).first()
-                    
-                    if latest_txn:
-                        bond.last_price = latest_txn.price
-                        bond.volume = latest_txn.quantity
-                        db.commit()
-                        logger.info(f"Updated bond statistics for ISIN: {isin}")
-            except Exception as e:
-                logger.error(f"Error updating bond statistics for ISIN {isin}: {str(e)}")
-                continue
+        # 1. Fetch BSE for all ISINs and bond transactions, then store them in bulk
+        bse_from = start_for(get_watermarks(db, 'BSE').get(ALL_ISINS))
+        logger.info(f"Fetching BSE from {bse_from:%Y-%m-%d %H:%M}")
+        bse_data, bse_hash = None, None
+        if HTTP_INGEST_ENABLED:
+            known_hash = get_content_hashes(db, 'BSE').get(ALL_ISINS)
+            bse_data, bse_hash = fetch_bse_records(bse_from, now, known_hash=known_hash)
+            if bse_hash:
+                payloads['BSE']['fetched'] += 1
+            if bse_hash and bse_hash == known_hash:
+                payloads['BSE']['unchanged'] += 1
+        if bse_data is None:
+            logger.info("Falling back to Selenium for BSE")
+            bse_data = scrape_bse_bonds(fetch_all=fetch_all, last_run_time=bse_from)
+        bse_stats = bulk_ingest(db, bse_data, chunk_size=chunk_size)
+        count_rows(bse_stats)
+        advance_watermarks(db, 'BSE', {ALL_ISINS: now}, content_hashes={ALL_ISINS: bse_hash})
+        isins = set(bse_stats['isins'])
+        logger.info(f"Stored BSE data for {len(isins)} ISINs")
+        
+        # 2. Fetch NSE data for every ISIN seen on BSE or already synced from NSE, over
+        #    HTTP where possible and on a pool of warm Selenium drivers otherwise
+        nse_watermarks = get_watermarks(db, 'NSE')
+        nse_watermarks.pop(ALL_ISINS, None)
+        starts = {isin: start_for(nse_watermarks.get(isin)) for isin in isins | set(nse_watermarks)}
+        pending = set(starts)
+        nse_records, nse_isins, nse_hashes = [], set(), {}
+        if HTTP_INGEST_ENABLED and starts:
+            known_hashes = get_content_hashes(db, 'NSE')
+            nse_records, nse_isins, pending, nse_hashes = fetch_nse_records(starts, now, known_hashes=known_hashes)
+            payloads['NSE']['fetched'] += len(nse_hashes)
+            payloads['NSE']['unchanged'] += sum(known_hashes.get(isin) == h for isin, h in nse_hashes.items())
+        failed = set()
+        if pending:
+            logger.info(f"Falling back to Selenium for NSE data of {len(pending)} ISINs")
+            selenium_records, selenium_isins, failed = scrape_nse_parallel(
+                pending, fetch_all=fetch_all, starts=starts
+            )
+            nse_records.extend(selenium_records)
+            nse_isins |= selenium_isins
+        
+        if nse_records:
+            count_rows(bulk_ingest(db, nse_records, chunk_size=chunk_size))
+            # Mark bonds that have NSE data as NSE-listed
+            db.query(Bond).filter(Bond.isin.in_(nse_isins)).update(
+                {Bond.exchange: Exchange.NSE}, synchronize_session=False
+            )
+            db.commit()
+            logger.info(f"Stored NSE data for {len(nse_isins)} ISINs")
+        advance_watermarks(
+            db, 'NSE', {isin: now for isin in starts if isin not in failed}, content_hashes=nse_hashes
+        )
         
-        logger.info("Successfully completed bond data scraping process")
+        # 3. Update bond statistics from the latest stored transaction
+        changed = isins | nse_isins
+        refresh_bond_stats(db, changed, chunk_size=chunk_size)
+        
+        # 4. Reprice the bond universe: yield, duration, convexity, accrued interest,
+        #    and refit the government curve to the new prices
+        repriced = refresh_bond_analytics(db)
+        refresh_yield_curves(db)
+        
+        # 5. Push the refreshed bonds, traded or only repriced, to connected dashboards
+        #    and the API workers' bond snapshots
+        publish_bond_updates(db, changed.union(repriced))
+        
+        fetched = sum(p['fetched'] for p in payloads.values())
+        report = {
+            'payloads': payloads,
+            'rows': rows,
+            'skipped_ratio': _ratio(sum(p['unchanged'] for p in payloads.values()), fetched),
+            'changed_ratio': _ratio(rows['new'] + rows['changed'], sum(rows.values())),
+        }
+        logger.info(f"Successfully completed bond data scraping process: {report}")
+        return report
         
     except Exception as e:
         logger.error(f"Error in main scraping process: {str(e)}")
@@ -494,30 +592,15 @@ def run_selenium_scraper(fetch_all=True, last_run_time=None):
 # Add a function to check for new data
 def check_for_updates():
     """
-    Check for new data since last run and update the database.
+    Fetch only what is new since each source's persisted sync watermark.
     This function should be called periodically (e.g., every hour).
     """
     try:
-        # Get the timestamp of the last successful run
-        last_run = get_last_run_time()  # You'll need to implement this
-        run_selenium_scraper(fetch_all=False, last_run_time=last_run)
+        return run_selenium_scraper(fetch_all=False)
     except Exception as e:
         logger.error(f"Error checking for updates: {str(e)}")
         raise
 
-# Add a function to get the last run time
-def get_last_run_time():
-    """
-    Get the timestamp of the last successful data fetch.
-    This could be stored in a database or file.
-    """
-    try:
-        # For now, return 1 hour ago
-        return datetime.now() - timedelta(hours=1)
-    except Exception as e:
-        logger.error(f"Error getting last run time: {str(e)}")
-        return None
-
 # Example usage:
 # run_selenium_scraper(fetch_all=True)
 # For hourly update: run_selenium_scraper(fetch_all=False, last_run_time=datetime.now() - timedelta(hours=1)) 
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+JSON serialization shared by the API responses, the WebSocket messages and
+the live updates published by the ingest task.
+
+Payloads are encoded with orjson, which writes datetimes (ISO 8601) and enums
+(their value) natively, so rows selected as tuples are zipped with their field
+names and encoded as they come from the database, with no per-value conversion.
+"""
+from typing import Any, Dict, Iterable, List, Sequence
+
+import orjson
+
+from database.models import Bond, Transaction
+
+BOND_FIELDS = (
+    "isin", "name", "issuer", "exchange", "face_value", "coupon_rate", "maturity_date",
+    "yield_to_maturity", "last_price", "volume", "macaulay_duration", "modified_duration",
+    "convexity", "accrued_interest",
+)
+TRANSACTION_FIELDS = ("id", "bond_id", "isin", "timestamp", "price", "quantity", "source")
+
+# Columns selecting a payload row in field order; transaction rows need bonds joined for the ISIN
+BOND_PAYLOAD_COLUMNS = tuple(getattr(Bond, field) for field in BOND_FIELDS)
+TRANSACTION_PAYLOAD_COLUMNS = (
+    Transaction.id, Transaction.bond_id, Bond.isin, Transaction.timestamp,
+    Transaction.price, Transaction.quantity, Transaction.source,
+)
+
+
+def dumps(payload: Any) -> bytes:
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def dumps_text(payload: Any) -> str:
+    """
+    dumps() for text transports (WebSocket text frames, Redis channels read as text).
+    """
+    return dumps(payload).decode()
+
+
+def rows_to_dicts(names: Sequence[str], rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+    return [dict(zip(names, row)) for row in rows]
+
+
+def bond_payload(row: Sequence[Any]) -> Dict[str, Any]:
+    """
+    Payload of a bond selected with BOND_PAYLOAD_COLUMNS.
+    """
+    return dict(zip(BOND_FIELDS, row))
+
+
+def transaction_payload(row: Sequence[Any]) -> Dict[str, Any]:
+    """
+    Payload of a transaction selected with TRANSACTION_PAYLOAD_COLUMNS.
+    """
+    return dict(zip(TRANSACTION_FIELDS, row))
@@ -0,0 +1,86 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from database.bulk import chunked, dialect_insert
+from database.models import SyncState
+
+logger = logging.getLogger(__name__)
+
+# Key of the watermark of sources that are fetched market-wide rather than per ISIN
+ALL_ISINS = ""
+# Each fetch re-reads this much before the watermark to pick up late corrections
+SYNC_OVERLAP = timedelta(hours=int(os.getenv("SYNC_OVERLAP_HOURS", "24")))
+# History fetched for a (source, ISIN) without a watermark yet
+HISTORY_DAYS = 180
+
+
+def get_watermarks(db: Session, source: str, isins: Optional[Iterable[str]] = None) -> Dict[str, datetime]:
+    """
+    Watermarks of a source, keyed by ISIN (ALL_ISINS for the source-wide one).
+    """
+    query = select(SyncState.isin, SyncState.watermark).where(SyncState.source == source)
+    if isins is None:
+        return dict(db.execute(query).all())
+    watermarks = {}
+    for chunk in chunked(sorted(set(isins)), 1000):
+        watermarks.update(db.execute(query.where(SyncState.isin.in_(chunk))).all())
+    return watermarks
+
+
+def window_start(watermark: Optional[datetime], now: datetime, overlap: timedelta = SYNC_OVERLAP) -> datetime:
+    """
+    Start of the next fetch window: the watermark minus the overlap margin,
+    or the full history when nothing was synced yet.
+    """
+    if watermark is None:
+        return now - timedelta(days=HISTORY_DAYS)
+    return watermark - overlap
+
+
+def get_content_hashes(db: Session, source: str) -> Dict[str, str]:
+    """
+    Hashes of the last payloads fetched from a source, keyed like its watermarks.
+    """
+    query = select(SyncState.isin, SyncState.content_hash).where(
+        SyncState.source == source, SyncState.content_hash.isnot(None)
+    )
+    return dict(db.execute(query).all())
+
+
+def advance_watermarks(db: Session, source: str, watermarks: Dict[str, datetime],
+                       content_hashes: Optional[Dict[str, str]] = None):
+    """
+    Move watermarks forward (never back) and commit, storing the hash of the
+    payload each one was fetched from where given. Call only once the data
+    they cover has been committed, so a failed run is simply fetched again.
+    """
+    if not watermarks:
+        return
+    now = datetime.now()
+    content_hashes = content_hashes or {}
+    stored = SyncState.__table__.c
+    for chunk in chunked(sorted(watermarks.items()), 1000):
+        rows = [
+            {"source": source, "isin": isin, "watermark": mark, "content_hash": content_hashes.get(isin),
+             "updated_at": now}
+            for isin, mark in chunk
+        ]
+        stmt = dialect_insert(db, SyncState)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SyncState.source, SyncState.isin],
+            set_={
+                "watermark": case(
+                    (stmt.excluded.watermark > stored.watermark, stmt.excluded.watermark), else_=stored.watermark
+                ),
+                "content_hash": func.coalesce(stmt.excluded.content_hash, stored.content_hash),
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.execute(stmt, rows)
+    db.commit()
+    logger.info(f"Advanced {len(watermarks)} {source} watermarks")
@@ -0,0 +1,258 @@
+"""
+Bounded price history of one bond for charts.
+
+series() splits [start, end) into at most `points` equal buckets and
+aggregates every bucket in one SQL query (window functions pick each bucket's
+first and last observation), so the payload stays the same size whether the
+range is an hour or ten years. The query reads the coarsest OHLCV bar
+interval no longer than a bucket; raw trades are only read when buckets are
+shorter than a minute, which bounds the scan as well as the response. When
+retention has already pruned that source back to the start of the range, a
+finer source that still covers it is read instead, or else a coarser one.
+
+Aggregations:
+- last: the last price in each bucket, at the time it traded
+- vwap: the volume-weighted average price of each bucket (from bar values)
+- ohlc: open/high/low/close, volume and trade count of each bucket
+- lttb: Largest-Triangle-Three-Buckets downsampling of the last prices of
+  LTTB_OVERSAMPLE times as many buckets, which keeps the spikes and turns
+  that a plain bucketed line flattens
+"""
+import enum
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import Integer, case, cast, extract, func, literal, select
+from sqlalchemy.orm import Session
+
+from database.models import OHLCVBar, Transaction
+from utils.bars import INTERVAL_LENGTHS, INTERVALS
+from utils.retention import bar_cutoff, transaction_cutoff
+
+SERIES_MAX_POINTS = 5000
+MILLISECOND = timedelta(milliseconds=1)
+# Candidate points per returned point fed to LTTB
+LTTB_OVERSAMPLE = 8
+
+
+class Aggregation(str, enum.Enum):
+    LAST = "last"
+    VWAP = "vwap"
+    OHLC = "ohlc"
+    LTTB = "lttb"
+
+
+def _retained_since(interval: Optional[str], start: datetime) -> bool:
+    """
+    Whether retention still keeps the bars of `interval` (or the trades, for None) from start on.
+    """
+    cutoff = transaction_cutoff() if interval is None else bar_cutoff(interval)
+    return cutoff is None or start >= cutoff
+
+
+def source_interval(width: timedelta, start: Optional[datetime] = None) -> Optional[str]:
+    """
+    The coarsest bar interval no longer than a bucket, or None for raw trades.
+    With a start, sources already pruned before it are passed over for the
+    next finer one, and when none is left for the finest coarser interval.
+    """
+    finer = [interval for interval in reversed(INTERVALS) if INTERVAL_LENGTHS[interval] <= width]
+    coarser = [interval for interval in INTERVALS if INTERVAL_LENGTHS[interval] > width]
+    for interval in finer + [None] + coarser:
+        if start is None or _retained_since(interval, start):
+            return interval
+    return INTERVALS[-1]
+
+
+def history_start(db: Session, bond_id: int) -> Optional[datetime]:
+    """
+    The first trade or daily bar of a bond (older trades survive only as daily bars).
+    """
+    first_bar = db.scalar(
+        select(func.min(OHLCVBar.bucket_start)).where(OHLCVBar.bond_id == bond_id, OHLCVBar.interval == "1d")
+    )
+    first_trade = db.scalar(select(func.min(Transaction.timestamp)).where(Transaction.bond_id == bond_id))
+    return min((ts for ts in (first_bar, first_trade) if ts is not None), default=None)
+
+
+def bucket_width(start: datetime, end: datetime, buckets: int) -> timedelta:
+    """
+    The width of `buckets` buckets over [start, end), in whole milliseconds so
+    SQL divides exact integers and a bar starting on a bucket edge lands in
+    that bucket. The last bucket absorbs the remainder.
+    """
+    return max((end - start) // buckets // MILLISECOND, 1) * MILLISECOND
+
+
+def _bucket_index(db: Session, column, start: datetime, width: timedelta, buckets: int):
+    """
+    SQL expression numbering the bucket of `column` from 0 to buckets - 1.
+    """
+    width_ms = width // MILLISECOND
+    if db.get_bind().dialect.name == "postgresql":
+        index = cast(func.floor(func.round(extract("epoch", column - start) * 1000) / width_ms), Integer)
+    else:
+        offset_ms = func.round((func.julianday(column) - func.julianday(literal(start))) * 86400000.0)
+        index = cast(offset_ms / width_ms, Integer)
+    return case((index >= buckets, buckets - 1), else_=index)
+
+
+def _observations(bond_id: int, interval: Optional[str], start: datetime, end: datetime):
+    """
+    The bars of `interval` (or the trades, for None) in [start, end) with uniform columns.
+    """
+    if interval is None:
+        quantity = func.coalesce(Transaction.quantity, 0)
+        return select(
+            Transaction.id.label("id"),
+            Transaction.timestamp.label("ts"),
+            Transaction.timestamp.label("last_at"),
+            Transaction.price.label("open"),
+            Transaction.price.label("high"),
+            Transaction.price.label("low"),
+            Transaction.price.label("close"),
+            quantity.label("volume"),
+            (Transaction.price * quantity).label("value"),
+            literal(1).label("trade_count"),
+        ).where(
+            Transaction.bond_id == bond_id,
+            Transaction.timestamp >= start,
+            Transaction.timestamp < end,
+            Transaction.price.isnot(None),
+        ).subquery()
+    return select(
+        OHLCVBar.id.label("id"),
+        OHLCVBar.bucket_start.label("ts"),
+        func.coalesce(OHLCVBar.last_trade_at, OHLCVBar.bucket_start).label("last_at"),
+        OHLCVBar.open, OHLCVBar.high, OHLCVBar.low, OHLCVBar.close, OHLCVBar.volume,
+        OHLCVBar.value, OHLCVBar.trade_count,
+    ).where(
+        OHLCVBar.bond_id == bond_id,
+        OHLCVBar.interval == interval,
+        OHLCVBar.bucket_start >= start,
+        OHLCVBar.bucket_start < end,
+    ).subquery()
+
+
+def bucket_rows(db: Session, bond_id: int, start: datetime, end: datetime, buckets: int) -> List[Any]:
+    """
+    One row per non-empty bucket, in time order: bucket, open, high, low,
+    close, last_at (when the close traded), volume, value and trade_count.
+    """
+    width = bucket_width(start, end, buckets)
+    observations = _observations(bond_id, source_interval(width, start), start, end)
+    numbered = select(
+        observations,
+        _bucket_index(db, observations.c.ts, start, width, buckets).label("bucket"),
+    ).subquery()
+    ranked = select(
+        numbered,
+        func.row_number().over(
+            partition_by=numbered.c.bucket, order_by=(numbered.c.ts, numbered.c.id)
+        ).label("first_rank"),
+        func.row_number().over(
+            partition_by=numbered.c.bucket, order_by=(numbered.c.ts.desc(), numbered.c.id.desc())
+        ).label("last_rank"),
+    ).subquery()
+    first, last = ranked.c.first_rank == 1, ranked.c.last_rank == 1
+    return db.execute(
+        select(
+            ranked.c.bucket,
+            func.max(case((first, ranked.c.open))).label("open"),
+            func.max(ranked.c.high).label("high"),
+            func.min(ranked.c.low).label("low"),
+            func.max(case((last, ranked.c.close))).label("close"),
+            func.max(case((last, ranked.c.last_at))).label("last_at"),
+            func.sum(ranked.c.volume).label("volume"),
+            func.sum(ranked.c.value).label("value"),
+            func.sum(ranked.c.trade_count).label("trade_count"),
+        ).group_by(ranked.c.bucket).order_by(ranked.c.bucket)
+    ).all()
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the `threshold` points Largest-Triangle-Three-Buckets keeps:
+    the first and last point, and from each of threshold - 2 equal buckets in
+    between the point forming the largest triangle with the point kept before
+    it and the average of the next bucket.
+    """
+    count = len(x)
+    if threshold >= count:
+        return np.arange(count)
+    if threshold < 3:
+        return np.array([0, count - 1])[:threshold]
+    every = (count - 2) / (threshold - 2)
+    # Bucket i is [edges[i], edges[i + 1])
+    edges = (np.arange(threshold - 1) * every).astype(np.intp) + 1
+    edges[-1] = count - 1
+    kept = np.empty(threshold, dtype=np.intp)
+    kept[0], kept[-1] = 0, count - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # The next bucket, or the last point after the final bucket
+        next_hi = edges[i + 2] if i + 2 < len(edges) else count
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def series_buckets(points: int, aggregation: Aggregation) -> int:
+    """
+    The number of SQL buckets a series of `points` points aggregates.
+    """
+    return points * LTTB_OVERSAMPLE if aggregation == Aggregation.LTTB else points
+
+
+def series_source(start: datetime, end: datetime, points: int, aggregation: Aggregation) -> str:
+    """
+    The bar interval a series reads, or "trades".
+    """
+    return source_interval(bucket_width(start, end, series_buckets(points, aggregation)), start) or "trades"
+
+
+def series(db: Session, bond_id: int, start: datetime, end: datetime, points: int,
+           aggregation: Aggregation = Aggregation.LAST) -> List[Dict[str, Any]]:
+    """
+    At most `points` points of the bond's price history in [start, end), oldest first.
+    ohlc and vwap points are stamped with their bucket start, last and lttb
+    points with the time the price traded.
+    """
+    if aggregation == Aggregation.LTTB:
+        rows = bucket_rows(db, bond_id, start, end, series_buckets(points, aggregation))
+        if not rows:
+            return []
+        x = np.array([row.last_at for row in rows], dtype="datetime64[us]").astype(np.float64)
+        y = np.array([row.close for row in rows], dtype=np.float64)
+        return [{"timestamp": rows[i].last_at, "value": rows[i].close} for i in lttb(x, y, points)]
+
+    rows = bucket_rows(db, bond_id, start, end, points)
+    if aggregation == Aggregation.LAST:
+        return [{"timestamp": row.last_at, "value": row.close} for row in rows]
+
+    width = bucket_width(start, end, points)
+    if aggregation == Aggregation.VWAP:
+        return [
+            {
+                "timestamp": start + row.bucket * width,
+                "value": row.value / row.volume if row.volume else None,
+                "volume": row.volume,
+            }
+            for row in rows
+        ]
+    return [
+        {
+            "timestamp": start + row.bucket * width,
+            "open": row.open,
+            "high": row.high,
+            "low": row.low,
+            "close": row.close,
+            "volume": row.volume,
+            "trade_count": row.trade_count,
+        }
+        for row in rows
+    ]
@@ -1,81 +1,332 @@
 from fastapi import WebSocket
-from typing import List, Dict, Any
-import json
+from collections import deque
+from typing import List, Dict, Any, Callable, Iterable, NamedTuple, Optional, Set
+import asyncio
 import logging
+import os
+
+import orjson
+
+from utils.serialization import dumps_text
+from utils.ws_protocols import ENCODERS, Protocol
 
 logger = logging.getLogger(__name__)
 
+# Messages buffered per client before the oldest ones are dropped
+CLIENT_QUEUE_SIZE = int(os.getenv("WS_CLIENT_QUEUE_SIZE", "256"))
+# Live trades for msgpack/delta clients are batched into one frame per interval
+FLUSH_INTERVAL_SECONDS = float(os.getenv("WS_FLUSH_INTERVAL_MS", "100")) / 1000
+# A batch reaching this many trades is flushed without waiting for the interval
+MAX_BATCH_TICKS = int(os.getenv("WS_MAX_BATCH_TICKS", "5000"))
+
+
+class PendingTicks(NamedTuple):
+    """
+    A batch of live trades queued for a binary-protocol client, encoded only when sent.
+    """
+    ticks: List[Dict[str, Any]]
+    seq: Optional[str]
+
+
+class ClientConnection:
+    """
+    One WebSocket with its own bounded send queue and sender task, so a slow
+    client only ever delays itself.
+
+    When the queue is full the oldest message is dropped. Messages with a
+    coalesce key (e.g. the latest state of a bond) replace a queued message
+    with the same key instead of queueing behind it.
+    """
+
+    protocol = Protocol.JSON
+
+    def __init__(self, websocket: WebSocket, max_queue: int = CLIENT_QUEUE_SIZE):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.isins: Optional[Set[str]] = None  # None: every ISIN
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._queue = deque()
+        self._pending: Dict[Any, list] = {}
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def wants(self, isin: Optional[str]) -> bool:
+        return self.isins is None or isin is None or isin in self.isins
+
+    def encode(self, message: Dict[str, Any]):
+        return dumps_text(message)
+
+    def deliver(self, message: Dict[str, Any], coalesce_key=None):
+        self.enqueue(self.encode(message), coalesce_key)
+
+    def enqueue(self, message, coalesce_key=None):
+        if coalesce_key is not None and coalesce_key in self._pending:
+            self._pending[coalesce_key][1] = message
+            self.coalesced += 1
+            return
+        if len(self._queue) >= self.max_queue:
+            self._drop(self._queue.popleft())
+        entry = [coalesce_key, message]
+        self._queue.append(entry)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = entry
+        self._ready.set()
+
+    def _forget(self, entry: list):
+        if entry[0] is not None and self._pending.get(entry[0]) is entry:
+            del self._pending[entry[0]]
+
+    def _drop(self, entry: list):
+        self._forget(entry)
+        self.dropped += 1
+
+    def _payload(self, message):
+        """
+        The frame to send for a queued message.
+        """
+        return message
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def start(self, on_error):
+        self._task = asyncio.create_task(self._send_loop(on_error))
+
+    async def stop(self):
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _send_loop(self, on_error):
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    entry = self._queue.popleft()
+                    self._forget(entry)
+                    payload = self._payload(entry[1])
+                    if isinstance(payload, bytes):
+                        await self.websocket.send_bytes(payload)
+                    else:
+                        await self.websocket.send_text(payload)
+                    self.sent += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending message to WebSocket: {e}")
+            await on_error(self.websocket)
+
+
+class CompactClientConnection(ClientConnection):
+    """
+    Client on a binary protocol (msgpack or delta, see utils.ws_protocols).
+    Live trades are collected and sent as one batch frame every flush
+    interval; everything else is encoded and queued like for JSON clients.
+
+    Trade batches are encoded when they are sent, not when queued, so the
+    delta encoder's per-ISIN state only ever reflects frames the client
+    actually received. When a batch is dropped under backpressure the encoder
+    is also reset, making the next frame a full keyframe for every ISIN.
+    """
+
+    def __init__(self, websocket: WebSocket, protocol: Protocol, max_queue: int = CLIENT_QUEUE_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL_SECONDS, max_batch: int = MAX_BATCH_TICKS):
+        super().__init__(websocket, max_queue)
+        self.protocol = protocol
+        self.encoder = ENCODERS[protocol]()
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._ticks: List[Dict[str, Any]] = []
+        self._ticks_seq = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return self.encoder.encode(message)
+
+    def deliver(self, message: Dict[str, Any], coalesce_key=None):
+        if message.get("type") != "new_transaction":
+            # Trades already collected go first, so the client sees messages in order
+            self.flush()
+            self.enqueue(self.encode(message), coalesce_key)
+            return
+        self._ticks.append(message["data"])
+        self._ticks_seq = message.get("seq")
+        if len(self._ticks) >= self.max_batch:
+            self.flush()
+
+    def flush(self):
+        if self._ticks:
+            ticks, self._ticks = self._ticks, []
+            self.enqueue(PendingTicks(ticks, self._ticks_seq))
+
+    def _payload(self, message):
+        if isinstance(message, PendingTicks):
+            return self.encoder.encode_ticks(message.ticks, message.seq)
+        return message
+
+    def _drop(self, entry: list):
+        super()._drop(entry)
+        if isinstance(entry[1], PendingTicks):
+            self.encoder.reset()
+
+    def start(self, on_error):
+        super().start(on_error)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await super().stop()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, max_queue: int = CLIENT_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.broadcasts = 0
+        # Counters of clients that already disconnected, so totals never go backwards
+        self._closed_totals = {"sent": 0, "dropped": 0, "coalesced": 0}
 
-    async def connect(self, websocket: WebSocket):
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket, protocol: Protocol = Protocol.JSON,
+                      backlog: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None):
+        """
+        Accept and register a client. backlog (e.g. a snapshot and the live
+        messages it lacks) is called once the client is registered, with no
+        await in between, so its messages are queued ahead of every live
+        update and none falls in the gap.
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"New WebSocket connection established. Total connections: {len(self.active_connections)}")
+        if protocol is Protocol.JSON:
+            client = ClientConnection(websocket, self.max_queue)
+        else:
+            client = CompactClientConnection(websocket, protocol, self.max_queue)
+        self.clients[websocket] = client
+        for message in backlog() if backlog is not None else ():
+            client.deliver(message)
+        client.start(self._on_send_error)
+        logger.info(f"New WebSocket connection established. Total connections: {len(self.clients)}")
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"WebSocket connection closed. Remaining connections: {len(self.active_connections)}")
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            for name in self._closed_totals:
+                self._closed_totals[name] += getattr(client, name)
+            asyncio.ensure_future(client.stop())
+        logger.info(f"WebSocket connection closed. Remaining connections: {len(self.clients)}")
 
-    async def broadcast_transaction(self, transaction: Dict[str, Any]):
+    async def _on_send_error(self, websocket: WebSocket):
+        self.disconnect(websocket)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    def subscribe(self, websocket: WebSocket, isins: Iterable[str]):
         """
-        Broadcast a new transaction to all connected clients.
+        Restrict a client to the given ISINs, on top of those it already follows.
+        """
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.isins = (client.isins or set()) | set(isins)
+
+    def unsubscribe(self, websocket: WebSocket, isins: Optional[Iterable[str]] = None):
+        """
+        Stop following the given ISINs. Without ISINs, or once none are left,
+        the client goes back to receiving every bond.
         """
-        if not self.active_connections:
+        client = self.clients.get(websocket)
+        if client is None:
             return
+        if isins is not None and client.isins is not None:
+            client.isins -= set(isins)
+        if isins is None or not client.isins:
+            client.isins = None
 
-        message = {
-            "type": "new_transaction",
-            "data": transaction
-        }
+    def subscriptions(self, websocket: WebSocket) -> Optional[List[str]]:
+        client = self.clients.get(websocket)
+        return sorted(client.isins) if client is not None and client.isins is not None else None
 
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending message to WebSocket: {e}")
-                disconnected.append(connection)
+    async def broadcast_message(self, message: str, isin: Optional[str] = None, coalesce_key=None,
+                                decoded: Optional[Dict[str, Any]] = None):
+        """
+        Queue an already serialized (JSON) message for every client following
+        isin (all clients when isin is None). Never waits on a client's socket.
+        The message is decoded at most once (unless given decoded), for the
+        clients on a binary protocol.
+        """
+        self.broadcasts += 1
+        for client in list(self.clients.values()):
+            if not client.wants(isin):
+                continue
+            if client.protocol is Protocol.JSON:
+                client.enqueue(message, coalesce_key)
+                continue
+            if decoded is None:
+                decoded = orjson.loads(message)
+            client.deliver(decoded, coalesce_key)
 
-        # Remove disconnected clients
-        for connection in disconnected:
-            self.active_connections.remove(connection)
+    async def broadcast_transaction(self, transaction: Dict[str, Any]):
+        """
+        Broadcast a new transaction to all connected clients.
+        """
+        await self.broadcast_message(dumps_text({
+            "type": "new_transaction",
+            "data": transaction
+        }), isin=transaction.get("isin"))
 
     async def broadcast_bond_update(self, bond: Dict[str, Any]):
         """
         Broadcast a bond update to all connected clients.
         """
-        if not self.active_connections:
-            return
-
-        message = {
+        isin = bond.get("isin")
+        await self.broadcast_message(dumps_text({
             "type": "bond_update",
             "data": bond
-        }
-
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending message to WebSocket: {e}")
-                disconnected.append(connection)
-
-        # Remove disconnected clients
-        for connection in disconnected:
-            self.active_connections.remove(connection)
+        }), isin=isin, coalesce_key=("bond_update", isin))
 
-    async def send_initial_data(self, websocket: WebSocket, transactions: List[Dict[str, Any]]):
+    async def send_personal_message(self, websocket: WebSocket, message: Dict[str, Any]):
         """
-        Send initial transaction data to a newly connected client.
+        Queue a message for a single client, behind anything already queued for it.
         """
-        try:
-            message = {
-                "type": "initial_data",
-                "data": transactions
-            }
-            await websocket.send_json(message)
-        except Exception as e:
-            logger.error(f"Error sending initial data: {e}")
-            self.disconnect(websocket) 
\ No newline at end of file
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.enqueue(client.encode(message))
+
+    def stats(self) -> Dict[str, Any]:
+        clients = list(self.clients.values())
+        depths = [client.queue_depth for client in clients]
+        return {
+            "connections": len(clients),
+            "filtered_connections": sum(1 for client in clients if client.isins is not None),
+            "broadcasts": self.broadcasts,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_limit": self.max_queue,
+            "protocols": {
+                protocol.value: sum(1 for client in clients if client.protocol is protocol) for protocol in Protocol
+            },
+            **{
+                name: self._closed_totals[name] + sum(getattr(client, name) for client in clients)
+                for name in self._closed_totals
+            },
+        }
@@ -0,0 +1,135 @@
+"""
+Compact WebSocket protocols, chosen by the client on connect (/ws?protocol=...).
+
+json     (default) one JSON text frame per message, as sent to every client
+         before the compact protocols existed.
+msgpack  the same {"type", "data"} messages as MessagePack binary frames; live
+         trades are batched into one {"type": "new_transactions", "data": [...]}
+         frame per flush interval.
+delta    MessagePack binary frames where trades are columnar: the snapshot and
+         each flush become one {"type", "seq", "price_scale", "count", "columns"}
+         frame whose columns hold one value per trade. Prices are integers
+         (price * price_scale) and timestamps milliseconds since the epoch.
+         In "ticks" frames a field other than id/isin is elided (null) when it
+         equals the previous trade of the same ISIN sent to this client; the
+         "changed" column holds, per trade, a bitmask of the fields sent (bit i
+         for DELTA_FIELDS[i]), so a field that changed to null is told apart.
+
+Live messages carry their sequence number ("seq"); batch frames carry the seq
+of their last trade. A reconnecting client passes the last seq it saw
+(/ws?since=...) to be sent only what it missed.
+
+Client requests (subscribe/unsubscribe) stay JSON text in every protocol.
+"""
+import calendar
+import enum
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import msgpack
+
+# Prices are sent as integers in units of 1 / DELTA_PRICE_SCALE
+DELTA_PRICE_SCALE = int(os.getenv("WS_DELTA_PRICE_SCALE", "10000"))
+DELTA_FIELDS = ("id", "isin", "bond_id", "timestamp", "price", "quantity", "source")
+# Sent with every trade, so a row can always be attributed
+DELTA_KEY_FIELDS = ("id", "isin")
+
+
+class Protocol(str, enum.Enum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+    DELTA = "delta"
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _epoch_millis(value) -> Any:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        return value
+    # Naive timestamps (exchange local time, as stored) are counted as if they were UTC
+    return calendar.timegm(value.utctimetuple()) * 1000 + value.microsecond // 1000
+
+
+class MsgpackEncoder:
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return msgpack.packb(message, default=_msgpack_default)
+
+    def encode_ticks(self, ticks: List[Dict[str, Any]], seq: Optional[str] = None) -> bytes:
+        return self.encode({"type": "new_transactions", "data": ticks, "seq": seq})
+
+    def reset(self):
+        pass
+
+
+class DeltaEncoder(MsgpackEncoder):
+    """
+    Keeps, per client, the last trade sent for each ISIN to elide unchanged fields.
+    """
+
+    def __init__(self, price_scale: int = DELTA_PRICE_SCALE):
+        self.price_scale = price_scale
+        self._last: Dict[str, Dict[str, Any]] = {}
+
+    def _values(self, tick: Dict[str, Any]) -> Dict[str, Any]:
+        values = {field: tick.get(field) for field in DELTA_FIELDS}
+        values["timestamp"] = _epoch_millis(values["timestamp"])
+        if values["price"] is not None:
+            values["price"] = round(values["price"] * self.price_scale)
+        return values
+
+    def _frame(self, message_type: str, columns: Dict[str, list], count: int, seq: Optional[str]) -> bytes:
+        return super().encode({
+            "type": message_type,
+            "seq": seq,
+            "price_scale": self.price_scale,
+            "count": count,
+            "columns": columns,
+        })
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        if message.get("type") != "initial_data":
+            return super().encode(message)
+        # The snapshot carries every field; deltas start from the first live trade
+        rows = [self._values(tick) for tick in message["data"]]
+        columns = {field: [row[field] for row in rows] for field in DELTA_FIELDS}
+        return self._frame("initial_data", columns, len(rows), message.get("seq"))
+
+    def reset(self):
+        """
+        Forget what was sent, so the next trade of every ISIN carries all its fields.
+        Called when frames the client would have based its state on were dropped.
+        """
+        self._last.clear()
+
+    def encode_ticks(self, ticks: List[Dict[str, Any]], seq: Optional[str] = None) -> bytes:
+        columns = {field: [] for field in DELTA_FIELDS}
+        columns["changed"] = []
+        for tick in ticks:
+            values = self._values(tick)
+            previous = self._last.get(values["isin"])
+            changed = 0
+            for bit, field in enumerate(DELTA_FIELDS):
+                unchanged = (
+                    field not in DELTA_KEY_FIELDS and previous is not None and previous[field] == values[field]
+                )
+                columns[field].append(None if unchanged else values[field])
+                if not unchanged:
+                    changed |= 1 << bit
+            columns["changed"].append(changed)
+            self._last[values["isin"]] = values
+        return self._frame("ticks", columns, len(ticks), seq)
+
+
+ENCODERS = {
+    Protocol.MSGPACK: MsgpackEncoder,
+    Protocol.DELTA: DeltaEncoder,
+}
@@ -32,9 +32,10 @@ const BondDetail = () => {
   // State variables
   const [bond, setBond] = useState(null);
   const [transactions, setTransactions] = useState([]);
+  const [bars, setBars] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
-  const [timeRange, setTimeRange] = useState('1M'); // 1D, 1W, 1M, 3M, 1Y
+  const [timeRange, setTimeRange] = useState('1M'); // 1D, 1W, 1M, 3M, 1Y, 5Y, All
   
   // Fetch bond details and transactions on component mount
   useEffect(() => {
@@ -63,6 +64,38 @@ const BondDetail = () => {
     fetchData();
   }, [isin]);
 
+  // Fetch the price history of the selected time range, bucketed server side
+  // into a bounded number of points however long the range is
+  useEffect(() => {
+    const rangeDays = {
+      '1D': 1,
+      '1W': 7,
+      '1M': 30,
+      '3M': 90,
+      '1Y': 365,
+      '5Y': 5 * 365,
+      'All': null,
+    };
+
+    const fetchSeries = async () => {
+      if (!isin) return;
+      const days = timeRange in rangeDays ? rangeDays[timeRange] : 30;
+      const params = { aggregation: 'ohlc', points: 500 };
+      if (days) {
+        params.from = new Date(Date.now() - days * 24 * 60 * 60 * 1000).toISOString().slice(0, 19);
+      }
+      try {
+        const data = await apiService.getBondSeries(isin, params);
+        setBars(data.points);
+      } catch (error) {
+        console.error('Error fetching price history:', error);
+        setBars([]);
+      }
+    };
+
+    fetchSeries();
+  }, [isin, timeRange]);
+
   // Set up WebSocket subscriptions
   useEffect(() => {
     // Subscribe to bond updates
@@ -77,57 +110,36 @@ const BondDetail = () => {
 
     // Subscribe to new transactions
     const handleNewTransaction = (transaction) => {
-      if (transaction.bond_id === bond?.id) {
+      if (transaction.isin === isin) {
         setTransactions(prevTransactions => [transaction, ...prevTransactions]);
       }
     };
 
-    // Subscribe to WebSocket events
+    // Subscribe to WebSocket events, asking the server for this bond's updates only
     websocketService.subscribe('bond_update', handleBondUpdate);
     websocketService.subscribe('new_transaction', handleNewTransaction);
+    websocketService.watchIsin(isin);
 
     // Cleanup subscriptions on unmount
     return () => {
       websocketService.unsubscribe('bond_update', handleBondUpdate);
       websocketService.unsubscribe('new_transaction', handleNewTransaction);
+      websocketService.unwatchIsin(isin);
     };
-  }, [isin, bond?.id]);
+  }, [isin]);
   
   // Prepare price history data for chart
   const preparePriceHistoryData = () => {
-    if (!transactions.length) return [];
-    
-    // Sort transactions by date
-    const sortedTransactions = [...transactions].sort((a, b) => 
-      new Date(a.trade_date) - new Date(b.trade_date)
-    );
-    
-    // Filter based on selected time range
-    const now = new Date();
-    const filteredTransactions = sortedTransactions.filter(t => {
-      const date = new Date(t.trade_date);
-      const diff = now - date;
-      
-      switch (timeRange) {
-        case '1D':
-          return diff <= 24 * 60 * 60 * 1000;
-        case '1W':
-          return diff <= 7 * 24 * 60 * 60 * 1000;
-        case '1M':
-          return diff <= 30 * 24 * 60 * 60 * 1000;
-        case '3M':
-          return diff <= 90 * 24 * 60 * 60 * 1000;
-        case '1Y':
-          return diff <= 365 * 24 * 60 * 60 * 1000;
-        default:
-          return true;
-      }
-    });
+    if (!bars.length) return [];
     
-    return filteredTransactions.map(t => ({
-      date: format(new Date(t.trade_date), 'MMM d'),
-      price: t.price,
-      yield: t.yield_value,
+    // Points arrive oldest first and already cover only the selected time range
+    const dateFormat = timeRange === '1D' ? 'HH:mm' : ['5Y', 'All'].includes(timeRange) ? 'MMM yyyy' : 'MMM d';
+    return bars.map(bar => ({
+      date: format(new Date(bar.timestamp), dateFormat),
+      price: bar.close,
+      high: bar.high,
+      low: bar.low,
+      volume: bar.volume,
     }));
   };
   
@@ -254,7 +266,7 @@ const BondDetail = () => {
         <div className="flex items-center justify-between mb-4">
           <h3 className="text-lg font-medium text-gray-900">Price History</h3>
           <div className="flex space-x-2">
-            {['1D', '1W', '1M', '3M', '1Y'].map((range) => (
+            {['1D', '1W', '1M', '3M', '1Y', '5Y', 'All'].map((range) => (
               <button
                 key={range}
                 onClick={() => setTimeRange(range)}
@@ -9,19 +9,38 @@ const api = axios.create({
   },
 });
 
+// Bonds per /bonds/ request (the API's maximum page size)
+const BONDS_PAGE_SIZE = 5000;
+
 // API service for HTTP requests
 const apiService = {
-  // Get all bonds with optional filtering
-  getBonds: async (params = {}) => {
+  // Get one page of bonds; nextCursor is null on the last page
+  getBondsPage: async (params = {}) => {
     try {
       const response = await api.get('/bonds/', { params });
-      return response.data;
+      return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
     } catch (error) {
       console.error('Error fetching bonds:', error);
       throw error;
     }
   },
 
+  // Get all bonds with optional filtering, following the cursor through every page
+  getBonds: async (params = {}) => {
+    const bonds = [];
+    let cursor = null;
+    do {
+      const page = await apiService.getBondsPage({
+        limit: BONDS_PAGE_SIZE,
+        ...params,
+        ...(cursor ? { cursor } : {}),
+      });
+      bonds.push(...page.items);
+      cursor = page.nextCursor;
+    } while (cursor);
+    return bonds;
+  },
+
   // Get a specific bond by ISIN
   getBondByIsin: async (isin) => {
     try {
@@ -33,6 +52,17 @@ const apiService = {
     }
   },
 
+  // Get a bond's price history as at most `points` points (aggregation: last, vwap, ohlc or lttb)
+  getBondSeries: async (isin, params = {}) => {
+    try {
+      const response = await api.get(`/bonds/${isin}/series`, { params });
+      return response.data;
+    } catch (error) {
+      console.error(`Error fetching price series for bond with ISIN ${isin}:`, error);
+      throw error;
+    }
+  },
+
   // Get latest transactions with optional filtering
   getTransactions: async (params = {}) => {
     try {
@@ -44,7 +74,7 @@ const apiService = {
     }
   },
 
-  // Get transactions for a specific bond by ISIN
+  // Get a page of transactions for a specific bond by ISIN, newest first (params: limit, cursor)
   getTransactionsByIsin: async (isin, params = {}) => {
     try {
       const response = await api.get(`/transactions/${isin}/`, { params });
@@ -3,26 +3,35 @@ class WebSocketService {
   constructor() {
     this.ws = null;
     this.subscribers = new Map();
+    // ISIN -> number of components following it; empty means every bond
+    this.isinWatchers = new Map();
     this.reconnectAttempts = 0;
     this.maxReconnectAttempts = 5;
     this.reconnectDelay = 1000; // Start with 1 second
+    // Sequence number of the last message received, sent on reconnect to get only what was missed
+    this.lastSeq = null;
   }
 
   connect() {
-    const wsUrl = `ws://${window.location.hostname}:8000/ws`;
+    const since = this.lastSeq ? `?since=${encodeURIComponent(this.lastSeq)}` : '';
+    const wsUrl = `ws://${window.location.hostname}:8000/ws${since}`;
     this.ws = new WebSocket(wsUrl);
 
     this.ws.onopen = () => {
       console.log('WebSocket connected');
       this.reconnectAttempts = 0;
       this.reconnectDelay = 1000;
+      this.syncIsinSubscriptions();
     };
 
     this.ws.onmessage = (event) => {
       try {
-        const data = JSON.parse(event.data);
-        const { type, payload } = data;
-        
+        const message = JSON.parse(event.data);
+        const { type, data: payload, seq } = message;
+        if (seq) {
+          this.lastSeq = seq;
+        }
+
         // Notify all subscribers of this type
         if (this.subscribers.has(type)) {
           this.subscribers.get(type).forEach(callback => callback(payload));
@@ -76,6 +85,34 @@ class WebSocketService {
     }
   }
 
+  // Ask the server for live updates of this ISIN only (reference counted across components)
+  watchIsin(isin) {
+    this.isinWatchers.set(isin, (this.isinWatchers.get(isin) || 0) + 1);
+    this.syncIsinSubscriptions();
+  }
+
+  unwatchIsin(isin) {
+    const count = (this.isinWatchers.get(isin) || 0) - 1;
+    if (count > 0) {
+      this.isinWatchers.set(isin, count);
+    } else {
+      this.isinWatchers.delete(isin);
+    }
+    this.syncIsinSubscriptions();
+  }
+
+  syncIsinSubscriptions() {
+    if (!this.ws || this.ws.readyState !== WebSocket.OPEN) {
+      return; // sent again from onopen
+    }
+    // Reset to the full stream, then narrow it to the watched ISINs if there are any
+    this.send({ action: 'unsubscribe' });
+    const isins = [...this.isinWatchers.keys()];
+    if (isins.length) {
+      this.send({ action: 'subscribe', isins });
+    }
+  }
+
   send(message) {
     if (this.ws && this.ws.readyState === WebSocket.OPEN) {
       this.ws.send(JSON.stringify(message));